@@ -0,0 +1,264 @@
+"""
+Synthetic `financial_transactions.csv` generator for benchmarks.
+
+Rows look like the real extract, dirt included: mixed timestamp and date formats,
+`is_refund` spelled several ways, category aliases in mixed case, blank optional
+fields, a few invalid currencies and unparseable dates, and re-sent transaction_ids
+(corrections with a later posting date). The error rates stay below the default
+validation thresholds, so a generated file runs through the whole pipeline.
+
+The file is written in chunks, so any size (tens of millions of rows) is generated
+in bounded memory. Output is deterministic for a given (rows, seed, chunk_rows).
+
+    python -m benchmarks.generate --rows 1000000 --out data/bench/transactions_1000000.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = [
+    "transaction_id",
+    "account_id",
+    "transaction_ts",
+    "posting_date",
+    "currency",
+    "amount",
+    "merchant_id",
+    "merchant_name",
+    "category",
+    "country",
+    "city",
+    "payment_method",
+    "status",
+    "is_refund",
+    "reference",
+]
+
+_MERCHANTS = [
+    ("M001", "Nordic Grocers", ["grocery", "groceries", "mat", "GROCERY", "Groceries"]),
+    ("M002", "Cafe Central", ["restaurant", "restaurang", "cafe", "dining", "Dining"]),
+    ("M003", "StreamFlix", ["streaming", "entertainment", "Entertainment"]),
+    ("M004", "PowerCo", ["power", "utilities", "internet", "Utilities"]),
+    ("M005", "GadgetHub", ["electronics", "Electronics", "shopping"]),
+    ("M006", "City Transit", ["transit", "transport", "uber", "taxi"]),
+    ("M007", "SkyFly", ["flight", "travel", "hotel", "Travel"]),
+    ("M008", "HealthPlus", ["health", "healthcare", "Healthcare"]),
+    ("M009", "BookBarn", ["books", "Books", "book"]),
+    ("M010", "MegaMart", ["shopping", "fee", "fees", "Fees", "Other"]),
+]
+_CITIES = {
+    "SE": ["Stockholm", "Gothenburg", "Malmo"],
+    "NO": ["Oslo", "Bergen", "Trondheim"],
+    "DK": ["Copenhagen", "Aarhus", "Odense"],
+    "GB": ["London", "Manchester", "Edinburgh"],
+    "DE": ["Berlin", "Hamburg", "Munich"],
+}
+_CURRENCIES = np.array(["SEK", "NOK", "DKK", "GBP", "EUR", "USD"], dtype=object)
+_BAD_CURRENCIES = np.array(["SEKK", "USDD", "ABC"], dtype=object)
+_PAYMENT_METHODS = np.array(["CARD", "CASH", "BANK_TRANSFER", "MOBILE_PAY"], dtype=object)
+_STATUSES = np.array(["BOOKED", "PENDING", "FAILED"], dtype=object)
+_REFUND_SPELLINGS = {
+    True: np.array(["1", "1", "TRUE", "true", "t", "yes", "YES"], dtype=object),
+    False: np.array(["0", "0", "FALSE", "false", "f", "no", "No"], dtype=object),
+}
+
+# Timestamp formats as (weight, builder over the "YYYY-MM-DDTHH:MM:SS" characters).
+_ISO_WIDTH = 19
+_TS_LAYOUTS = [
+    # 2025-06-21 09:04:32
+    (0.74, list(range(0, 10)) + [" "] + list(range(11, 19))),
+    # 2025/06/21 09:04
+    (0.16, [0, 1, 2, 3, "/", 5, 6, "/", 8, 9, " ", 11, 12, 13, 14, 15]),
+    # 21-06-2025 09:04:32 (day first)
+    (0.10, [8, 9, "-", 5, 6, "-", 0, 1, 2, 3, " "] + list(range(11, 19))),
+]
+_DATE_LAYOUTS = [
+    (0.86, list(range(0, 10))),
+    (0.14, [0, 1, 2, 3, "/", 5, 6, "/", 8, 9]),
+]
+
+_START = np.datetime64("2025-01-01T00:00:00", "s")
+_SPAN_SECONDS = 365 * 24 * 3600
+
+
+@dataclass(frozen=True)
+class DirtRates:
+    """Fraction of rows carrying each kind of defect."""
+
+    duplicate_id: float = 0.002
+    invalid_currency: float = 0.002
+    unparseable_date: float = 0.001
+    missing_merchant_id: float = 0.02
+    missing_merchant_name: float = 0.03
+    missing_city: float = 0.01
+    missing_reference: float = 0.05
+    refund: float = 0.09
+
+
+def _layout(iso: np.ndarray, layout: list) -> np.ndarray:
+    """Rearrange fixed-width ISO strings character-wise (fast, no strftime)."""
+    chars = iso.astype(f"U{_ISO_WIDTH}").view("U1").reshape(len(iso), _ISO_WIDTH)
+    out = np.empty((len(iso), len(layout)), dtype="U1")
+    for i, src in enumerate(layout):
+        out[:, i] = src if isinstance(src, str) else chars[:, src]
+    return out.view(f"U{len(layout)}").ravel().astype(object)
+
+
+def _format_mixed(rng: np.random.Generator, iso: np.ndarray, layouts: list) -> np.ndarray:
+    weights = np.array([w for w, _ in layouts])
+    choice = rng.choice(len(layouts), size=len(iso), p=weights / weights.sum())
+    out = np.empty(len(iso), dtype=object)
+    for i, (_, layout) in enumerate(layouts):
+        mask = choice == i
+        if mask.any():
+            out[mask] = _layout(iso[mask], layout)
+    return out
+
+
+def _blank(rng: np.random.Generator, values: np.ndarray, rate: float) -> np.ndarray:
+    values = values.copy()
+    values[rng.random(len(values)) < rate] = ""
+    return values
+
+
+def generate_chunk(
+    rng: np.random.Generator,
+    *,
+    start_id: int,
+    rows: int,
+    accounts: int,
+    rates: DirtRates = DirtRates(),
+) -> pd.DataFrame:
+    """One chunk of `rows` synthetic rows with transaction_ids from `start_id`."""
+    ids = np.arange(start_id, start_id + rows)
+    # Re-sent rows reuse the id of an earlier row in the chunk.
+    dup = rng.random(rows) < rates.duplicate_id
+    dup[0] = False
+    earlier = (rng.random(rows) * np.arange(rows)).astype(np.int64)
+    ids = np.where(dup, ids[earlier], ids)
+
+    account = rng.integers(0, accounts, size=rows)
+    # Each account lives in one country and city.
+    countries = np.array(sorted(_CITIES), dtype=object)
+    country = countries[account % len(countries)]
+    city = np.empty(rows, dtype=object)
+    for code, names in _CITIES.items():
+        mask = country == code
+        city[mask] = np.array(names, dtype=object)[(account[mask] // len(countries)) % len(names)]
+
+    merchant = rng.integers(0, len(_MERCHANTS), size=rows)
+    merchant_id = np.array([m[0] for m in _MERCHANTS], dtype=object)[merchant]
+    merchant_name = np.array([m[1] for m in _MERCHANTS], dtype=object)[merchant]
+    category = np.empty(rows, dtype=object)
+    pick = rng.random(rows)
+    for i, (_, _, aliases) in enumerate(_MERCHANTS):
+        mask = merchant == i
+        category[mask] = np.array(aliases, dtype=object)[(pick[mask] * len(aliases)).astype(np.int64)]
+
+    ts = _START + rng.integers(0, _SPAN_SECONDS, size=rows).astype("timedelta64[s]")
+    posted = ts.astype("datetime64[D]") + rng.integers(0, 3, size=rows).astype("timedelta64[D]")
+    # Corrections post later than the row they correct.
+    posted = np.where(dup, posted + np.timedelta64(3, "D"), posted)
+    transaction_ts = _format_mixed(rng, np.datetime_as_string(ts, unit="s"), _TS_LAYOUTS)
+    posting_date = _format_mixed(rng, np.datetime_as_string(posted, unit="D"), _DATE_LAYOUTS)
+    bad_date = rng.random(rows) < rates.unparseable_date
+    transaction_ts[bad_date] = "not_a_date"
+
+    currency = _CURRENCIES[rng.integers(0, len(_CURRENCIES), size=rows)]
+    bad_currency = rng.random(rows) < rates.invalid_currency
+    currency[bad_currency] = _BAD_CURRENCIES[rng.integers(0, len(_BAD_CURRENCIES), size=int(bad_currency.sum()))]
+
+    refund = rng.random(rows) < rates.refund
+    amount = np.round(rng.uniform(1.0, 500.0, size=rows), 2)
+    amount = np.where(refund, -amount, amount)
+    is_refund = np.empty(rows, dtype=object)
+    for flag, spellings in _REFUND_SPELLINGS.items():
+        mask = refund == flag
+        is_refund[mask] = spellings[rng.integers(0, len(spellings), size=int(mask.sum()))]
+
+    reference = np.char.mod("%08x", rng.integers(0, 2**32, size=rows, dtype=np.uint64)).astype(object)
+
+    return pd.DataFrame(
+        {
+            "transaction_id": np.char.mod("TXN%010d", ids).astype(object),
+            "account_id": np.char.mod("ACC%06d", account).astype(object),
+            "transaction_ts": transaction_ts,
+            "posting_date": posting_date,
+            "currency": currency,
+            "amount": np.char.mod("%.2f", amount).astype(object),
+            "merchant_id": _blank(rng, merchant_id, rates.missing_merchant_id),
+            "merchant_name": _blank(rng, merchant_name, rates.missing_merchant_name),
+            "category": category,
+            "country": country,
+            "city": _blank(rng, city, rates.missing_city),
+            "payment_method": _PAYMENT_METHODS[rng.integers(0, len(_PAYMENT_METHODS), size=rows)],
+            "status": _STATUSES[rng.integers(0, len(_STATUSES), size=rows)],
+            "is_refund": is_refund,
+            "reference": _blank(rng, reference, rates.missing_reference),
+        },
+        columns=COLUMNS,
+    )
+
+
+def generate_transactions(
+    out_path: Path,
+    rows: int,
+    *,
+    seed: int = 0,
+    chunk_rows: int = 250_000,
+    accounts: Optional[int] = None,
+    rates: DirtRates = DirtRates(),
+) -> Path:
+    """Write `rows` synthetic transactions to `out_path` (CSV with header)."""
+    if accounts is None:
+        accounts = max(50, rows // 200)
+    rng = np.random.default_rng(seed)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(f".{out_path.name}.tmp")
+    with tmp.open("w", encoding="utf-8", newline="") as f:
+        written = 0
+        while written < rows:
+            n = min(chunk_rows, rows - written)
+            chunk = generate_chunk(rng, start_id=written, rows=n, accounts=accounts, rates=rates)
+            chunk.to_csv(f, index=False, header=written == 0)
+            written += n
+    tmp.replace(out_path)
+    return out_path
+
+
+def dirt_summary(df: pd.DataFrame) -> Dict[str, int]:
+    """Counts of the defects in a generated frame (for eyeballing a sample)."""
+    return {
+        "rows": len(df),
+        "duplicate_transaction_id": int(df["transaction_id"].duplicated().sum()),
+        "not_a_date": int((df["transaction_ts"] == "not_a_date").sum()),
+        "slash_timestamps": int(df["transaction_ts"].str.contains("/").sum()),
+        "day_first_timestamps": int(df["transaction_ts"].str.match(r"^\d{2}-").sum()),
+        "invalid_currency": int((~df["currency"].isin(set(_CURRENCIES))).sum()),
+        "is_refund_spellings": int(df["is_refund"].nunique()),
+        "category_spellings": int(df["category"].nunique()),
+    }
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    args = parser.parse_args(argv)
+    generate_transactions(args.out, args.rows, seed=args.seed, chunk_rows=args.chunk_rows)
+    print(args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
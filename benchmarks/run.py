@@ -0,0 +1,316 @@
+"""
+Time and memory-profile the pipeline stages on synthetic data of several sizes.
+
+For each size, a dirty input is generated once (and cached in the work dir), then
+each case runs in a fresh process so its peak RSS is its own:
+
+- validate:  `validate_transactions` on the input
+- transform: `transform_snapshot` of the input into a clean artifact
+- load:      `load_to_postgres` of the input (raw) and the clean artifact (staging)
+
+Stage settings come from the usual PIPELINE_* variables (chunk rows, clean format,
+load workers), and the load case connects with POSTGRES_* / DATABASE_URL. The load
+replaces `staging.financial_transactions`, so only point it at a scratch database.
+
+Results are written as JSON and compared with a baseline recorded on the same
+machine (<work dir>/baseline.json, kept out of the repository); the exit code is 1
+when a case got slower or bigger than the baseline allows, and 2 when the baseline
+was recorded in a different environment.
+
+    python -m benchmarks.run --rows 10000 100000 --cases validate transform load
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from .generate import generate_transactions
+
+
+logger = logging.getLogger(__name__)
+
+CASES = ("validate", "transform", "load")
+# Timings only compare on the machine, versions and settings they were taken with.
+BASELINE_NAME = "baseline.json"
+_COMPARED_ENVIRONMENT = ("host", "cpu_count", "python", "pandas", "pyarrow", "settings")
+# Load batch id used for the benchmark's rows in the raw landing table; each load
+# replaces the previous benchmark batch.
+LOAD_BATCH_ID = "benchmark"
+
+
+@dataclass(frozen=True)
+class CaseResult:
+    case: str
+    rows: int
+    seconds: float
+    rows_per_second: float
+    # Peak resident set size of the process, and how much of it the case added on
+    # top of the interpreter and imports.
+    peak_rss_mb: float
+    peak_rss_delta_mb: float
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def _clean_output(work_dir: Path, rows: int, clean_format: str) -> Path:
+    from src.artifacts import artifact_suffix
+
+    return work_dir / f"clean_transactions_bench{rows}{artifact_suffix(clean_format)}"
+
+
+def _run_case(case: str, input_csv: Path, work_dir: Path, rows: int) -> CaseResult:
+    """Runs in a fresh process: import, note the RSS, run the case once."""
+    from src.config import load_config
+    from src.db import connect_with_retries
+    from src.load import delete_raw_batch, load_to_postgres
+    from src.migrations import apply_migrations
+    from src.transform import transform_snapshot
+    from src.validate import validate_transactions
+
+    cfg = load_config()
+    proc = cfg.processing
+    clean = _clean_output(work_dir, rows, proc.clean_format)
+    if case == "load":
+        # Set up the schema and remove the previous benchmark batch outside the timing
+        # (a raw reload would otherwise pay for deleting rows of whatever size ran last).
+        conn = connect_with_retries(cfg.pg)
+        try:
+            apply_migrations(conn, cfg.paths.migrations_dir)
+            delete_raw_batch(conn, LOAD_BATCH_ID)
+            conn.commit()
+        finally:
+            conn.close()
+    rss_before = _peak_rss_mb()
+
+    started = time.perf_counter()
+    if case == "validate":
+        validate_transactions(input_csv, chunk_rows=proc.chunk_rows)
+    elif case == "transform":
+        out = transform_snapshot(
+            input_csv,
+            work_dir,
+            f"bench{rows}",
+            chunk_rows=proc.chunk_rows,
+            output_format=proc.clean_format,
+        )
+        assert out == clean, out
+    elif case == "load":
+        if not clean.exists():
+            raise RuntimeError(f"{clean} is missing; run the transform case first")
+        load_to_postgres(
+            cfg.pg,
+            migrations_dir=cfg.paths.migrations_dir,
+            raw_snapshot=input_csv,
+            clean_output=clean,
+            staging_workers=proc.load_workers,
+            staging_mode=proc.staging_mode,
+            load_batch_id=LOAD_BATCH_ID,
+        )
+    else:
+        raise ValueError(f"Unknown benchmark case: {case}")
+    seconds = time.perf_counter() - started
+
+    peak = _peak_rss_mb()
+    return CaseResult(
+        case=case,
+        rows=rows,
+        seconds=round(seconds, 4),
+        rows_per_second=round(rows / seconds, 1) if seconds > 0 else 0.0,
+        peak_rss_mb=round(peak, 1),
+        peak_rss_delta_mb=round(peak - rss_before, 1),
+    )
+
+
+def run_case(case: str, input_csv: Path, work_dir: Path, rows: int, *, repeat: int = 1) -> CaseResult:
+    """Best time and worst peak memory over `repeat` runs, each in a new process."""
+    results = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+            results.append(ex.submit(_run_case, case, input_csv, work_dir, rows).result())
+    best = min(results, key=lambda r: r.seconds)
+    return CaseResult(
+        case=case,
+        rows=rows,
+        seconds=best.seconds,
+        rows_per_second=best.rows_per_second,
+        peak_rss_mb=max(r.peak_rss_mb for r in results),
+        peak_rss_delta_mb=max(r.peak_rss_delta_mb for r in results),
+    )
+
+
+def input_path(work_dir: Path, rows: int, seed: int) -> Path:
+    return work_dir / f"transactions_{rows}_seed{seed}.csv"
+
+
+def _environment() -> Dict[str, Any]:
+    import pandas as pd
+
+    try:
+        import pyarrow
+
+        pyarrow_version: Optional[str] = pyarrow.__version__
+    except ImportError:
+        pyarrow_version = None
+    settings = {
+        name: os.environ[name]
+        for name in sorted(os.environ)
+        if name in ("PIPELINE_CHUNK_ROWS", "PIPELINE_CLEAN_FORMAT", "PIPELINE_LOAD_WORKERS", "PIPELINE_STAGING_MODE")
+    }
+    return {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "pyarrow": pyarrow_version,
+        "platform": platform.platform(),
+        "host": platform.node(),
+        "cpu_count": os.cpu_count(),
+        "settings": settings,
+    }
+
+
+def compare(
+    results: Sequence[Dict[str, Any]],
+    baseline: Sequence[Dict[str, Any]],
+    *,
+    time_tolerance: float = 0.25,
+    memory_tolerance: float = 0.20,
+    min_seconds: float = 0.05,
+) -> List[str]:
+    """
+    Regressions of `results` against `baseline` (matched on case and rows).
+
+    A case regresses when it is more than `time_tolerance` slower (ignoring
+    differences under `min_seconds`, which are noise) or its peak RSS grew by more
+    than `memory_tolerance`. Cases missing from the baseline are not compared.
+    """
+    base = {(b["case"], b["rows"]): b for b in baseline}
+    regressions = []
+    for r in results:
+        b = base.get((r["case"], r["rows"]))
+        if b is None:
+            continue
+        label = f"{r['case']} @ {r['rows']} rows"
+        slower = r["seconds"] - b["seconds"]
+        if slower > min_seconds and r["seconds"] > b["seconds"] * (1 + time_tolerance):
+            regressions.append(f"{label}: {r['seconds']:.3f}s vs baseline {b['seconds']:.3f}s")
+        if r["peak_rss_mb"] > b["peak_rss_mb"] * (1 + memory_tolerance):
+            regressions.append(f"{label}: peak RSS {r['peak_rss_mb']:.0f} MB vs baseline {b['peak_rss_mb']:.0f} MB")
+    return regressions
+
+
+def environment_differences(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """What differs between the environment of the results and that of the baseline, in compared keys."""
+    return [
+        f"{key}: {baseline.get(key)!r} in the baseline, {current.get(key)!r} now"
+        for key in _COMPARED_ENVIRONMENT
+        if current.get(key) != baseline.get(key)
+    ]
+
+
+def _print_table(results: Sequence[Dict[str, Any]], baseline: Sequence[Dict[str, Any]]) -> None:
+    base = {(b["case"], b["rows"]): b for b in baseline}
+    print(f"{'case':<10} {'rows':>10} {'seconds':>9} {'rows/s':>11} {'peak MB':>8} {'vs base':>8}")
+    for r in results:
+        b = base.get((r["case"], r["rows"]))
+        ratio = f"{r['seconds'] / b['seconds']:.2f}x" if b and b["seconds"] else "-"
+        print(
+            f"{r['case']:<10} {r['rows']:>10} {r['seconds']:>9.3f} {r['rows_per_second']:>11.0f} "
+            f"{r['peak_rss_mb']:>8.0f} {ratio:>8}"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=["validate", "transform"])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, default=Path("data/bench"))
+    parser.add_argument("--out", type=Path, help="results file (default: <work dir>/results_<ts>.json)")
+    parser.add_argument("--baseline", type=Path, help=f"baseline file (default: <work dir>/{BASELINE_NAME})")
+    parser.add_argument("--update-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.20)
+    parser.add_argument(
+        "--ignore-environment",
+        action="store_true",
+        help="compare even with a baseline recorded on another machine or with other versions or settings",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format="%(levelname)s %(name)s: %(message)s")
+    args.work_dir.mkdir(parents=True, exist_ok=True)
+    # Load needs the clean artifact of the same size, so transform runs before it.
+    cases = [c for c in CASES if c in args.cases]
+    if "load" in cases and "transform" not in cases:
+        cases.insert(0, "transform")
+
+    results = []
+    for rows in args.rows:
+        input_csv = input_path(args.work_dir, rows, args.seed)
+        if not input_csv.exists():
+            print(f"Generating {rows} rows -> {input_csv}", file=sys.stderr)
+            generate_transactions(input_csv, rows, seed=args.seed)
+        for case in cases:
+            result = run_case(case, input_csv, args.work_dir, rows, repeat=args.repeat)
+            results.append(asdict(result))
+
+    report = {"environment": _environment(), "results": results}
+    out = args.out or args.work_dir / f"results_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    out.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    baseline_path = args.baseline or args.work_dir / BASELINE_NAME
+    baseline_report = json.loads(baseline_path.read_text(encoding="utf-8")) if baseline_path.exists() else None
+    baseline = baseline_report["results"] if baseline_report is not None else []
+    _print_table(results, baseline)
+    print(f"Results: {out}")
+
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline updated: {baseline_path}")
+        return 0
+    if baseline_report is None:
+        print(f"No baseline at {baseline_path}; record one with --update-baseline", file=sys.stderr)
+        return 0
+
+    differences = environment_differences(report["environment"], baseline_report.get("environment", {}))
+    for line in differences:
+        print(f"ENVIRONMENT {line}", file=sys.stderr)
+    if differences and not args.ignore_environment:
+        print(
+            "Not comparing with a baseline from another environment; re-record it with --update-baseline "
+            "(or pass --ignore-environment)",
+            file=sys.stderr,
+        )
+        return 2
+
+    regressions = compare(
+        results,
+        baseline,
+        time_tolerance=args.time_tolerance,
+        memory_tolerance=args.memory_tolerance,
+    )
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
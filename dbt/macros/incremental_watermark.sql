@@ -0,0 +1,15 @@
+{#
+  Load watermark of an incremental model: the latest staging `loaded_at` it has
+  already merged, or -infinity while it has none (empty, or built before the column
+  existed); staging rows above it form the new batch. Rendered as a literal, not a
+  subquery, so Postgres estimates the batch from the loaded_at index instead of
+  guessing a third of the table.
+#}
+{% macro incremental_watermark(relation=this) %}
+  {%- set watermark = "-infinity" -%}
+  {%- if execute and 'loaded_at' in adapter.get_columns_in_relation(relation) | map(attribute='name') | list -%}
+    {%- set result = run_query("select max(loaded_at)::text from " ~ relation) -%}
+    {%- set watermark = result.columns[0].values()[0] or "-infinity" -%}
+  {%- endif -%}
+  '{{ watermark }}'::timestamptz
+{%- endmacro %}
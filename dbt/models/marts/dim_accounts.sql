@@ -1,9 +1,65 @@
+{#
+  Incremental: touched accounts that have no transactions left come out with NULL
+  attributes, and the post-hook deletes them (delete+insert alone would keep them).
+#}
+{{
+  config(
+    materialized='incremental',
+    unique_key='account_id',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    indexes=[{'columns': ['account_id'], 'unique': True}, {'columns': ['loaded_at']}],
+    post_hook="
+      delete from {{ this }} as d
+      where d.loaded_at = (select max(loaded_at) from {{ this }})
+        and not exists (
+          select 1 from {{ source('staging', 'financial_transactions') }} as s where s.account_id = d.account_id
+        )",
+  )
+}}
+
+{% if is_incremental() %}
+
+-- Re-aggregate only the accounts touched by the new staging batch: the batch's own
+-- accounts plus, via the previous fct_transactions, the accounts its transactions
+-- belonged to before (so an account losing a transaction is recomputed too).
+{% set fct = adapter.get_relation(database=this.database, schema=this.schema, identifier='fct_transactions') %}
+with batch as (
+  select transaction_id, account_id, loaded_at
+  from {{ ref('stg_financial_transactions') }}
+  where loaded_at > {{ incremental_watermark() }}
+),
+touched as (
+  select account_id from batch
+  {% if fct is not none %}
+  union
+  select fct.account_id
+  from {{ fct }} as fct
+  join batch using (transaction_id)
+  {% endif %}
+)
+select
+  touched.account_id,
+  max(tx.country) as country,
+  max(tx.city) as city,
+  min(tx.transaction_ts) as first_seen_ts,
+  -- Every row rewritten by this run carries the batch watermark, which is what lets
+  -- fct_transactions find the accounts that changed.
+  (select max(loaded_at) from batch) as loaded_at
+from touched
+left join {{ ref('stg_financial_transactions') }} as tx
+  on tx.account_id = touched.account_id
+group by 1
+
+{% else %}
+
 select
   account_id,
   max(country) as country,
   max(city) as city,
-  min(transaction_ts) as first_seen_ts
+  min(transaction_ts) as first_seen_ts,
+  max(loaded_at) as loaded_at
 from {{ ref('stg_financial_transactions') }}
 group by 1
 
-
+{% endif %}
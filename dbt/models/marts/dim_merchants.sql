@@ -1,9 +1,61 @@
+{#
+  Incremental: touched merchants that have no transactions left come out with NULL
+  attributes, and the post-hook deletes them (delete+insert alone would keep them).
+#}
+{{
+  config(
+    materialized='incremental',
+    unique_key='merchant_id',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    indexes=[{'columns': ['merchant_id'], 'unique': True}, {'columns': ['loaded_at']}],
+    post_hook="
+      delete from {{ this }} as d
+      where d.loaded_at = (select max(loaded_at) from {{ this }})
+        and not exists (
+          select 1 from {{ source('staging', 'financial_transactions') }} as s where s.merchant_id = d.merchant_id
+        )",
+  )
+}}
+
+{% if is_incremental() %}
+
+-- Re-aggregate only the merchants touched by the new staging batch (see dim_accounts).
+{% set fct = adapter.get_relation(database=this.database, schema=this.schema, identifier='fct_transactions') %}
+with batch as (
+  select transaction_id, merchant_id, loaded_at
+  from {{ ref('stg_financial_transactions') }}
+  where loaded_at > {{ incremental_watermark() }}
+),
+touched as (
+  select merchant_id from batch
+  {% if fct is not none %}
+  union
+  select fct.merchant_id
+  from {{ fct }} as fct
+  join batch using (transaction_id)
+  {% endif %}
+)
+select
+  touched.merchant_id,
+  max(tx.merchant_name) as merchant_name,
+  max(tx.category) as category,
+  (select max(loaded_at) from batch) as loaded_at
+from touched
+left join {{ ref('stg_financial_transactions') }} as tx
+  on tx.merchant_id = touched.merchant_id
+where touched.merchant_id is not null
+group by 1
+
+{% else %}
+
 select
   merchant_id,
   max(merchant_name) as merchant_name,
-  max(category) as category
+  max(category) as category,
+  max(loaded_at) as loaded_at
 from {{ ref('stg_financial_transactions') }}
 where merchant_id is not null
 group by 1
 
-
+{% endif %}
@@ -1,7 +1,52 @@
-with tx as (
+{{
+  config(
+    materialized='incremental',
+    unique_key='transaction_id',
+    incremental_strategy='delete+insert',
+    on_schema_change='append_new_columns',
+    indexes=[
+      {'columns': ['transaction_id'], 'unique': True},
+      {'columns': ['loaded_at']},
+      {'columns': ['account_id']},
+      {'columns': ['merchant_id']},
+    ],
+  )
+}}
+
+with
+{% if is_incremental() %}
+-- New or changed staging rows, plus transactions whose denormalized dimension
+-- attributes no longer match a dimension row this run rewrote.
+stale as (
+  select f.transaction_id
+  from {{ this }} as f
+  join {{ ref('dim_accounts') }} as a
+    on f.account_id = a.account_id
+  where a.loaded_at > {{ incremental_watermark() }}
+    and f.account_first_seen_ts is distinct from a.first_seen_ts
+  union
+  select f.transaction_id
+  from {{ this }} as f
+  join {{ ref('dim_merchants') }} as m
+    on f.merchant_id = m.merchant_id
+  where m.loaded_at > {{ incremental_watermark() }}
+    and f.merchant_name is distinct from m.merchant_name
+),
+tx as (
   select *
   from {{ ref('stg_financial_transactions') }}
+  where loaded_at > {{ incremental_watermark() }}
+  union
+  select stg.*
+  from {{ ref('stg_financial_transactions') }} as stg
+  join stale using (transaction_id)
 ),
+{% else %}
+tx as (
+  select *
+  from {{ ref('stg_financial_transactions') }}
+),
+{% endif %}
 accounts as (
   select *
   from {{ ref('dim_accounts') }}
@@ -26,11 +71,10 @@ select
   tx.payment_method,
   tx.reference,
   accounts.first_seen_ts as account_first_seen_ts,
-  merchants.merchant_name as merchant_name
+  merchants.merchant_name as merchant_name,
+  tx.loaded_at
 from tx
 left join accounts
   on tx.account_id = accounts.account_id
 left join merchants
   on tx.merchant_id = merchants.merchant_id
-
-
@@ -1,7 +1,5 @@
-with source as (
-  select *
-  from {{ source('staging', 'financial_transactions') }}
-)
+-- Selects from the source directly (no import CTE): through a CTE, Postgres cannot
+-- push join keys into staging's indexes, which the incremental marts rely on.
 select
   transaction_id,
   account_id,
@@ -17,7 +15,6 @@ select
   payment_method,
   upper(status) as status,
   is_refund,
-  reference
-from source
-
-
+  reference,
+  loaded_at
+from {{ source('staging', 'financial_transactions') }}
@@ -1,3 +1,6 @@
+-- Initial warehouse schema (formerly sql/schema.sql). Idempotent, so it also applies
+-- cleanly to warehouses created by replaying that file.
+
 -- Warehouse schemas
 create schema if not exists raw;
 create schema if not exists staging;
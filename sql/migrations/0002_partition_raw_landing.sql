@@ -0,0 +1,83 @@
+-- Partition the raw landing table by ingestion day (UTC) and tag every row with the
+-- pipeline run that loaded it. Rows already landed are moved into the new layout.
+
+-- Registry of raw loads: one row per batch, written in the same transaction as its COPY.
+create table if not exists raw.load_batches (
+  load_batch_id text primary key,
+  ingestion_ts timestamptz not null,
+  row_count bigint not null,
+  source_file text
+);
+
+-- Create the daily partition holding `p_day` (UTC) unless it exists; returns its name.
+create or replace function raw.ensure_financial_transactions_raw_partition(p_day date)
+returns text
+language plpgsql
+as $$
+declare
+  part text := 'financial_transactions_raw_p' || to_char(p_day, 'YYYYMMDD');
+begin
+  if to_regclass('raw.' || part) is null then
+    -- Serialize concurrent loads creating the same day's partition.
+    perform pg_advisory_xact_lock(hashtext('raw.' || part));
+    execute format(
+      'create table if not exists raw.%I partition of raw.financial_transactions_raw
+         for values from (%L) to (%L)',
+      part,
+      p_day::timestamp at time zone 'UTC',
+      (p_day + 1)::timestamp at time zone 'UTC'
+    );
+  end if;
+  return part;
+end;
+$$;
+
+do $$
+declare
+  d date;
+begin
+  if exists (
+    select 1 from pg_partitioned_table where partrelid = to_regclass('raw.financial_transactions_raw')
+  ) then
+    return;
+  end if;
+
+  alter table raw.financial_transactions_raw rename to financial_transactions_raw_legacy;
+  alter index raw.idx_fin_txn_raw_transaction_id rename to idx_fin_txn_raw_legacy_transaction_id;
+
+  create table raw.financial_transactions_raw (
+    transaction_id text not null,
+    account_id text not null,
+    transaction_ts text,
+    posting_date text,
+    currency text,
+    amount text,
+    merchant_id text,
+    merchant_name text,
+    category text,
+    country text,
+    city text,
+    payment_method text,
+    status text,
+    is_refund text,
+    reference text,
+    ingestion_ts timestamptz not null default now(),
+    -- Set per load with set_config('pipeline.load_batch_id', ..., true); NULL for legacy rows.
+    load_batch_id text default nullif(current_setting('pipeline.load_batch_id', true), '')
+  ) partition by range (ingestion_ts);
+
+  create index idx_fin_txn_raw_transaction_id on raw.financial_transactions_raw (transaction_id);
+  create index idx_fin_txn_raw_ingestion_ts on raw.financial_transactions_raw using brin (ingestion_ts);
+
+  for d in
+    select distinct (ingestion_ts at time zone 'UTC')::date from raw.financial_transactions_raw_legacy
+  loop
+    perform raw.ensure_financial_transactions_raw_partition(d);
+  end loop;
+
+  insert into raw.financial_transactions_raw
+  select *, null from raw.financial_transactions_raw_legacy;
+
+  drop table raw.financial_transactions_raw_legacy;
+end;
+$$;
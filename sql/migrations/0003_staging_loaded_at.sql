@@ -0,0 +1,5 @@
+-- Load watermark for incremental dbt models: when each staging row was last inserted
+-- or changed. Existing rows get the migration time (a constant default, no rewrite).
+-- Its indexes are built concurrently by 0004.
+alter table staging.financial_transactions
+  add column if not exists loaded_at timestamptz not null default now();
@@ -0,0 +1,9 @@
+-- migrate:no-transaction
+-- Indexes for the incremental dbt models, built without blocking writes to staging.
+
+create index concurrently if not exists idx_fin_txn_staging_loaded_at
+  on staging.financial_transactions (loaded_at);
+
+-- Incremental fct_transactions re-reads the rows of merchants touched by a batch.
+create index concurrently if not exists idx_fin_txn_staging_merchant_id
+  on staging.financial_transactions (merchant_id);
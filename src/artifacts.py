@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_FORMATS = ("csv", "parquet", "arrow")
+
+_SUFFIXES = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+# Compression for columnar artifacts (both Parquet and Arrow IPC support zstd).
+_COMPRESSION = "zstd"
+
+# Most rows per Arrow IPC record batch / Parquet row group, so readers (e.g. the
+# staging COPY) never have to hold more than one bounded batch.
+ARTIFACT_BATCH_ROWS = 100_000
+
+# Tokens pandas.read_csv treats as missing by default. Columnar snapshots keep the raw
+# strings (like the raw landing table), so the same tokens are nulled on read to give
+# validate/transform exactly what they would get from the CSV.
+try:
+    from pandas._libs.parsers import STR_NA_VALUES as _PANDAS_NA_VALUES
+except ImportError:  # pragma: no cover (pandas internals moved)
+    _PANDAS_NA_VALUES = {
+        "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+        "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+    }
+
+
+def artifact_suffix(fmt: str) -> str:
+    try:
+        return _SUFFIXES[fmt]
+    except KeyError:
+        raise ValueError(f"Unsupported artifact format {fmt!r}; expected one of {ARTIFACT_FORMATS}") from None
+
+
+def artifact_format(path: Path) -> str:
+    for fmt, suffix in _SUFFIXES.items():
+        if path.suffix == suffix:
+            return fmt
+    raise ValueError(f"Unrecognized artifact file type: {path}")
+
+
+def snapshot_files(snapshot: Path) -> List[Path]:
+    """The files of a snapshot: itself, or for a multi-file snapshot directory its files in input order."""
+    if snapshot.is_dir():
+        return sorted(p for p in snapshot.iterdir() if p.is_file() and not p.name.startswith("."))
+    return [snapshot]
+
+
+def require_pyarrow() -> Any:
+    try:
+        import pyarrow
+        import pyarrow.acero  # noqa: F401
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.csv  # noqa: F401
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:  # pragma: no cover (depends on environment)
+        raise RuntimeError("Parquet/Arrow artifacts require pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+def staging_arrow_schema() -> Any:
+    """Arrow schema matching `staging.financial_transactions` (see sql/migrations/)."""
+    pa = require_pyarrow()
+    return pa.schema(
+        [
+            pa.field("transaction_id", pa.string(), nullable=False),
+            pa.field("account_id", pa.string(), nullable=False),
+            pa.field("transaction_ts", pa.timestamp("us", tz="UTC"), nullable=False),
+            pa.field("posting_date", pa.date32(), nullable=False),
+            pa.field("currency", pa.string(), nullable=False),
+            pa.field("amount", pa.decimal128(18, 2), nullable=False),
+            pa.field("merchant_id", pa.string()),
+            pa.field("merchant_name", pa.string()),
+            pa.field("category", pa.string(), nullable=False),
+            pa.field("country", pa.string()),
+            pa.field("city", pa.string()),
+            pa.field("payment_method", pa.string()),
+            pa.field("status", pa.string(), nullable=False),
+            pa.field("is_refund", pa.bool_(), nullable=False),
+            pa.field("reference", pa.string()),
+        ]
+    )
+
+
+def frame_to_arrow(df: pd.DataFrame, schema: Any) -> Any:
+    """Convert a typed clean frame to an Arrow table with exactly `schema`."""
+    pa = require_pyarrow()
+    df = df[list(schema.names)]
+    decimal_cols = [f.name for f in schema if pa.types.is_decimal(f.type)]
+    # Decimals go through float64 first, then a rounding cast to the target scale.
+    load_schema = pa.schema([pa.field(f.name, pa.float64()) if f.name in decimal_cols else f for f in schema])
+    table = pa.Table.from_pandas(df, schema=load_schema, preserve_index=False)
+    for name in decimal_cols:
+        idx = schema.get_field_index(name)
+        table = table.set_column(idx, schema.field(name), pa.compute.cast(table[name], schema.field(name).type, safe=False))
+    return table
+
+
+class ArrowArtifactWriter:
+    """Incrementally write typed frames to a compressed Parquet or Arrow IPC file."""
+
+    def __init__(self, path: Path, schema: Any) -> None:
+        pa = require_pyarrow()
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        fmt = self._format = artifact_format(path)
+        if fmt == "parquet":
+            self._writer = pa.parquet.ParquetWriter(str(path), schema, compression=_COMPRESSION)
+        elif fmt == "arrow":
+            options = pa.ipc.IpcWriteOptions(compression=_COMPRESSION)
+            self._writer = pa.ipc.new_file(str(path), schema, options=options)
+        else:
+            raise ValueError(f"ArrowArtifactWriter cannot write {path}")
+
+    def write_frame(self, df: pd.DataFrame) -> None:
+        self.write_table(frame_to_arrow(df, self.schema))
+
+    def write_table(self, table: Any) -> None:
+        if self._format == "parquet":
+            self._writer.write_table(table, row_group_size=ARTIFACT_BATCH_ROWS)
+        else:
+            self._writer.write_table(table, max_chunksize=ARTIFACT_BATCH_ROWS)
+        self.rows += table.num_rows
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def __enter__(self) -> "ArrowArtifactWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _text_convert_options(csv_path: Path, columns: Optional[Sequence[str]]) -> Any:
+    pa = require_pyarrow()
+    if columns is None:
+        columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    schema = pa.schema([pa.field(c, pa.string()) for c in columns])
+    return pa.csv.ConvertOptions(column_types=schema, strings_can_be_null=True, null_values=[""])
+
+
+def open_text_csv(csv_path: Path, *, columns: Optional[Sequence[str]] = None) -> Any:
+    """Open a streaming Arrow CSV reader that keeps every column as text (empty -> null)."""
+    pa = require_pyarrow()
+    return pa.csv.open_csv(str(csv_path), convert_options=_text_convert_options(csv_path, columns))
+
+
+def read_text_csv(csv_path: Path) -> Any:
+    """Read a whole CSV as an Arrow table with every column kept as text (empty -> null)."""
+    pa = require_pyarrow()
+    return pa.csv.read_csv(str(csv_path), convert_options=_text_convert_options(csv_path, None))
+
+
+def iter_text_csv_tables(csv_path: Path, rows: int) -> Iterator[Tuple[Any, bool]]:
+    """
+    Stream a CSV as text-only Arrow tables of exactly `rows` rows (the last one may be
+    shorter), each with whether it is the last: the reader stays one block ahead.
+    """
+    pa = require_pyarrow()
+    reader = open_text_csv(csv_path)
+    batches = iter(reader)
+    pending: List[Any] = []
+    pending_rows = 0
+    batch = next(batches, None)
+    while batch is not None:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        batch = next(batches, None)
+        while pending_rows >= rows:
+            table = pa.Table.from_batches(pending, schema=reader.schema)
+            rest = table.slice(rows)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+            yield table.slice(0, rows), batch is None and not pending_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending, schema=reader.schema), True
+
+
+def convert_csv_snapshot(csv_path: Path, out_path: Path, *, columns: Optional[Sequence[str]] = None) -> int:
+    """
+    Stream a raw CSV into a columnar snapshot with every column kept as text.
+
+    Only empty fields become null (what COPY ... FORMAT csv does for unquoted empties).
+    """
+    pa = require_pyarrow()
+    reader = open_text_csv(csv_path, columns=columns)
+    with ArrowArtifactWriter(out_path, reader.schema) as writer:
+        for batch in reader:
+            writer.write_table(pa.Table.from_batches([batch]))
+    logger.info("Wrote columnar snapshot: %s (rows=%s)", out_path, writer.rows)
+    return writer.rows
+
+
+def iter_artifact_batches(path: Path, *, batch_rows: Optional[int] = None) -> Iterator[Any]:
+    """Yield record batches from a Parquet or Arrow IPC artifact."""
+    pa = require_pyarrow()
+    fmt = artifact_format(path)
+    if fmt == "parquet":
+        kwargs = {"batch_size": batch_rows} if batch_rows else {}
+        yield from pa.parquet.ParquetFile(str(path)).iter_batches(**kwargs)
+    elif fmt == "arrow":
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                if batch_rows:
+                    for start in range(0, batch.num_rows, batch_rows):
+                        yield batch.slice(start, batch_rows)
+                else:
+                    yield batch
+    else:
+        raise ValueError(f"Not a columnar artifact: {path}")
+
+
+def artifact_schema(path: Path) -> Any:
+    pa = require_pyarrow()
+    if artifact_format(path) == "parquet":
+        return pa.parquet.read_schema(str(path))
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).schema
+
+
+def read_artifact_table(path: Path) -> Any:
+    pa = require_pyarrow()
+    if artifact_format(path) == "parquet":
+        return pa.parquet.read_table(str(path))
+    with pa.memory_map(str(path), "r") as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def artifact_row_count(path: Path) -> int:
+    """Rows in an artifact: from metadata for Parquet/Arrow IPC, a one-column scan for CSV."""
+    pa = require_pyarrow()
+    fmt = artifact_format(path)
+    if fmt == "parquet":
+        return pa.parquet.ParquetFile(str(path)).metadata.num_rows
+    if fmt == "arrow":
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    first = list(pd.read_csv(path, nrows=0).columns)[:1]
+    convert = pa.csv.ConvertOptions(include_columns=first, column_types={c: pa.string() for c in first})
+    return sum(batch.num_rows for batch in pa.csv.open_csv(str(path), convert_options=convert))
+
+
+def snapshot_frame_from_arrow(table: Any, *, categorical: Sequence[str] = ()) -> pd.DataFrame:
+    """
+    Convert a text-only snapshot table to the frame pandas.read_csv would give: its
+    missing-value tokens become NaN, `categorical` columns become categoricals and the
+    others compact Arrow-backed strings (NaN for missing, like object strings).
+    """
+    pa = require_pyarrow()
+    na_tokens = pa.array(sorted(_PANDAS_NA_VALUES))
+    columns = []
+    for name, column in zip(table.column_names, table.columns):
+        is_na = pa.compute.is_in(column, value_set=na_tokens)
+        if pa.compute.any(is_na).as_py():
+            column = pa.compute.if_else(is_na, None, column)
+        columns.append(column.dictionary_encode() if name in categorical else column)
+    df = pa.table(columns, names=table.column_names).to_pandas(
+        types_mapper={pa.string(): pd.StringDtype("pyarrow_numpy")}.get
+    )
+    # Return the replaced text columns to the OS before the caller's parsing starts.
+    pa.default_memory_pool().release_unused()
+    return df
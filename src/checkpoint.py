@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .extract import ExtractResult, write_json_atomic
+
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in execution order. Loading is split so a resumed run never
+# appends the raw snapshot twice.
+STAGES = ("extract", "validate", "transform", "load_raw", "load_staging", "dbt")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class RunState:
+    """
+    Run-state manifest (`run_state_<run_ts>.json`) recording which stages of one run
+    finished and the artifacts they produced. It is rewritten atomically after every
+    stage, so it always reflects the last stage that completed.
+    """
+
+    def __init__(self, path: Path, data: Dict[str, Any]) -> None:
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def create(cls, processed_dir: Path, extract_res: ExtractResult) -> "RunState":
+        path = processed_dir / f"run_state_{extract_res.run_ts}.json"
+        state = cls(
+            path,
+            {
+                "run_ts": extract_res.run_ts,
+                "input_sha256": extract_res.content_sha256,
+                "started_at": _now(),
+                "completed_at": None,
+                "stages": {},
+            },
+        )
+        state.complete(
+            "extract",
+            snapshot_path=str(extract_res.snapshot_path),
+            content_sha256=extract_res.content_sha256,
+            is_delta=extract_res.is_delta,
+            pending_watermark=extract_res.pending_watermark,
+        )
+        return state
+
+    @classmethod
+    def load(cls, path: Path) -> "RunState":
+        with path.open("r", encoding="utf-8") as f:
+            return cls(path, json.load(f))
+
+    @property
+    def run_ts(self) -> str:
+        return self.data["run_ts"]
+
+    @property
+    def completed(self) -> bool:
+        return self.data["completed_at"] is not None
+
+    def finished_stages(self) -> List[str]:
+        return [s for s in STAGES if s in self.data["stages"]]
+
+    def done(self, stage: str) -> bool:
+        return stage in self.data["stages"]
+
+    def artifacts(self, stage: str) -> Dict[str, Any]:
+        return self.data["stages"][stage]
+
+    def complete(self, stage: str, **artifacts: Any) -> None:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown pipeline stage {stage!r}")
+        self.data["stages"][stage] = {"finished_at": _now(), **artifacts}
+        write_json_atomic(self.path, self.data)
+        logger.info("Checkpoint: stage %s finished (run %s)", stage, self.run_ts)
+
+    def finish(self) -> None:
+        self.data["completed_at"] = _now()
+        write_json_atomic(self.path, self.data)
+
+    def extract_result(self) -> ExtractResult:
+        extract = self.artifacts("extract")
+        return ExtractResult(
+            run_ts=self.run_ts,
+            snapshot_path=Path(extract["snapshot_path"]),
+            content_sha256=extract["content_sha256"],
+            is_delta=extract["is_delta"],
+            pending_watermark=extract["pending_watermark"],
+        )
+
+
+def find_resumable_run(processed_dir: Path, input_sha256: Optional[str] = None) -> Optional[RunState]:
+    """
+    The latest run (of exactly `input_sha256`, if given) when it is unfinished and its
+    snapshot still exists; None if that run completed or there is none.
+
+    Without `input_sha256` (incremental extract, where the input keeps growing) the
+    latest run of any input qualifies, since its delta snapshot is self-contained.
+    """
+    for path in sorted(processed_dir.glob("run_state_*.json"), reverse=True):
+        state = RunState.load(path)
+        if input_sha256 is not None and state.data["input_sha256"] != input_sha256:
+            continue
+        if state.completed or not Path(state.artifacts("extract")["snapshot_path"]).exists():
+            return None
+        return state
+    return None
@@ -1,11 +1,20 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 from urllib.parse import urlparse
 
+from .artifacts import ARTIFACT_FORMATS
+from .dbt_runner import DBT_SELECT_MODES
+from .engine import ENGINES
+from .extract import EXTRACT_MODES, SNAPSHOT_LINK_MODES
+
+
+# How staging is refreshed: truncate + full reload, or upsert of the new batch.
+STAGING_MODES = ("replace", "incremental")
+
 
 @dataclass(frozen=True)
 class PostgresConfig:
@@ -14,21 +23,74 @@ class PostgresConfig:
     dbname: str
     user: str
     password: str
+    # Seconds libpq waits for one connection attempt.
+    connect_timeout: int = 10
+    # Total seconds to keep retrying an unreachable server before failing.
+    connect_max_wait: int = 60
 
 
 @dataclass(frozen=True)
 class PathsConfig:
     project_root: Path
+    # The input: one CSV file, or a directory (its *.csv files) or glob of CSV files.
     raw_input_csv: Path
     processed_dir: Path
-    schema_sql: Path
+    migrations_dir: Path
     dbt_project_dir: Path
+    # Prometheus textfile the run's stage metrics are also written to (optional).
+    metrics_textfile: Optional[Path] = None
+
+
+@dataclass(frozen=True)
+class ProcessingConfig:
+    # Rows per batch for streaming validation and the out-of-core transform (which
+    # also bounds its sorted spill runs); None reads the snapshot in one frame.
+    chunk_rows: Optional[int] = None
+    # Without chunk_rows: pick the batch size (or a whole-file read) per snapshot so
+    # validate/transform stay within about this many MB (split across input workers).
+    memory_budget_mb: Optional[int] = None
+    # File format of the clean output and of the raw snapshot: "csv", "parquet" or "arrow".
+    clean_format: str = "csv"
+    snapshot_format: str = "csv"
+    # Load staging straight from the in-memory clean frame (binary COPY) instead of
+    # from the clean artifact. Ignored when chunk_rows is set.
+    in_memory_load: bool = False
+    # Concurrent COPY streams (connections) for the staging load; 1 keeps a single COPY.
+    load_workers: int = 1
+    # "replace" truncates and reloads staging; "incremental" upserts the batch into it.
+    staging_mode: str = "replace"
+    # How a CSV snapshot is created from the input (see extract.SNAPSHOT_LINK_MODES).
+    snapshot_link: str = "auto"
+    # Exit early when the input's content hash was already loaded successfully.
+    skip_unchanged: bool = True
+    # "incremental" extracts only rows appended since the last successful run (and then
+    # always upserts staging, whatever staging_mode says).
+    extract_mode: str = "full"
+    # Run schema setup and the raw COPY alongside validate/transform (committed only
+    # once validation passes).
+    concurrent_stages: bool = False
+    # Drop raw landing partitions (one per UTC ingestion day) older than this many
+    # days after each load; None keeps raw history forever.
+    raw_retention_days: Optional[int] = None
+    # dbt node selection (see dbt_runner.DBT_SELECT_MODES).
+    dbt_select: str = "all"
+    # Worker processes validating/transforming the files of a multi-file input.
+    input_workers: int = 1
+    # Backend for the validation checks and cleaning rules (see engine.ENGINES).
+    engine: str = "pandas"
+    # Keep an on-disk index of the loaded transaction_ids (key_index.KeyIndex) to classify
+    # rows as new/updated/unchanged; incremental staging loads then COPY only changed rows.
+    key_index: bool = False
+    # Validate a single-file snapshot batch by batch and stop at the first batch after
+    # which it fails for certain, writing a partial report.
+    fail_fast: bool = False
 
 
 @dataclass(frozen=True)
 class AppConfig:
     pg: PostgresConfig
     paths: PathsConfig
+    processing: ProcessingConfig = ProcessingConfig()
 
 
 def _project_root() -> Path:
@@ -55,6 +117,30 @@ def _parse_database_url(database_url: str) -> Optional[PostgresConfig]:
     )
 
 
+def _optional_int_env(name: str) -> Optional[int]:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return None
+    value = int(raw)
+    if value <= 0:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+
+def _bool_env(name: str, default: bool = False) -> bool:
+    raw = os.getenv(name, "").strip().lower()
+    if not raw:
+        return default
+    return raw in {"1", "true", "yes", "on"}
+
+
+def _choice_env(name: str, default: str, choices: Sequence[str]) -> str:
+    value = os.getenv(name, "").strip().lower() or default
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
 def load_config() -> AppConfig:
     root = _project_root()
 
@@ -66,14 +152,41 @@ def load_config() -> AppConfig:
         user=os.getenv("POSTGRES_USER", "finance"),
         password=os.getenv("POSTGRES_PASSWORD", "finance_password"),
     )
+    pg = replace(
+        pg,
+        connect_timeout=_optional_int_env("POSTGRES_CONNECT_TIMEOUT") or pg.connect_timeout,
+        connect_max_wait=_optional_int_env("POSTGRES_CONNECT_MAX_WAIT") or pg.connect_max_wait,
+    )
 
+    metrics_textfile = os.getenv("PIPELINE_METRICS_TEXTFILE", "").strip()
+    raw_input = os.getenv("PIPELINE_INPUT", "").strip()
     paths = PathsConfig(
         project_root=root,
-        raw_input_csv=root / "data" / "raw" / "financial_transactions.csv",
+        raw_input_csv=Path(raw_input) if raw_input else root / "data" / "raw" / "financial_transactions.csv",
         processed_dir=root / "data" / "processed",
-        schema_sql=root / "sql" / "schema.sql",
+        migrations_dir=root / "sql" / "migrations",
         dbt_project_dir=root / "dbt",
+        metrics_textfile=Path(metrics_textfile) if metrics_textfile else None,
+    )
+    processing = ProcessingConfig(
+        chunk_rows=_optional_int_env("PIPELINE_CHUNK_ROWS"),
+        memory_budget_mb=_optional_int_env("PIPELINE_MEMORY_BUDGET_MB"),
+        clean_format=_choice_env("PIPELINE_CLEAN_FORMAT", "csv", ARTIFACT_FORMATS),
+        snapshot_format=_choice_env("PIPELINE_SNAPSHOT_FORMAT", "csv", ARTIFACT_FORMATS),
+        in_memory_load=_bool_env("PIPELINE_IN_MEMORY_LOAD"),
+        load_workers=_optional_int_env("PIPELINE_LOAD_WORKERS") or 1,
+        staging_mode=_choice_env("PIPELINE_STAGING_MODE", "replace", STAGING_MODES),
+        snapshot_link=_choice_env("PIPELINE_SNAPSHOT_LINK", "auto", SNAPSHOT_LINK_MODES),
+        skip_unchanged=_bool_env("PIPELINE_SKIP_UNCHANGED", default=True),
+        extract_mode=_choice_env("PIPELINE_EXTRACT_MODE", "full", EXTRACT_MODES),
+        concurrent_stages=_bool_env("PIPELINE_CONCURRENT_STAGES"),
+        raw_retention_days=_optional_int_env("PIPELINE_RAW_RETENTION_DAYS"),
+        dbt_select=_choice_env("PIPELINE_DBT_SELECT", "all", DBT_SELECT_MODES),
+        input_workers=_optional_int_env("PIPELINE_INPUT_WORKERS") or os.cpu_count() or 1,
+        engine=_choice_env("PIPELINE_ENGINE", "pandas", ENGINES),
+        key_index=_bool_env("PIPELINE_KEY_INDEX"),
+        fail_fast=_bool_env("PIPELINE_FAIL_FAST"),
     )
-    return AppConfig(pg=pg, paths=paths)
+    return AppConfig(pg=pg, paths=paths, processing=processing)
 
 
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import re
+import warnings
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+
+# Distinct strings sampled to infer the formats present in a column.
+_SAMPLE_UNIQUES = 512
+# Parsed values remembered per parser (across calls, e.g. chunks of one file).
+_CACHE_MAX_ENTRIES = 500_000
+
+_NAT = np.iinfo(np.int64).min
+
+# Directives whose strptime meaning matches what dateutil (behind format="mixed")
+# would read for the same string. Anything else (%y, %b, %p, ...) goes to the slow path.
+_SAFE_DIRECTIVES = frozenset("YmdHMSfz")
+
+
+def _is_fast_format(fmt: Optional[str], *, allow_tz: bool) -> bool:
+    if not fmt:
+        return False
+    directives = re.findall(r"%(.)", fmt)
+    if "Y" not in directives or not set(directives) <= _SAFE_DIRECTIVES:
+        return False
+    if not allow_tz and "z" in directives:
+        return False
+    return True
+
+
+def _is_day_first(fmt: str) -> bool:
+    directives = re.findall(r"%(.)", fmt)
+    return "m" in directives and "d" in directives and directives.index("d") < directives.index("m")
+
+
+def _month_first_twin(fmt: str) -> str:
+    return fmt.replace("%d", "\0").replace("%m", "%d").replace("\0", "%m")
+
+
+def infer_formats(values: np.ndarray, *, allow_tz: bool = True) -> List[str]:
+    """Fixed formats found in a sample of `values`, most common first."""
+    if not len(values):
+        return []
+    positions = np.unique(np.linspace(0, len(values) - 1, num=min(len(values), _SAMPLE_UNIQUES)).astype(int))
+    counts: Dict[str, int] = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for v in values[positions]:
+            fmt = guess_datetime_format(v) if isinstance(v, str) else None
+            if _is_fast_format(fmt, allow_tz=allow_tz):
+                counts[fmt] = counts.get(fmt, 0) + 1
+    formats = sorted(counts, key=counts.__getitem__, reverse=True)
+    # With dayfirst=False, dateutil reads a string day-first only when it is not a valid
+    # month-first date. So every day-first format goes last, after its month-first twin:
+    # the twin takes all strings valid both ways, leaving the day-first one the rest.
+    month_first = [f for f in formats if not _is_day_first(f)]
+    for fmt in formats:
+        if _is_day_first(fmt) and _month_first_twin(fmt) not in month_first:
+            month_first.append(_month_first_twin(fmt))
+    return month_first + [f for f in formats if _is_day_first(f)]
+
+
+def _to_i8(parsed: pd.Series) -> np.ndarray:
+    # For tz-aware data .values is UTC datetime64[ns]; NaT maps to int64 min.
+    return parsed.values.astype("datetime64[ns]").view("i8")
+
+
+def _parse_values(values: np.ndarray, *, utc: bool) -> Optional[np.ndarray]:
+    """
+    Parse distinct values to int64 nanoseconds (NaT as int64 min).
+
+    Each inferred format is tried strictly on whatever is still unparsed; the rest
+    goes through format="mixed", exactly as before. Returns None when the mixed
+    result is not a plain datetime64[ns] column (e.g. mixed offsets without utc),
+    so the caller can fall back to parsing the whole column the old way.
+    """
+    out = np.full(len(values), _NAT, dtype="i8")
+    is_str = np.array([isinstance(v, str) for v in values], dtype=bool)
+    remaining = is_str.copy()
+    for fmt in infer_formats(values[remaining], allow_tz=utc):
+        idx = np.flatnonzero(remaining)
+        if not len(idx):
+            break
+        parsed = pd.to_datetime(pd.Series(values[idx], dtype=object), format=fmt, errors="coerce", utc=utc)
+        ok = parsed.notna().to_numpy()
+        out[idx[ok]] = _to_i8(parsed[ok])
+        remaining[idx[ok]] = False
+
+    # Strings no fast format accepted, plus any non-string values.
+    rest = np.flatnonzero(remaining | ~is_str)
+    if len(rest):
+        parsed = pd.to_datetime(pd.Series(values[rest], dtype=object), errors="coerce", utc=utc, format="mixed")
+        expected = "datetime64[ns, UTC]" if utc else "datetime64[ns]"
+        if str(parsed.dtype) != expected:
+            return None
+        out[rest] = _to_i8(parsed)
+    return out
+
+
+class CachedDateParser:
+    """
+    `pd.to_datetime(series, errors="coerce", format="mixed")` (optionally utc=True)
+    that parses every distinct string once and remembers the results across calls.
+    """
+
+    def __init__(self, *, utc: bool, max_entries: int = _CACHE_MAX_ENTRIES) -> None:
+        self.utc = utc
+        self.max_entries = max_entries
+        # Cache as a hash index of parsed strings plus their int64 ns values, so lookups
+        # are a single vectorized get_indexer call.
+        self._keys = pd.Index([], dtype=object)
+        self._values = np.empty(0, dtype="i8")
+
+    def _reference(self, series: pd.Series) -> pd.Series:
+        return pd.to_datetime(series, errors="coerce", utc=self.utc, format="mixed")
+
+    def parse(self, series: pd.Series) -> pd.Series:
+        codes, uniques = pd.factorize(series)
+        uniques = np.asarray(uniques, dtype=object)
+
+        pos = self._keys.get_indexer(uniques)
+        missing = pos < 0
+        cached = np.full(len(uniques), _NAT, dtype="i8")
+        cached[~missing] = self._values[pos[~missing]]
+        if missing.any():
+            parsed = _parse_values(uniques[missing], utc=self.utc)
+            if parsed is None:
+                return self._reference(series)
+            cached[missing] = parsed
+            room = self.max_entries - len(self._keys)
+            # Values that (almost) never repeat within a batch, such as second-resolution
+            # timestamps, would rarely be hit again; keeping them only costs memory.
+            if room > 0 and len(uniques) <= len(series) // 2:
+                self._keys = self._keys.append(pd.Index(uniques[missing][:room], dtype=object))
+                self._values = np.concatenate([self._values, parsed[:room]])
+
+        # Missing input (code -1) indexes the trailing NaT.
+        i8 = np.append(cached, _NAT)[codes]
+        result = pd.Series(i8.view("datetime64[ns]"), index=series.index, name=series.name)
+        return result.dt.tz_localize("UTC") if self.utc else result
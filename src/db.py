@@ -1,47 +1,190 @@
 from __future__ import annotations
 
+import io
 import logging
+import random
+import threading
 import time
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Iterable, List, Optional, Sequence
+from typing import Any, Iterable, Iterator, Optional, Sequence, Tuple
 
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN
 from psycopg2.extensions import connection as PgConnection
+from psycopg2.pool import ThreadedConnectionPool
 
 from .config import PostgresConfig
 
 
 logger = logging.getLogger(__name__)
 
+# Bytes handed to libpq per read when streaming an in-memory COPY payload.
+_COPY_READ_SIZE = 1 << 20
 
-def connect_with_retries(
+
+# The health probe's own deadline: seconds per connection attempt, and in total.
+PROBE_CONNECT_TIMEOUT = 3
+PROBE_MAX_WAIT = 5.0
+
+# Messages of connection errors that retrying cannot fix (bad credentials or target).
+_FATAL_CONNECT_ERRORS = (
+    "password authentication failed",
+    "no pg_hba.conf entry",
+    "does not exist",
+)
+
+
+def _connect_once(cfg: PostgresConfig) -> PgConnection:
+    conn = psycopg2.connect(
+        host=cfg.host,
+        port=cfg.port,
+        dbname=cfg.dbname,
+        user=cfg.user,
+        password=cfg.password,
+        connect_timeout=cfg.connect_timeout,
+    )
+    conn.autocommit = False
+    return conn
+
+
+def _backoff_delay(attempt: int, *, base_delay: float, max_delay: float) -> float:
+    # Capped exponential backoff with full jitter.
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def _connect_with_backoff(
     cfg: PostgresConfig,
     *,
-    max_attempts: int = 30,
-    sleep_seconds: float = 2.0,
-) -> PgConnection:
-    last_err: Optional[Exception] = None
-    for attempt in range(1, max_attempts + 1):
+    base_delay: float = 0.25,
+    max_delay: float = 4.0,
+) -> Tuple[PgConnection, int]:
+    """Connect, retrying transient failures until `cfg.connect_max_wait` elapses; returns (conn, attempts)."""
+    deadline = time.monotonic() + cfg.connect_max_wait
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            conn = psycopg2.connect(
-                host=cfg.host,
-                port=cfg.port,
-                dbname=cfg.dbname,
-                user=cfg.user,
-                password=cfg.password,
-            )
-            conn.autocommit = False
-            return conn
-        except Exception as e:  # pragma: no cover (timing-dependent)
-            last_err = e
-            logger.warning(
-                "Postgres connection attempt %s/%s failed: %s",
-                attempt,
-                max_attempts,
-                str(e),
-            )
-            time.sleep(sleep_seconds)
-    raise RuntimeError(f"Could not connect to Postgres after {max_attempts} attempts: {last_err}")
+            return _connect_once(cfg), attempt
+        except psycopg2.OperationalError as e:
+            message = str(e).strip()
+            if any(fatal in message for fatal in _FATAL_CONNECT_ERRORS):
+                raise RuntimeError(f"Could not connect to Postgres: {message}") from e
+            delay = _backoff_delay(attempt, base_delay=base_delay, max_delay=max_delay)
+            if time.monotonic() + delay > deadline:
+                raise RuntimeError(
+                    f"Could not connect to Postgres after {attempt} attempts in {cfg.connect_max_wait:.0f}s: {message}"
+                ) from e
+            logger.warning("Postgres connection attempt %s failed: %s (retrying in %.2fs)", attempt, message, delay)
+            time.sleep(delay)
+
+
+def connect_with_retries(cfg: PostgresConfig) -> PgConnection:
+    return _connect_with_backoff(cfg)[0]
+
+
+@dataclass
+class PoolStats:
+    opened: int = 0
+    checkouts: int = 0
+    discarded: int = 0
+    connect_attempts: int = 0
+    connect_seconds: float = 0.0
+    in_use: int = 0
+    peak_in_use: int = 0
+
+
+class ConnectionPool(ThreadedConnectionPool):
+    """
+    Thread-safe psycopg2 pool shared by every load step of a run.
+
+    New connections go through the capped-backoff connect; connections handed back
+    are rolled back (if mid-transaction) and reused, and broken ones are dropped.
+    """
+
+    def __init__(self, cfg: PostgresConfig, *, max_size: int = 4) -> None:
+        self.cfg = cfg
+        self.stats = PoolStats()
+        self._stats_lock = threading.Lock()
+        super().__init__(0, max_size)
+        # Open lazily, but keep every returned connection idle for reuse (the base
+        # class closes those beyond minconn).
+        self.minconn = max_size
+
+    def _connect(self, key: Any = None, cfg: Optional[PostgresConfig] = None) -> PgConnection:
+        # Called by the base class (under its lock) when no idle connection is free.
+        started = time.monotonic()
+        conn, attempts = _connect_with_backoff(cfg or self.cfg)
+        with self._stats_lock:
+            self.stats.opened += 1
+            self.stats.connect_attempts += attempts
+            self.stats.connect_seconds += time.monotonic() - started
+        if key is not None:
+            self._used[key] = conn
+            self._rused[id(conn)] = key
+        else:
+            self._pool.append(conn)
+        return conn
+
+    def getconn(self, key: Any = None) -> PgConnection:
+        conn = super().getconn(key)
+        while conn.closed or conn.info.transaction_status == TRANSACTION_STATUS_UNKNOWN:
+            super().putconn(conn, close=True)
+            with self._stats_lock:
+                self.stats.discarded += 1
+            conn = super().getconn(key)
+        with self._stats_lock:
+            self.stats.checkouts += 1
+            self.stats.in_use += 1
+            self.stats.peak_in_use = max(self.stats.peak_in_use, self.stats.in_use)
+        return conn
+
+    def putconn(self, conn: PgConnection, key: Any = None, close: bool = False) -> None:
+        with self._stats_lock:
+            self.stats.in_use -= 1
+        super().putconn(conn, key=key, close=close or bool(conn.closed))
+
+    @contextmanager
+    def connection(self) -> Iterator[PgConnection]:
+        conn = self.getconn()
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def probe(self, *, max_wait: float = PROBE_MAX_WAIT) -> float:
+        """
+        Fail fast if Postgres is unreachable: run `select 1` on a pooled connection;
+        returns seconds. A new connection gets at most `max_wait` seconds (not the
+        pool's `connect_max_wait`) and then stays in the pool for reuse.
+        """
+        started = time.monotonic()
+        cfg = replace(
+            self.cfg,
+            connect_timeout=min(self.cfg.connect_timeout, PROBE_CONNECT_TIMEOUT),
+            connect_max_wait=min(self.cfg.connect_max_wait, max_wait),
+        )
+        with self._lock:
+            if not self._pool:
+                self._connect(cfg=cfg)
+        with self.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("select 1;")
+            conn.rollback()
+        return time.monotonic() - started
+
+    def log_stats(self) -> None:
+        s = self.stats
+        logger.info(
+            "Postgres pool: checkouts=%s opened=%s discarded=%s connect_attempts=%s connect_wait=%.2fs peak_in_use=%s",
+            s.checkouts,
+            s.opened,
+            s.discarded,
+            s.connect_attempts,
+            s.connect_seconds,
+            s.peak_in_use,
+        )
 
 
 def run_sql_file(conn: PgConnection, sql_file: Path) -> None:
@@ -57,11 +200,99 @@ def copy_csv(
     csv_path: Path,
     table_fqn: str,
     columns: Sequence[str],
-) -> None:
+    commit: bool = True,
+) -> int:
     cols = ", ".join(columns)
     sql = f"COPY {table_fqn} ({cols}) FROM STDIN WITH (FORMAT csv, HEADER true)"
     with conn.cursor() as cur, csv_path.open("r", encoding="utf-8") as f:
-        cur.copy_expert(sql=sql, file=f)
-    conn.commit()
+        cur.copy_expert(sql=sql, file=f, size=_COPY_READ_SIZE)
+        rows = cur.rowcount
+    if commit:
+        conn.commit()
+    return rows
+
 
+class _IterStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (for COPY FROM STDIN)."""
 
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buf = memoryview(b"")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        while self._pos >= len(self._buf):
+            try:
+                self._buf = memoryview(next(self._chunks))
+            except StopIteration:
+                return 0
+            self._pos = 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+
+def copy_binary(
+    conn: PgConnection,
+    *,
+    batches: Iterable[Any],
+    table_fqn: str,
+    columns: Sequence[str],
+    commit: bool = True,
+) -> int:
+    """
+    COPY Arrow record batches into a table using PostgreSQL's binary COPY format.
+
+    Batches are encoded in memory one at a time and streamed into a single COPY, so
+    no temp file is written and Postgres does not parse any text.
+    """
+    from .pg_binary import COPY_HEADER, COPY_TRAILER, encode_record_batch
+
+    def chunks() -> Iterator[bytes]:
+        yield COPY_HEADER
+        for batch in batches:
+            yield encode_record_batch(batch.select(list(columns)))
+        yield COPY_TRAILER
+
+    cols = ", ".join(columns)
+    sql = f"COPY {table_fqn} ({cols}) FROM STDIN WITH (FORMAT binary)"
+    with conn.cursor() as cur:
+        cur.copy_expert(sql=sql, file=_IterStream(chunks()), size=_COPY_READ_SIZE)
+        rows = cur.rowcount
+    if commit:
+        conn.commit()
+    return rows
+
+
+def copy_csv_batches(
+    conn: PgConnection,
+    *,
+    batches: Iterable[Any],
+    table_fqn: str,
+    columns: Sequence[str],
+    commit: bool = True,
+) -> int:
+    """COPY text-typed Arrow record batches as CSV (Postgres does the type parsing)."""
+    from .artifacts import require_pyarrow
+
+    pa = require_pyarrow()
+    options = pa.csv.WriteOptions(include_header=False)
+
+    def chunks() -> Iterator[bytes]:
+        for batch in batches:
+            sink = pa.BufferOutputStream()
+            pa.csv.write_csv(batch.select(list(columns)), sink, write_options=options)
+            yield sink.getvalue().to_pybytes()
+
+    cols = ", ".join(columns)
+    sql = f"COPY {table_fqn} ({cols}) FROM STDIN WITH (FORMAT csv)"
+    with conn.cursor() as cur:
+        cur.copy_expert(sql=sql, file=_IterStream(chunks()), size=_COPY_READ_SIZE)
+        rows = cur.rowcount
+    if commit:
+        conn.commit()
+    return rows
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import shutil
+import subprocess
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+from .metrics import RunMetrics
+
+
+logger = logging.getLogger(__name__)
+
+# Which models `dbt run` / `dbt test` build: "all", or "state" (only those whose code
+# changed or whose sources got fresher since the last successful run, plus children).
+DBT_SELECT_MODES = ("all", "state")
+
+_STATE_SELECTOR = ["state:modified+", "source_status:fresher+"]
+# Artifacts kept from the last successful run for state comparison.
+_STATE_ARTIFACTS = ("manifest.json", "sources.json")
+# Written into dbt_packages/ after `dbt deps`: hash of the package spec it installed.
+_DEPS_STAMP = ".deps_sha256"
+_PACKAGE_FILES = ("packages.yml", "package-lock.yml")
+
+
+class DbtError(RuntimeError):
+    pass
+
+
+def _load_runner() -> Optional[Any]:
+    try:
+        from dbt.cli.main import dbtRunner
+    except ImportError:  # pragma: no cover (depends on environment)
+        return None
+    return dbtRunner
+
+
+def _rows_affected(result: Any) -> Optional[int]:
+    # In-process `run` results carry each model's adapter response.
+    counts = []
+    for node in getattr(result, "results", None) or []:
+        rows = (getattr(node, "adapter_response", None) or {}).get("rows_affected")
+        if isinstance(rows, int) and rows >= 0:
+            counts.append(rows)
+    return sum(counts) if counts else None
+
+
+def _packages_sha256(project_dir: Path) -> str:
+    h = hashlib.sha256()
+    for name in _PACKAGE_FILES:
+        path = project_dir / name
+        h.update(name.encode())
+        h.update(path.read_bytes() if path.exists() else b"\0")
+    return h.hexdigest()
+
+
+class DbtProject:
+    """
+    Runs dbt commands for one project, in-process through dbt's programmatic runner
+    when dbt-core is importable (parsing the project once and sharing the manifest
+    between commands), else through the `dbt` CLI.
+
+    With `metrics`, every command is recorded as a stage named after it (`dbt_run`).
+    """
+
+    def __init__(self, project_dir: Path, profiles_dir: Path, *, metrics: Optional[RunMetrics] = None) -> None:
+        self.project_dir = project_dir
+        self.profiles_dir = profiles_dir
+        self.metrics = metrics
+        self._runner_cls = _load_runner()
+        self._manifest: Any = None
+        if self._runner_cls is None:
+            logger.info("dbt-core is not importable here; running dbt through its CLI")
+
+    def _invoke(self, args: List[str]) -> Any:
+        command = "_".join(args[:2]) if args[0] == "source" else args[0]
+        stage = self.metrics.stage(f"dbt_{command}") if self.metrics is not None else nullcontext()
+        with stage as m:
+            args = args + ["--profiles-dir", str(self.profiles_dir), "--project-dir", str(self.project_dir)]
+            result = self._invoke_dbt(args)
+            if m is not None:
+                m.rows_out = _rows_affected(result)
+        return result
+
+    def _invoke_dbt(self, args: List[str]) -> Any:
+        if self._runner_cls is None:
+            try:
+                subprocess.run(["dbt"] + args, check=True)
+            except subprocess.CalledProcessError as e:
+                raise DbtError(f"dbt {args[0]} failed (exit code {e.returncode})") from e
+            return None
+        result = self._runner_cls(manifest=self._manifest).invoke(args)
+        if not result.success:
+            raise DbtError(f"dbt {args[0]} failed: {result.exception or 'see the dbt log above'}")
+        return result.result
+
+    def deps(self) -> None:
+        """Install packages unless dbt_packages/ already holds the current package spec."""
+        stamp = self.project_dir / "dbt_packages" / _DEPS_STAMP
+        if stamp.exists() and stamp.read_text().strip() == _packages_sha256(self.project_dir):
+            logger.info("dbt packages up to date; skipping dbt deps")
+            return
+        logger.info("Running dbt deps")
+        self._invoke(["deps"])
+        stamp.parent.mkdir(parents=True, exist_ok=True)
+        stamp.write_text(_packages_sha256(self.project_dir) + "\n")
+
+    def parse(self) -> None:
+        if self._runner_cls is None:
+            return  # every CLI command parses the project itself
+        logger.info("Parsing dbt project")
+        self._manifest = self._invoke(["parse"])
+
+    def source_freshness(self) -> None:
+        logger.info("Running dbt source freshness")
+        self._invoke(["source", "freshness"])
+
+    def run(self, *, select: Sequence[str] = (), state_dir: Optional[Path] = None, full_refresh: bool = False) -> None:
+        logger.info("Running dbt run%s", " (full refresh)" if full_refresh else "")
+        self._invoke(["run"] + _selection(select, state_dir) + (["--full-refresh"] if full_refresh else []))
+
+    def test(self, *, select: Sequence[str] = (), state_dir: Optional[Path] = None) -> None:
+        logger.info("Running dbt test")
+        self._invoke(["test"] + _selection(select, state_dir))
+
+    def save_state(self, state_dir: Path) -> None:
+        """Keep this run's manifest and source freshness as the baseline for the next run."""
+        state_dir.mkdir(parents=True, exist_ok=True)
+        for name in _STATE_ARTIFACTS:
+            src = self.project_dir / "target" / name
+            if src.exists():
+                shutil.copyfile(src, state_dir / f".{name}.tmp")
+                (state_dir / f".{name}.tmp").replace(state_dir / name)
+
+
+def _selection(select: Sequence[str], state_dir: Optional[Path]) -> List[str]:
+    args = ["--select", *select] if select else []
+    if state_dir is not None:
+        args += ["--state", str(state_dir)]
+    return args
+
+
+def run_dbt(
+    project_dir: Path,
+    *,
+    profiles_dir: Path,
+    full_refresh: bool = False,
+    select_mode: str = "all",
+    state_dir: Optional[Path] = None,
+    metrics: Optional[RunMetrics] = None,
+) -> None:
+    """
+    deps (when the package spec changed), run and test the project.
+
+    With select_mode="state", only models whose code changed or whose sources got
+    fresher since the last successful run (and their children) are run and tested;
+    the first run, with nothing to compare against, builds everything.
+    """
+    project = DbtProject(project_dir, profiles_dir, metrics=metrics)
+    project.deps()
+    project.parse()
+
+    select: List[str] = []
+    compare_dir = None
+    if select_mode == "state":
+        if state_dir is None:
+            raise ValueError("select_mode='state' needs a state_dir")
+        project.source_freshness()
+        if all((state_dir / name).exists() for name in _STATE_ARTIFACTS):
+            select, compare_dir = _STATE_SELECTOR, state_dir
+            logger.info("Selecting dbt nodes changed since the last successful run: %s", " ".join(select))
+        else:
+            logger.info("No dbt state from an earlier run in %s; building everything", state_dir)
+
+    project.run(select=select, state_dir=compare_dir, full_refresh=full_refresh)
+    project.test(select=select, state_dir=compare_dir)
+    if state_dir is not None:
+        project.save_state(state_dir)
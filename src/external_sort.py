@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import logging
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# Rows per pickled block inside a run file when no merge budget is given.
+DEFAULT_BLOCK_ROWS = 8192
+# Most runs merged at once; more runs are merged in several passes.
+MAX_FAN_IN = 64
+# Smallest block read from a run at a time: smaller blocks cost more in per-step
+# overhead than they save in memory.
+MIN_BLOCK_ROWS = 1024
+
+# A block of rows in the merge: one numpy array per column (tz-aware timestamps as
+# UTC datetime64[ns], categoricals and Arrow strings as object arrays), so that
+# concatenating, sorting and slicing blocks needs no per-dtype handling.
+_Columns = Dict[str, np.ndarray]
+
+
+def merge_plan(budget_rows: int) -> Tuple[int, int]:
+    """
+    (fan-in, block rows) for merging within about `budget_rows` buffered rows: the
+    merge holds about one block per input run, so the budget is split across the fan-in.
+    """
+    fan_in = min(MAX_FAN_IN, max(2, budget_rows // MIN_BLOCK_ROWS))
+    return fan_in, max(MIN_BLOCK_ROWS, budget_rows // fan_in)
+
+
+def write_run(df: pd.DataFrame, path: Path, *, block_rows: int = DEFAULT_BLOCK_ROWS) -> None:
+    """Spill an already-sorted frame to `path` as a sequence of pickled blocks."""
+    _write_blocks((df.iloc[start : start + block_rows] for start in range(0, len(df), block_rows)), path)
+
+
+def _write_blocks(blocks: Iterable[pd.DataFrame], path: Path) -> None:
+    with path.open("wb") as f:
+        for block in blocks:
+            pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def iter_run_blocks(path: Path) -> Iterator[pd.DataFrame]:
+    """Stream the blocks of a run file back as frames, one at a time."""
+    with path.open("rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def read_run(path: Path) -> pd.DataFrame:
+    """Load a whole run file back as one frame."""
+    return pd.concat(list(iter_run_blocks(path)), ignore_index=True)
+
+
+def _to_columns(df: pd.DataFrame, timezones: Dict[str, Any]) -> _Columns:
+    columns = {}
+    for name, series in df.items():
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            timezones[name] = series.dtype.tz
+            columns[name] = series.to_numpy(dtype="datetime64[ns]")
+        else:
+            columns[name] = series.to_numpy()
+    return columns
+
+
+def _to_frame(columns: _Columns, timezones: Dict[str, Any]) -> pd.DataFrame:
+    df = pd.DataFrame(columns, copy=False)
+    for name, tz in timezones.items():
+        df[name] = df[name].dt.tz_localize("UTC").dt.tz_convert(tz)
+    return df
+
+
+def _rows(columns: _Columns) -> int:
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def _take(columns: _Columns, index: Any) -> _Columns:
+    return {name: values[index] for name, values in columns.items()}
+
+
+def _concat(blocks: Sequence[_Columns]) -> _Columns:
+    blocks = [b for b in blocks if _rows(b)]
+    if len(blocks) <= 1:
+        return blocks[0] if blocks else {}
+    return {name: np.concatenate([b[name] for b in blocks]) for name in blocks[0]}
+
+
+def _key_at(columns: _Columns, keys: Sequence[str], i: int) -> Tuple:
+    return tuple(columns[k][i] for k in keys)
+
+
+def _rows_below(columns: _Columns, keys: Sequence[str], bound: Tuple) -> int:
+    """Rows at the start of a sorted block whose key sorts strictly before `bound` (bisection)."""
+    lo, hi = 0, _rows(columns)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if _key_at(columns, keys, mid) < bound:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def _sorted(columns: _Columns, keys: Sequence[str]) -> _Columns:
+    # One stable argsort per key, least significant first: a stable multi-key sort.
+    order = np.arange(_rows(columns))
+    for key in reversed(keys):
+        order = order[np.argsort(columns[key][order], kind="stable")]
+    return _take(columns, order)
+
+
+def _next_block(reader: Iterator[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    for block in reader:
+        if len(block):
+            return block
+    return None
+
+
+def _merge_pass(paths: Sequence[Path], keys: Sequence[str], rows: int, block_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Merge sorted runs block by block into sorted frames of `rows` rows (the last one
+    may be shorter).
+
+    Every step emits, from all buffered blocks at once (one concatenate and stable
+    sort), the rows that sort before the smallest last key buffered by a run with
+    more blocks to come: no later block can hold a smaller key. Then every run left
+    with less than `block_rows` buffered rows reads its next block, and so does any
+    run holding that smallest key, so each run buffers at most about two blocks.
+    Rows with equal keys come out in the order of `paths`.
+    """
+    timezones: Dict[str, Any] = {}
+    readers = [iter_run_blocks(p) for p in paths]
+    buffers: List[_Columns] = [{} for _ in paths]
+    live = [True] * len(paths)
+    refill = set(range(len(paths)))
+    pending: List[_Columns] = []
+    pending_rows = 0
+    while True:
+        for i in refill:
+            block = _next_block(readers[i])
+            if block is None:
+                live[i] = False
+            else:
+                buffers[i] = _concat([buffers[i], _to_columns(block, timezones)])
+        # The last key buffered by each run with more blocks to come.
+        last = {i: _key_at(buffers[i], keys, _rows(buffers[i]) - 1) for i, alive in enumerate(live) if alive}
+        bound = min(last.values()) if last else None
+        parts = []
+        for i, buffer in enumerate(buffers):
+            cut = _rows(buffer) if bound is None else _rows_below(buffer, keys, bound)
+            if cut:
+                parts.append(_take(buffer, slice(0, cut)))
+                buffers[i] = _take(buffer, slice(cut, None))
+        if parts:
+            pending.append(_sorted(_concat(parts), keys))
+            pending_rows += _rows(pending[-1])
+        if pending_rows >= rows or (bound is None and pending_rows):
+            merged = _concat(pending)
+            cut = pending_rows if bound is None else pending_rows - pending_rows % rows
+            for start in range(0, cut, rows):
+                yield _to_frame(_take(merged, slice(start, start + rows)), timezones)
+            pending = [_take(merged, slice(cut, None))]
+            pending_rows -= cut
+        if bound is None:
+            return
+        refill = {i for i, key in last.items() if key == bound or _rows(buffers[i]) < block_rows}
+
+
+def merge_runs(paths: Sequence[Path], keys: Sequence[str], *, budget_rows: int) -> Iterator[pd.DataFrame]:
+    """
+    Merge sorted runs into sorted frames of `budget_rows` rows, buffering about that
+    many rows per pass (see merge_plan).
+
+    More runs than the fan-in are first merged in passes over consecutive groups,
+    each written back as one run next to its inputs (which are deleted), so at most
+    fan-in runs are open at once. Stable across runs: rows with equal keys come out
+    in the order of `paths`, so runs written in input order preserve input order for
+    ties.
+    """
+    fan_in, block_rows = merge_plan(budget_rows)
+    paths = list(paths)
+    level = 0
+    while len(paths) > fan_in:
+        level += 1
+        logger.info("Merge pass %s: %s runs in groups of %s", level, len(paths), fan_in)
+        merged = []
+        for g, start in enumerate(range(0, len(paths), fan_in)):
+            group = paths[start : start + fan_in]
+            out = group[0].with_name(f"merge_{level:02d}_{g:06d}.pkl")
+            _write_blocks(_merge_pass(group, keys, block_rows, block_rows), out)
+            for p in group:
+                p.unlink()
+            merged.append(out)
+        paths = merged
+    return _merge_pass(paths, keys, budget_rows, block_rows)
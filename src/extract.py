@@ -1,35 +1,491 @@
 from __future__ import annotations
 
+import errno
+import glob
+import hashlib
+import json
 import logging
+import os
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .artifacts import artifact_format, artifact_suffix, convert_csv_snapshot, snapshot_files
 
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_NAME = "extract_manifest.json"
+WATERMARK_NAME = "extract_watermark.json"
+
+# "full" snapshots the whole input; "incremental" only the rows appended since the
+# last successful run (tracked by a byte-offset watermark).
+EXTRACT_MODES = ("full", "incremental")
+
+# How a CSV snapshot is materialized from the input:
+#   "auto": reflink (copy-on-write clone) where the filesystem supports it, else a byte copy.
+#   "hardlink": share the input's inode (only safe if upstream replaces the file rather
+#     than editing it in place), falling back like "auto".
+#   "copy": always a byte copy.
+SNAPSHOT_LINK_MODES = ("auto", "hardlink", "copy")
+
+_HASH_BLOCK_BYTES = 1 << 20
+# Bytes just before the watermark offset that are checksummed to detect rewrites.
+_WATERMARK_TAIL_BYTES = 64 * 1024
+_FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+_GLOB_CHARS = "*?["
+
 
 @dataclass(frozen=True)
 class ExtractResult:
     run_ts: str
     snapshot_path: Path
+    content_sha256: str = ""
+    # The same input bytes were already loaded by an earlier successful run.
+    already_loaded: bool = False
+    # The snapshot holds only rows appended since the previous watermark.
+    is_delta: bool = False
+    # Watermark to commit once the snapshot has been loaded successfully.
+    pending_watermark: Optional[Dict[str, Any]] = None
 
 
 def _run_ts() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
 
 
-def extract_csv(raw_input_csv: Path, processed_dir: Path) -> ExtractResult:
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_manifest(processed_dir: Path) -> Dict[str, Any]:
+    path = processed_dir / MANIFEST_NAME
+    if not path.exists():
+        return {"snapshots": {}}
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json_atomic(path: Path, payload: Dict[str, Any]) -> None:
+    # Write then rename, so a crash never leaves a truncated file behind.
+    tmp = path.with_suffix(".json.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def write_manifest(processed_dir: Path, manifest: Dict[str, Any]) -> Path:
+    path = processed_dir / MANIFEST_NAME
+    write_json_atomic(path, manifest)
+    return path
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover (non-POSIX)
+        return False
+    with src.open("rb") as s, dst.open("wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in {errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS}:
+                raise
+    dst.unlink()
+    return False
+
+
+def _copy_hashing(src: Path, dst: Path) -> str:
+    """Copy `src` to `dst` in one pass that also hashes the bytes copied; returns their SHA-256."""
+    h = hashlib.sha256()
+    with src.open("rb") as s, dst.open("wb") as d:
+        for block in iter(lambda: s.read(_HASH_BLOCK_BYTES), b""):
+            h.update(block)
+            d.write(block)
+    return h.hexdigest()
+
+
+def _materialize(src: Path, dst: Path, *, link_mode: str, hashed: bool) -> Tuple[str, Optional[str]]:
+    if link_mode not in SNAPSHOT_LINK_MODES:
+        raise ValueError(f"Unsupported snapshot link mode {link_mode!r}; expected one of {SNAPSHOT_LINK_MODES}")
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return "hardlink", sha256_file(dst) if hashed else None
+        except OSError as e:
+            logger.info("Hardlink not possible (%s); falling back", e)
+    if link_mode != "copy" and _reflink(src, dst):
+        # The clone no longer changes with the input, so it is what gets hashed.
+        return "reflink", sha256_file(dst) if hashed else None
+    if hashed:
+        return "copy", _copy_hashing(src, dst)
+    shutil.copyfile(src, dst)
+    return "copy", None
+
+
+def materialize_snapshot(src: Path, dst: Path, *, link_mode: str = "auto") -> str:
+    """Create `dst` with the bytes of `src` as cheaply as the filesystem allows; returns the method used."""
+    return _materialize(src, dst, link_mode=link_mode, hashed=False)[0]
+
+
+def _last_loaded(manifest: Dict[str, Any]) -> Optional[str]:
+    """Digest of the input the last successful run loaded."""
+    if "last_loaded" in manifest:
+        return manifest["last_loaded"]
+    # Manifests written before it was recorded: the latest loaded_at.
+    loaded = [(entry["loaded_at"], digest) for digest, entry in manifest["snapshots"].items() if entry.get("loaded_at")]
+    return max(loaded)[1] if loaded else None
+
+
+def _reusable_snapshot(processed_dir: Path, entry: Optional[Dict[str, Any]], snapshot_format: str) -> Optional[Path]:
+    if not entry or not entry.get("snapshot"):
+        return None
+    path = processed_dir / entry["snapshot"]
+    if path.exists() and all(artifact_format(f) == snapshot_format for f in snapshot_files(path)):
+        return path
+    return None
+
+
+def _known_snapshot(
+    processed_dir: Path,
+    manifest: Dict[str, Any],
+    digest: str,
+    run_ts: str,
+    *,
+    snapshot_format: str,
+    skip_loaded: bool,
+) -> Optional[ExtractResult]:
+    """
+    The result for input bytes the manifest already knows: skipped when they are what
+    the last successful run loaded, else their existing snapshot if still there.
+    """
+    entry = manifest["snapshots"].get(digest)
+    if entry and entry.get("loaded_at") and skip_loaded and _last_loaded(manifest) == digest:
+        logger.info(
+            "Input unchanged since run %s (sha256=%s, loaded at %s); nothing to do",
+            entry.get("run_ts"),
+            digest,
+            entry["loaded_at"],
+        )
+        return ExtractResult(
+            run_ts=run_ts,
+            snapshot_path=processed_dir / entry.get("snapshot", ""),
+            content_sha256=digest,
+            already_loaded=True,
+        )
+
+    existing = _reusable_snapshot(processed_dir, entry, snapshot_format)
+    if existing is not None:
+        logger.info("Reusing snapshot of identical input (sha256=%s): %s", digest, existing)
+        return ExtractResult(run_ts=run_ts, snapshot_path=existing, content_sha256=digest)
+    return None
+
+
+def extract_csv(
+    raw_input_csv: Path,
+    processed_dir: Path,
+    *,
+    snapshot_format: str = "csv",
+    link_mode: str = "auto",
+    skip_loaded: bool = True,
+) -> ExtractResult:
+    """
+    Snapshot the raw input, keyed by the SHA-256 of its contents in the extract manifest.
+
+    The input is snapshotted first and the snapshot's bytes are hashed (while copying,
+    or from the clone), so the digest always describes what was snapshotted. If those
+    bytes are what the last successful run loaded (and `skip_loaded` is set) the
+    result has `already_loaded=True` and the snapshot is discarded. If a snapshot of
+    the same bytes exists but was not loaded last (e.g. the run failed), it is reused.
+    """
+    if not raw_input_csv.exists():
+        raise FileNotFoundError(f"Raw input CSV not found: {raw_input_csv}")
+
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    run_ts = _run_ts()
+    part = processed_dir / f"raw_snapshot_{run_ts}.csv.part"
+    try:
+        method, digest = _materialize(raw_input_csv, part, link_mode=link_mode, hashed=True)
+        size_bytes = part.stat().st_size
+        manifest = read_manifest(processed_dir)
+        known = _known_snapshot(
+            processed_dir, manifest, digest, run_ts, snapshot_format=snapshot_format, skip_loaded=skip_loaded
+        )
+        if known is not None:
+            return known
+
+        # The digest prefix keeps two snapshots from the same second from colliding.
+        snapshot_path = processed_dir / f"raw_snapshot_{run_ts}_{digest[:12]}{artifact_suffix(snapshot_format)}"
+        logger.info("Extracting raw CSV snapshot: %s -> %s (by %s)", raw_input_csv, snapshot_path, method)
+        if snapshot_format == "csv":
+            os.replace(part, snapshot_path)
+        else:
+            # Columnar snapshot: every column kept as text, compressed.
+            convert_csv_snapshot(part, snapshot_path)
+    finally:
+        part.unlink(missing_ok=True)
+
+    manifest["snapshots"][digest] = {
+        "snapshot": snapshot_path.name,
+        "run_ts": run_ts,
+        "size_bytes": size_bytes,
+        "loaded_at": None,
+    }
+    write_manifest(processed_dir, manifest)
+    return ExtractResult(run_ts=run_ts, snapshot_path=snapshot_path, content_sha256=digest)
+
+
+def is_multi_file_input(spec: Path) -> bool:
+    """True for a directory or glob pattern of input files, False for a single file."""
+    return spec.is_dir() or any(c in str(spec) for c in _GLOB_CHARS)
+
+
+def resolve_inputs(spec: Path) -> List[Path]:
+    """The input files of `spec` (a file, a directory's *.csv files or a glob), sorted by path."""
+    if spec.is_dir():
+        files = sorted(p for p in spec.glob("*.csv") if p.is_file())
+    elif is_multi_file_input(spec):
+        files = sorted(Path(p) for p in glob.glob(str(spec)) if Path(p).is_file())
+    else:
+        files = [spec] if spec.exists() else []
+    if not files:
+        raise FileNotFoundError(f"Raw input CSV not found: {spec}")
+    return files
+
+
+def inputs_sha256(files: Sequence[Path]) -> str:
+    """Digest of a set of input files: each file's name and content hash, in order."""
+    with ThreadPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as executor:
+        digests = list(executor.map(sha256_file, files))
+    h = hashlib.sha256()
+    for path, digest in zip(files, digests):
+        h.update(f"{path.name}\0{digest}\n".encode())
+    return h.hexdigest()
+
+
+def extract_files(
+    spec: Path,
+    processed_dir: Path,
+    *,
+    snapshot_format: str = "csv",
+    link_mode: str = "auto",
+    skip_loaded: bool = True,
+) -> ExtractResult:
+    """
+    Snapshot every input file of a directory or glob into one snapshot directory.
+
+    Each file is snapshotted like `extract_csv` does (as `NNNN_<name>`, keeping input
+    order). The manifest keys the set by `inputs_sha256`, so an unchanged set of
+    files is skipped or its snapshot reused, exactly as for a single input.
+    """
+    files = resolve_inputs(spec)
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    run_ts = _run_ts()
+    digest = inputs_sha256(files)
+    manifest = read_manifest(processed_dir)
+    known = _known_snapshot(
+        processed_dir, manifest, digest, run_ts, snapshot_format=snapshot_format, skip_loaded=skip_loaded
+    )
+    if known is not None:
+        return known
+
+    snapshot_dir = processed_dir / f"raw_snapshot_{run_ts}_{digest[:12]}"
+    logger.info("Extracting %s raw input files from %s -> %s", len(files), spec, snapshot_dir)
+    # Build under a temporary name, so a crash never leaves a partial snapshot to reuse.
+    part_dir = processed_dir / f".{snapshot_dir.name}.part"
+    shutil.rmtree(part_dir, ignore_errors=True)
+    part_dir.mkdir()
+    for i, src in enumerate(files):
+        dst = part_dir / f"{i:04d}_{src.stem}{artifact_suffix(snapshot_format)}"
+        if snapshot_format == "csv":
+            materialize_snapshot(src, dst, link_mode=link_mode)
+        else:
+            convert_csv_snapshot(src, dst)
+    os.replace(part_dir, snapshot_dir)
+
+    manifest["snapshots"][digest] = {
+        "snapshot": snapshot_dir.name,
+        "run_ts": run_ts,
+        "size_bytes": sum(f.stat().st_size for f in files),
+        "files": [str(f) for f in files],
+        "loaded_at": None,
+    }
+    write_manifest(processed_dir, manifest)
+    return ExtractResult(run_ts=run_ts, snapshot_path=snapshot_dir, content_sha256=digest)
+
+
+def read_watermark(processed_dir: Path) -> Optional[Dict[str, Any]]:
+    path = processed_dir / WATERMARK_NAME
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _sha256_range(f: Any, start: int, end: int) -> str:
+    h = hashlib.sha256()
+    f.seek(start)
+    remaining = end - start
+    while remaining > 0:
+        block = f.read(min(_HASH_BLOCK_BYTES, remaining))
+        if not block:
+            break
+        h.update(block)
+        remaining -= len(block)
+    return h.hexdigest()
+
+
+def _read_header(f: Any) -> bytes:
+    f.seek(0)
+    header = f.readline()
+    if not header.endswith(b"\n"):
+        raise ValueError("Raw input CSV has no complete header line")
+    return header
+
+
+def _watermark_offset(f: Any, watermark: Optional[Dict[str, Any]], source: Path, header: bytes, size: int) -> int:
+    """Offset to resume from, or the end of the header if there is no usable watermark."""
+    start = len(header)
+    if watermark is None:
+        return start
+    offset = int(watermark["offset"])
+    tail_start = max(start, offset - _WATERMARK_TAIL_BYTES)
+    reason = None
+    if watermark.get("source") != str(source):
+        reason = "watermark belongs to a different input"
+    elif watermark["header_sha256"] != hashlib.sha256(header).hexdigest():
+        reason = "header changed"
+    elif offset > size:
+        reason = "file is shorter than the watermark"
+    elif watermark["tail_sha256"] != _sha256_range(f, tail_start, offset):
+        reason = "bytes before the watermark changed"
+    if reason:
+        logger.warning("Input was rewritten (%s); extracting it from the start", reason)
+        return start
+    return offset
+
+
+def _copy_complete_records(src: Any, dst: Any, start: int, end: int) -> int:
+    """
+    Copy src[start:end] to dst and return the length of its complete-record prefix.
+
+    A record is complete at a newline that is outside a quoted field (an even number of
+    quote characters before it), so a row still being written upstream is left for the
+    next run. The caller truncates dst to the returned length.
+    """
+    src.seek(start)
+    pos = quotes = complete = 0
+    remaining = end - start
+    while remaining > 0:
+        block = src.read(min(_HASH_BLOCK_BYTES, remaining))
+        if not block:
+            break
+        dst.write(block)
+        remaining -= len(block)
+        nl = block.rfind(b"\n")
+        while nl >= 0 and (quotes + block.count(b'"', 0, nl)) % 2:
+            nl = block.rfind(b"\n", 0, nl)
+        if nl >= 0:
+            complete = pos + nl + 1
+        quotes += block.count(b'"')
+        pos += len(block)
+    return complete
+
+
+def extract_csv_incremental(raw_input_csv: Path, processed_dir: Path, *, snapshot_format: str = "csv") -> ExtractResult:
+    """
+    Snapshot only the rows appended to the input since the last successful run.
+
+    The watermark stores the byte offset consumed so far plus checksums of the header
+    and of the bytes just before the offset. If either no longer matches (or the file
+    shrank) the input was rewritten and it is extracted in full. The new watermark is
+    returned as `pending_watermark` and only committed by `mark_snapshot_loaded`.
+    """
     if not raw_input_csv.exists():
         raise FileNotFoundError(f"Raw input CSV not found: {raw_input_csv}")
 
     processed_dir.mkdir(parents=True, exist_ok=True)
     run_ts = _run_ts()
-    snapshot_path = processed_dir / f"raw_snapshot_{run_ts}.csv"
+    with raw_input_csv.open("rb") as src:
+        size = os.fstat(src.fileno()).st_size
+        header = _read_header(src)
+        offset = _watermark_offset(src, read_watermark(processed_dir), raw_input_csv, header, size)
+        is_delta = offset > len(header)
+
+        csv_path = processed_dir / f"raw_snapshot_{run_ts}.csv.part"
+        with csv_path.open("w+b") as dst:
+            dst.write(header)
+            kept = _copy_complete_records(src, dst, offset, size)
+            dst.truncate(len(header) + kept)
+        new_offset = offset + kept
+        watermark = {
+            "source": str(raw_input_csv),
+            "offset": new_offset,
+            "header_sha256": hashlib.sha256(header).hexdigest(),
+            "tail_sha256": _sha256_range(src, max(len(header), new_offset - _WATERMARK_TAIL_BYTES), new_offset),
+            "run_ts": run_ts,
+        }
+
+    digest = sha256_file(csv_path)
+    if kept == 0:
+        csv_path.unlink()
+        logger.info("No rows appended since offset %s; nothing to do", offset)
+        return ExtractResult(
+            run_ts=run_ts, snapshot_path=raw_input_csv, content_sha256=digest, already_loaded=True, is_delta=True
+        )
+
+    snapshot_path = processed_dir / f"raw_snapshot_{run_ts}_{digest[:12]}{artifact_suffix(snapshot_format)}"
+    logger.info(
+        "Extracting %s bytes of %s (offset %s -> %s): %s",
+        kept,
+        "appended rows" if is_delta else "rows",
+        offset,
+        new_offset,
+        snapshot_path,
+    )
+    if snapshot_format == "csv":
+        os.replace(csv_path, snapshot_path)
+    else:
+        convert_csv_snapshot(csv_path, snapshot_path)
+        csv_path.unlink()
 
-    logger.info("Extracting raw CSV snapshot: %s -> %s", raw_input_csv, snapshot_path)
-    shutil.copyfile(raw_input_csv, snapshot_path)
-    return ExtractResult(run_ts=run_ts, snapshot_path=snapshot_path)
+    manifest = read_manifest(processed_dir)
+    manifest["snapshots"][digest] = {
+        "snapshot": snapshot_path.name,
+        "run_ts": run_ts,
+        "size_bytes": len(header) + kept,
+        "loaded_at": None,
+    }
+    write_manifest(processed_dir, manifest)
+    return ExtractResult(
+        run_ts=run_ts,
+        snapshot_path=snapshot_path,
+        content_sha256=digest,
+        is_delta=is_delta,
+        pending_watermark=watermark,
+    )
 
 
+def mark_snapshot_loaded(processed_dir: Path, extract_res: ExtractResult) -> None:
+    """
+    Record that the snapshot's contents made it through load (and dbt) successfully,
+    and commit the incremental watermark if there is one.
+    """
+    manifest = read_manifest(processed_dir)
+    entry = manifest["snapshots"].setdefault(
+        extract_res.content_sha256,
+        {"snapshot": extract_res.snapshot_path.name, "run_ts": extract_res.run_ts, "size_bytes": None},
+    )
+    entry["loaded_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    entry["loaded_run_ts"] = extract_res.run_ts
+    manifest["last_loaded"] = extract_res.content_sha256
+    write_manifest(processed_dir, manifest)
+    if extract_res.pending_watermark is not None:
+        write_json_atomic(processed_dir / WATERMARK_NAME, extract_res.pending_watermark)
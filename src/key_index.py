@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import (
+    ArrowArtifactWriter,
+    artifact_format,
+    frame_to_arrow,
+    iter_artifact_batches,
+    require_pyarrow,
+    staging_arrow_schema,
+)
+from .load import COPY_BATCH_ROWS, CleanData
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "transaction_index.sqlite"
+
+# Row classes against the index, in the order of ChangeCounts.
+NEW, UPDATED, UNCHANGED = 0, 1, 2
+
+_SCHEMA = """
+create table if not exists transactions (
+  transaction_id text primary key,
+  posting_date integer not null,
+  transaction_ts integer not null,
+  row_hash integer not null
+) without rowid;
+create table if not exists pending (
+  transaction_id text primary key,
+  posting_date integer not null,
+  transaction_ts integer not null,
+  row_hash integer not null
+) without rowid;
+create table if not exists meta (key text primary key, value text not null);
+"""
+
+
+@dataclass(frozen=True)
+class ChangeCounts:
+    """How the rows of a clean batch compare with what staging already holds."""
+
+    new: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    @property
+    def changed(self) -> int:
+        return self.new + self.updated
+
+    @property
+    def total(self) -> int:
+        return self.new + self.updated + self.unchanged
+
+
+def _typed_batches(data: CleanData) -> Iterator[Any]:
+    """Record batches with the staging schema for any clean dataset (a CSV artifact is parsed)."""
+    pa = require_pyarrow()
+    schema = staging_arrow_schema()
+    if isinstance(data, Path):
+        if artifact_format(data) == "csv":
+            # Empty fields are NULL, as in the text COPY of the same file.
+            convert = pa.csv.ConvertOptions(
+                column_types=pa.schema([f.with_nullable(True) for f in schema]),
+                strings_can_be_null=True,
+                null_values=[""],
+            )
+            yield from pa.csv.open_csv(str(data), convert_options=convert)
+        else:
+            yield from iter_artifact_batches(data, batch_rows=COPY_BATCH_ROWS)
+    elif isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), COPY_BATCH_ROWS):
+            yield from frame_to_arrow(data.iloc[start : start + COPY_BATCH_ROWS], schema).to_batches()
+    else:
+        yield from data.to_batches(max_chunksize=COPY_BATCH_ROWS)
+
+
+def _batch_keys(batch: Any) -> pd.DataFrame:
+    """transaction_id, posting_date (days), transaction_ts (µs) and a hash of the other values, per row."""
+    pa = require_pyarrow()
+    columns = {}
+    for field, column in zip(batch.schema, batch.columns):
+        if pa.types.is_decimal(field.type):
+            column = column.cast(pa.string())
+        elif pa.types.is_timestamp(field.type):
+            column = column.cast(pa.timestamp("us", tz="UTC")).cast(pa.int64())
+        elif pa.types.is_date(field.type):
+            column = column.cast(pa.int32())
+        columns[field.name] = column
+    df = pa.table(columns).to_pandas()
+    values = df.drop(columns=["transaction_id"])
+    # sqlite integers are signed 64-bit.
+    row_hash = pd.util.hash_pandas_object(values, index=False).to_numpy().view(np.int64)
+    return pd.DataFrame(
+        {
+            "transaction_id": df["transaction_id"],
+            "posting_date": df["posting_date"].astype(np.int64),
+            "transaction_ts": df["transaction_ts"].astype(np.int64),
+            "row_hash": row_hash,
+        }
+    )
+
+
+class KeyIndex:
+    """
+    On-disk index of the transactions loaded into staging: transaction_id, latest
+    posting_date and transaction_ts, and a hash of the row's values (sqlite, next to
+    `processed_dir`).
+
+    `classify` sorts a clean batch into new, updated and unchanged rows without
+    querying Postgres, using the staging upsert's rule: a row updates staging only
+    when its (posting_date, transaction_ts) is later or equal and its values differ.
+    The batch's keys are kept as pending and become the index only through `apply`,
+    once staging has committed them.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute("pragma journal_mode=wal;")
+        self._conn.execute("pragma synchronous=normal;")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def open(cls, processed_dir: Path) -> "KeyIndex":
+        return cls(processed_dir / INDEX_NAME)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "KeyIndex":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return int(self._conn.execute("select count(*) from transactions;").fetchone()[0])
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("select value from meta where key = ?;", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def _in_sync(self, staging: Optional[str]) -> bool:
+        if self._meta("loading") is not None:
+            # A load began but its keys were never applied.
+            return False
+        # Any other load (index disabled, another tool) changes the staging fingerprint;
+        # an empty one (no staging yet) matches nothing.
+        return staging is None or (bool(staging) and self._meta("staging") == staging)
+
+    def classify(
+        self, data: CleanData, *, changed_path: Optional[Path] = None, staging: Optional[str] = None
+    ) -> ChangeCounts:
+        """
+        Classify every row of `data` (deduplicated clean output) and keep its keys as
+        pending; with `changed_path`, also write the new and updated rows there (a
+        Parquet or Arrow IPC artifact with the staging schema). With `staging` (see
+        `load.staging_fingerprint`), an index last applied to a different staging is
+        rebuilt first.
+        """
+        pa = require_pyarrow()
+        with self._conn:
+            if not self._in_sync(staging):
+                if len(self):
+                    logger.warning("Key index %s may not match staging; rebuilding it from this load", self.path)
+                self._conn.execute("delete from transactions;")
+                self._conn.execute("delete from meta where key in ('loading', 'staging');")
+            self._conn.execute("delete from pending;")
+
+        schema = staging_arrow_schema()
+        writer = ArrowArtifactWriter(changed_path, schema) if changed_path is not None else None
+        counts = np.zeros(3, dtype=np.int64)
+        try:
+            with self._conn:
+                for batch in _typed_batches(data):
+                    if not batch.num_rows:
+                        continue
+                    classes = self._classify_batch(_batch_keys(batch))
+                    counts += np.bincount(classes, minlength=3)
+                    if writer is not None:
+                        changed = pa.Table.from_batches([batch]).filter(pa.array(classes != UNCHANGED))
+                        writer.write_table(changed.cast(schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        result = ChangeCounts(new=int(counts[NEW]), updated=int(counts[UPDATED]), unchanged=int(counts[UNCHANGED]))
+        logger.info(
+            "Key index: %s new, %s updated, %s unchanged rows (index holds %s ids)",
+            result.new,
+            result.updated,
+            result.unchanged,
+            len(self),
+        )
+        return result
+
+    def _classify_batch(self, keys: pd.DataFrame) -> np.ndarray:
+        cur = self._conn.cursor()
+        cur.execute(
+            "create temp table if not exists batch ("
+            "pos integer primary key, transaction_id text, posting_date integer, transaction_ts integer, "
+            "row_hash integer);"
+        )
+        cur.execute("delete from batch;")
+        cur.executemany(
+            "insert into batch values (?, ?, ?, ?, ?);",
+            zip(
+                range(len(keys)),
+                keys["transaction_id"].tolist(),
+                keys["posting_date"].tolist(),
+                keys["transaction_ts"].tolist(),
+                keys["row_hash"].tolist(),
+            ),
+        )
+        cur.execute(
+            f"""
+select case
+  when t.transaction_id is null then {NEW}
+  when (b.posting_date, b.transaction_ts) >= (t.posting_date, t.transaction_ts)
+    and b.row_hash != t.row_hash then {UPDATED}
+  else {UNCHANGED}
+end
+from batch b left join transactions t on t.transaction_id = b.transaction_id
+order by b.pos;
+"""
+        )
+        classes = np.fromiter((c for (c,) in cur), dtype=np.int64, count=len(keys))
+        # Later batches never repeat an id (the clean output is deduplicated).
+        cur.execute(
+            "insert or replace into pending select transaction_id, posting_date, transaction_ts, row_hash from batch;"
+        )
+        return classes
+
+    def begin_load(self) -> None:
+        """Mark the index as possibly stale until `apply` runs (staging is about to change)."""
+        with self._conn:
+            self._conn.execute("insert or replace into meta values ('loading', '1');")
+
+    def apply(self, *, replace: bool, staging: Optional[str] = None) -> int:
+        """
+        Make the pending keys the index (`replace`, as staging was truncated and
+        reloaded) or upsert them with the staging rule; returns the ids indexed.
+        `staging` is the fingerprint of staging after the load, checked by the next
+        `classify`.
+        """
+        with self._conn:
+            if replace:
+                self._conn.execute("delete from transactions;")
+            self._conn.execute(
+                """
+insert into transactions select * from pending where true
+on conflict (transaction_id) do update set
+  posting_date = excluded.posting_date,
+  transaction_ts = excluded.transaction_ts,
+  row_hash = excluded.row_hash
+where (excluded.posting_date, excluded.transaction_ts) >= (transactions.posting_date, transactions.transaction_ts);
+"""
+            )
+            self._conn.execute("delete from pending;")
+            self._conn.execute("delete from meta where key = 'loading';")
+            if staging is None:
+                self._conn.execute("delete from meta where key = 'staging';")
+            else:
+                self._conn.execute("insert or replace into meta values ('staging', ?);", (staging,))
+        return len(self)
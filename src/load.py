@@ -1,11 +1,33 @@
 from __future__ import annotations
 
 import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
 from pathlib import Path
-from typing import Sequence
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
 
+import pandas as pd
+from psycopg2.extensions import connection as PgConnection
+
+from .artifacts import (
+    ARTIFACT_BATCH_ROWS,
+    artifact_format,
+    frame_to_arrow,
+    iter_artifact_batches,
+    open_text_csv,
+    require_pyarrow,
+    snapshot_files,
+    staging_arrow_schema,
+)
 from .config import PostgresConfig
-from .db import connect_with_retries, copy_csv, run_sql_file
+from .db import ConnectionPool, copy_binary, copy_csv, copy_csv_batches
+from .metrics import StageMetrics
+from .migrations import apply_migrations
 
 
 logger = logging.getLogger(__name__)
@@ -47,39 +69,614 @@ STAGING_COLUMNS: Sequence[str] = (
 )
 
 
-def load_to_postgres(
-    pg: PostgresConfig,
+RAW_TABLE = "raw.financial_transactions_raw"
+# Daily partitions of RAW_TABLE are named <prefix>YYYYMMDD (UTC ingestion day).
+_RAW_PARTITION_PREFIX = "financial_transactions_raw_p"
+
+# Rows per Arrow batch streamed into binary COPY (from a frame, a table or an artifact).
+COPY_BATCH_ROWS = ARTIFACT_BATCH_ROWS
+
+# A clean dataset to load: an artifact file, a typed clean frame, or an Arrow table.
+CleanData = Union[Path, pd.DataFrame, Any]
+
+# Parallel staging loads COPY into this index-free shadow table and then publish it
+# into staging in a single transaction (swapped in on replace, upserted on incremental).
+STAGING_LOAD_TABLE = "staging.financial_transactions_load"
+
+# Session-local table the serial incremental load COPYs the batch into.
+_STAGING_BATCH_TABLE = "staging_batch"
+
+# Partition batches buffered per COPY worker before the reader blocks.
+_WORKER_QUEUE_DEPTH = 2
+_PUT_POLL_SECONDS = 0.5
+_END_OF_PARTITION = None
+
+# How often abort() re-sends its cancel while the raw load winds down.
+_ABORT_POLL_SECONDS = 0.2
+
+
+def copy_file(
+    conn: PgConnection, *, path: Path, table_fqn: str, columns: Sequence[str], commit: bool = True
+) -> int:
+    """COPY a CSV (text COPY) or a columnar Parquet/Arrow IPC artifact (binary COPY); returns rows copied."""
+    if artifact_format(path) == "csv":
+        return copy_csv(conn, csv_path=path, table_fqn=table_fqn, columns=columns, commit=commit)
+    batches = iter_artifact_batches(path, batch_rows=COPY_BATCH_ROWS)
+    return copy_binary(conn, batches=batches, table_fqn=table_fqn, columns=columns, commit=commit)
+
+
+def _frame_batches(df: pd.DataFrame) -> Iterator[Any]:
+    # Convert slice by slice so only one batch worth of Arrow data exists at a time.
+    schema = staging_arrow_schema()
+    for start in range(0, len(df), COPY_BATCH_ROWS):
+        yield from frame_to_arrow(df.iloc[start : start + COPY_BATCH_ROWS], schema).to_batches()
+
+
+def copy_clean(
+    conn: PgConnection,
+    data: CleanData,
     *,
-    schema_sql: Path,
-    raw_snapshot_csv: Path,
-    clean_csv: Path,
-) -> None:
-    logger.info("Connecting to Postgres %s:%s/%s", pg.host, pg.port, pg.dbname)
-    conn = connect_with_retries(pg)
+    table_fqn: str = "staging.financial_transactions",
+    commit: bool = True,
+) -> int:
+    """
+    COPY clean data into staging; returns rows copied.
+
+    Files go through `copy_file`. A typed clean frame (see `transform.clean_snapshot`)
+    or an Arrow table is streamed straight into binary COPY with no intermediate file.
+    """
+    if isinstance(data, Path):
+        return copy_file(conn, path=data, table_fqn=table_fqn, columns=STAGING_COLUMNS, commit=commit)
+    if isinstance(data, pd.DataFrame):
+        return copy_binary(
+            conn, batches=_frame_batches(data), table_fqn=table_fqn, columns=STAGING_COLUMNS, commit=commit
+        )
+    return copy_binary(
+        conn,
+        batches=data.to_batches(max_chunksize=COPY_BATCH_ROWS),
+        table_fqn=table_fqn,
+        columns=STAGING_COLUMNS,
+        commit=commit,
+    )
+
+
+def _upsert_sql(source_table: str) -> str:
+    """
+    Merge `source_table` into staging with the transform's dedupe rule.
+
+    An existing row is replaced only when the incoming one has a later-or-equal
+    (posting_date, transaction_ts), so the batch wins exact ties just as a later
+    input row wins them in the transform. Rows whose values are unchanged are
+    skipped, so they cost an index probe but no new tuple or index entries, and keep
+    their `loaded_at` (the watermark incremental dbt models read).
+    """
+    cols = ", ".join(STAGING_COLUMNS)
+    updatable = [c for c in STAGING_COLUMNS if c != "transaction_id"]
+    assignments = ",\n  ".join([f"{c} = excluded.{c}" for c in updatable] + ["loaded_at = now()"])
+    current = ", ".join(f"t.{c}" for c in updatable)
+    incoming = ", ".join(f"excluded.{c}" for c in updatable)
+    return f"""
+insert into staging.financial_transactions as t ({cols})
+select {cols} from {source_table}
+on conflict (transaction_id) do update set
+  {assignments}
+where (excluded.posting_date, excluded.transaction_ts) >= (t.posting_date, t.transaction_ts)
+  and ({current}) is distinct from ({incoming})
+"""
+
+
+def _merge_into_staging(conn: PgConnection, source_table: str, batch_rows: int) -> None:
+    # `batch_rows` is what the COPY into `source_table` reported, only for the log line.
+    with conn.cursor() as cur:
+        cur.execute(_upsert_sql(source_table))
+        logger.info("Upserted staging: %s new or changed of %s batch rows", cur.rowcount, batch_rows)
+
+
+def upsert_staging(conn: PgConnection, data: CleanData) -> int:
+    """COPY the batch into a temp table and merge it into staging in one transaction; returns batch rows."""
+    with conn.cursor() as cur:
+        cur.execute(
+            f"create temp table {_STAGING_BATCH_TABLE} "
+            "(like staging.financial_transactions including defaults) on commit drop;"
+        )
+    rows = copy_clean(conn, data, table_fqn=_STAGING_BATCH_TABLE, commit=False)
+    _merge_into_staging(conn, _STAGING_BATCH_TABLE, rows)
+    conn.commit()
+    return rows
+
+
+def staging_fingerprint(conn: PgConnection) -> str:
+    """
+    Row count and latest `loaded_at` of staging, which change with every load that
+    changes it (whoever runs it); empty while staging or its watermark column is
+    missing (before migrations).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            select 1 from pg_attribute
+            where attrelid = to_regclass('staging.financial_transactions') and attname = 'loaded_at'
+              and not attisdropped;
+            """
+        )
+        if cur.fetchone() is None:
+            conn.rollback()
+            return ""
+        # Epoch seconds, which do not depend on the session time zone.
+        cur.execute("select count(*), extract(epoch from max(loaded_at)) from staging.financial_transactions;")
+        rows, latest = cur.fetchone()
+    conn.rollback()
+    return f"{rows}:{latest if latest is not None else ''}"
+
+
+def _clean_batches(data: CleanData) -> Tuple[str, Iterator[Any]]:
+    """Return ("binary" | "csv", record batches) for any clean dataset."""
+    if isinstance(data, Path):
+        if artifact_format(data) == "csv":
+            # Keep CSV values as text; Postgres parses them exactly as in the serial load.
+            return "csv", iter(open_text_csv(data, columns=STAGING_COLUMNS))
+        return "binary", iter_artifact_batches(data, batch_rows=COPY_BATCH_ROWS)
+    if isinstance(data, pd.DataFrame):
+        return "binary", _frame_batches(data)
+    return "binary", iter(data.to_batches(max_chunksize=COPY_BATCH_ROWS))
+
+
+def _partition_batch(batch: Any, partitions: int) -> List[Any]:
+    """Split a batch by a hash of transaction_id, so each id always lands in the same partition."""
+    pa = require_pyarrow()
+    ids = batch.column(batch.schema.get_field_index("transaction_id")).to_pandas()
+    part = pd.util.hash_pandas_object(ids, index=False).to_numpy() % partitions
+    return [batch.filter(pa.array(part == i)) for i in range(partitions)]
+
+
+def _drain(q: "queue.Queue[Any]") -> Iterator[Any]:
+    while True:
+        item = q.get()
+        if item is _END_OF_PARTITION:
+            return
+        yield item
+
+
+def _put(q: "queue.Queue[Any]", item: Any, worker: Future) -> bool:
+    # Block while the worker is alive; give up (False) if it has already stopped.
+    while True:
+        try:
+            q.put(item, timeout=_PUT_POLL_SECONDS)
+            return True
+        except queue.Full:
+            if worker.done():
+                return False
+
+
+def _copy_partitions_parallel(pool: ConnectionPool, data: CleanData, *, workers: int) -> int:
+    """
+    Stream the clean data once, hash-partition every batch and COPY the partitions
+    into the shadow table concurrently, one pooled connection (backend) per partition.
+    Returns the rows copied.
+    """
+    encoding, batches = _clean_batches(data)
+    copy = copy_binary if encoding == "binary" else copy_csv_batches
+    queues: List["queue.Queue[Any]"] = [queue.Queue(maxsize=_WORKER_QUEUE_DEPTH) for _ in range(workers)]
+    conns = []
     try:
-        logger.info("Applying warehouse schema: %s", schema_sql)
-        run_sql_file(conn, schema_sql)
-
-        logger.info("Loading raw table (append-only): raw.financial_transactions_raw")
-        copy_csv(
-            conn,
-            csv_path=raw_snapshot_csv,
-            table_fqn="raw.financial_transactions_raw",
-            columns=RAW_COLUMNS,
+        for _ in range(workers):
+            conns.append(pool.getconn())
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="staging-copy") as executor:
+            futures = [
+                executor.submit(copy, conn, batches=_drain(q), table_fqn=STAGING_LOAD_TABLE, columns=STAGING_COLUMNS)
+                for conn, q in zip(conns, queues)
+            ]
+            try:
+                for batch in batches:
+                    for q, worker, part in zip(queues, futures, _partition_batch(batch, workers)):
+                        if part.num_rows and not _put(q, part, worker):
+                            worker.result()  # the worker stopped early: surface its error
+            finally:
+                for q, worker in zip(queues, futures):
+                    _put(q, _END_OF_PARTITION, worker)
+            return sum(worker.result() for worker in futures)
+    finally:
+        for conn in conns:
+            pool.putconn(conn)
+
+
+def load_staging_parallel(
+    pool: ConnectionPool,
+    conn: PgConnection,
+    data: CleanData,
+    *,
+    workers: int,
+    mode: str = "replace",
+) -> int:
+    """
+    Load staging over `workers` concurrent COPY streams, then publish atomically;
+    returns the rows copied.
+
+    The partitions are committed into a shadow table by independent connections;
+    staging itself is only touched by one transaction on `conn`, so readers see
+    either the previous contents or the complete new load, never a partial one.
+    A replace builds staging's indexes on the shadow (also in parallel) and swaps
+    it in by rename; an incremental load upserts the shadow into staging.
+    """
+    if mode == "incremental":
+        with conn.cursor() as cur:
+            cur.execute(f"drop table if exists {STAGING_LOAD_TABLE};")
+            cur.execute(
+                f"create unlogged table {STAGING_LOAD_TABLE} (like staging.financial_transactions including defaults);"
+            )
+        conn.commit()
+        logger.info("Copying staging partitions in parallel (workers=%s) into %s", workers, STAGING_LOAD_TABLE)
+        rows = _copy_partitions_parallel(pool, data, workers=workers)
+        logger.info("Publishing %s into staging.financial_transactions", STAGING_LOAD_TABLE)
+        _merge_into_staging(conn, STAGING_LOAD_TABLE, rows)
+        with conn.cursor() as cur:
+            cur.execute(f"drop table {STAGING_LOAD_TABLE};")
+        conn.commit()
+        return rows
+
+    with conn.cursor() as cur:
+        cur.execute(f"drop table if exists {STAGING_LOAD_TABLE};")
+        # Logged, since it becomes staging; constraints and indexes come after the COPY.
+        cur.execute(
+            f"create table {STAGING_LOAD_TABLE} "
+            "(like staging.financial_transactions including all excluding indexes);"
+        )
+    conn.commit()
+    logger.info("Copying staging partitions in parallel (workers=%s) into %s", workers, STAGING_LOAD_TABLE)
+    rows = _copy_partitions_parallel(pool, data, workers=workers)
+
+    indexes = _staging_indexes(conn)
+    logger.info("Building %s staging indexes on %s (workers=%s)", len(indexes), STAGING_LOAD_TABLE, workers)
+    _build_shadow_indexes(pool, indexes, workers=workers)
+    logger.info("Swapping %s in as staging.financial_transactions", STAGING_LOAD_TABLE)
+    _swap_in_staging(conn, indexes)
+    return rows
+
+
+@dataclass(frozen=True)
+class _StagingIndex:
+    name: str
+    definition: str
+    # Set when the index backs a primary key or unique constraint.
+    constraint: Optional[str]
+    constraint_type: Optional[str]
+
+    @property
+    def shadow_name(self) -> str:
+        return f"{self.name[:50]}_load"
+
+
+def _staging_indexes(conn: PgConnection) -> List[_StagingIndex]:
+    """The valid indexes of staging.financial_transactions, to rebuild on the shadow table."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            select c.relname, pg_get_indexdef(i.indexrelid), con.conname, con.contype
+            from pg_index i
+            join pg_class c on c.oid = i.indexrelid
+            left join pg_constraint con on con.conindid = i.indexrelid and con.conrelid = i.indrelid
+            where i.indrelid = 'staging.financial_transactions'::regclass and i.indisvalid
+            order by c.relname;
+            """
+        )
+        indexes = [_StagingIndex(*row) for row in cur.fetchall()]
+    conn.commit()
+    return indexes
+
+
+def _build_shadow_indexes(pool: ConnectionPool, indexes: Sequence[_StagingIndex], *, workers: int) -> None:
+    """Build every staging index on the shadow table, one pooled connection per index at a time."""
+
+    def build(index: _StagingIndex) -> None:
+        target = f" INDEX {index.name} ON staging.financial_transactions "
+        if target not in index.definition:
+            raise RuntimeError(f"Unexpected definition of staging index {index.name}: {index.definition}")
+        sql = index.definition.replace(target, f" INDEX {index.shadow_name} ON {STAGING_LOAD_TABLE} ", 1)
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+            conn.commit()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="staging-index") as executor:
+        for future in [executor.submit(build, index) for index in indexes]:
+            future.result()
+
+
+def _swap_in_staging(conn: PgConnection, indexes: Sequence[_StagingIndex]) -> None:
+    """
+    Replace staging.financial_transactions by the indexed shadow table in one transaction.
+
+    Views over staging (e.g. the dbt staging model) are re-pointed at the new table and
+    its grants are copied over; index and constraint names stay as they were.
+    """
+    with conn.cursor() as cur:
+        cur.execute("lock table staging.financial_transactions in access exclusive mode;")
+        cur.execute(
+            """
+            select distinct v.oid::regclass::text, pg_get_viewdef(v.oid)
+            from pg_depend d
+            join pg_rewrite r on r.oid = d.objid
+            join pg_class v on v.oid = r.ev_class
+            where d.refobjid = 'staging.financial_transactions'::regclass and v.relkind = 'v';
+            """
+        )
+        views = cur.fetchall()
+        cur.execute(
+            """
+            select coalesce(quote_ident(r.rolname), 'public'), a.privilege_type
+            from pg_class c
+            cross join lateral aclexplode(c.relacl) a
+            left join pg_roles r on r.oid = a.grantee
+            where c.oid = 'staging.financial_transactions'::regclass and a.grantee <> c.relowner;
+            """
         )
+        grants = cur.fetchall()
 
-        logger.info("Refreshing staging table: staging.financial_transactions")
+        cur.execute("alter table staging.financial_transactions rename to financial_transactions_old;")
+        cur.execute(f"alter table {STAGING_LOAD_TABLE} rename to financial_transactions;")
+        for view, definition in views:
+            cur.execute(f"create or replace view {view} as {definition}")
+        for grantee, privilege in grants:
+            cur.execute(f"grant {privilege} on staging.financial_transactions to {grantee};")
+        # Frees the index and constraint names for the new table.
+        cur.execute("drop table staging.financial_transactions_old;")
+        for index in indexes:
+            if index.constraint_type in ("p", "u"):
+                kind = "primary key" if index.constraint_type == "p" else "unique"
+                cur.execute(
+                    f"alter table staging.financial_transactions add constraint {index.constraint} "
+                    f"{kind} using index {index.shadow_name};"
+                )
+            else:
+                cur.execute(f"alter index staging.{index.shadow_name} rename to {index.name};")
+    conn.commit()
+
+
+def delete_raw_batch(conn: PgConnection, load_batch_id: str) -> int:
+    """
+    Delete one load's raw rows (without committing); returns rows deleted.
+
+    The batch registry gives the load's ingestion_ts, so the delete is pruned to a
+    single daily partition and narrowed by its BRIN index.
+    """
+    with conn.cursor() as cur:
+        cur.execute("select ingestion_ts from raw.load_batches where load_batch_id = %s;", (load_batch_id,))
+        row = cur.fetchone()
+        if row is None:
+            return 0
+        cur.execute(
+            f"delete from {RAW_TABLE} where ingestion_ts = %s and load_batch_id = %s;",
+            (row[0], load_batch_id),
+        )
+        deleted = cur.rowcount
+        cur.execute("delete from raw.load_batches where load_batch_id = %s;", (load_batch_id,))
+    return deleted
+
+
+def _raw_partition_day(name: str) -> Optional[date]:
+    """The UTC day of a raw partition named <prefix>YYYYMMDD, or None for any other child table."""
+    suffix = name[len(_RAW_PARTITION_PREFIX) :]
+    if not name.startswith(_RAW_PARTITION_PREFIX) or len(suffix) != 8:
+        return None
+    try:
+        return datetime.strptime(suffix, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _begin_raw_batch(conn: PgConnection) -> None:
+    """
+    Begin the raw COPY transaction once the partition for its now() (UTC day) exists.
+
+    Creating a partition locks the raw table ACCESS EXCLUSIVE until commit, so it is
+    created and committed in its own short transaction: the COPY transaction may stay
+    open across validation and transform. Should the day roll over in between, the
+    next day's partition is created the same way.
+    """
+    while True:
         with conn.cursor() as cur:
-            cur.execute("truncate table staging.financial_transactions;")
+            cur.execute(
+                "select to_regclass('raw.' || %s || to_char(now() at time zone 'UTC', 'YYYYMMDD')) is not null;",
+                (_RAW_PARTITION_PREFIX,),
+            )
+            if cur.fetchone()[0]:
+                return
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("select raw.ensure_financial_transactions_raw_partition((now() at time zone 'UTC')::date);")
         conn.commit()
 
-        copy_csv(
-            conn,
-            csv_path=clean_csv,
-            table_fqn="staging.financial_transactions",
-            columns=STAGING_COLUMNS,
+
+def load_raw(conn: PgConnection, raw_snapshot: Path, *, load_batch_id: str, commit: bool = True) -> int:
+    """
+    Append the raw snapshot as batch `load_batch_id`, replacing any earlier load of
+    the same batch (e.g. a resumed run), in one transaction; returns rows copied.
+    A multi-file snapshot directory is copied file by file in the same transaction.
+    `conn` must not be inside a transaction (the day's partition is committed first).
+    """
+    logger.info("Loading raw table (append-only): %s (batch %s)", RAW_TABLE, load_batch_id)
+    # Every row of one COPY gets the same now(), so the batch lands in one partition.
+    _begin_raw_batch(conn)
+    replaced = delete_raw_batch(conn, load_batch_id)
+    if replaced:
+        logger.info("Replacing %s raw rows previously loaded by batch %s", replaced, load_batch_id)
+    with conn.cursor() as cur:
+        # Column default of load_batch_id; transaction-local, like the COPY itself.
+        cur.execute("select set_config('pipeline.load_batch_id', %s, true);", (load_batch_id,))
+    rows = 0
+    for path in snapshot_files(raw_snapshot):
+        rows += copy_file(conn, path=path, table_fqn=RAW_TABLE, columns=RAW_COLUMNS, commit=False)
+    with conn.cursor() as cur:
+        cur.execute(
+            "insert into raw.load_batches (load_batch_id, ingestion_ts, row_count, source_file) "
+            "values (%s, now(), %s, %s);",
+            (load_batch_id, rows, raw_snapshot.name),
         )
-    finally:
-        conn.close()
+    if commit:
+        conn.commit()
+    return rows
+
+
+def drop_expired_raw_partitions(conn: PgConnection, retention_days: int) -> List[str]:
+    """
+    Drop the daily raw partitions that lie entirely before `retention_days` ago (UTC),
+    with their batch registry rows; returns the dropped partition names.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            select c.relname
+            from pg_inherits i
+            join pg_class c on c.oid = i.inhrelid
+            where i.inhparent = %s::regclass
+            order by c.relname;
+            """,
+            (RAW_TABLE,),
+        )
+        partitions = [name for (name,) in cur.fetchall()]
+        cur.execute("select (now() at time zone 'UTC')::date - %s;", (retention_days,))
+        cutoff = cur.fetchone()[0]
+
+        dropped = []
+        for name in partitions:
+            day = _raw_partition_day(name)
+            if day is None:
+                logger.warning("Raw retention: skipping %s, not a daily raw partition", name)
+            elif day < cutoff:
+                cur.execute(f"drop table raw.{name};")
+                dropped.append(name)
+        cur.execute(
+            "delete from raw.load_batches where ingestion_ts < (%s::date)::timestamp at time zone 'UTC';",
+            (cutoff,),
+        )
+    conn.commit()
+    if dropped:
+        logger.info("Raw retention (%s days): dropped partitions %s", retention_days, ", ".join(dropped))
+    return dropped
+
+
+class BackgroundRawLoad:
+    """
+    Migrate the schema and COPY the raw snapshot on a worker thread over a pooled
+    connection, leaving the COPY uncommitted so it can overlap validation and transform.
+
+    The caller then either `commit()`s (validation passed) and gets the connection
+    back for the staging load (returning it to the pool when done), or `abort()`s,
+    which cancels the statement in flight and rolls the raw rows back. `metrics`
+    holds the worker's timings once done.
+
+    Until then the raw transaction stays open: it pins the xmin horizon (vacuum
+    cannot remove dead rows anywhere in the database meanwhile) and holds its locks
+    on the raw table and the day's partition, so dropping raw partitions (retention)
+    and other DDL on them wait. It stays open only while validation and transform
+    run, and the pipeline always ends it with `commit()` or `abort()`.
+    """
+
+    def __init__(self, pool: ConnectionPool, *, migrations_dir: Path, raw_snapshot: Path, load_batch_id: str) -> None:
+        self._pool = pool
+        self._conn: Optional[PgConnection] = None
+        self._aborted = threading.Event()
+        self.metrics = StageMetrics(stage="load_raw")
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="raw-load")
+        self._future = executor.submit(self._run, migrations_dir, raw_snapshot, load_batch_id)
+        executor.shutdown(wait=False)
+
+    def _run(self, migrations_dir: Path, raw_snapshot: Path, load_batch_id: str) -> PgConnection:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        conn = self._pool.getconn()
+        # Published for abort(), which cancels whatever statement runs on it.
+        self._conn = conn
+        try:
+            if self._aborted.is_set():
+                raise RuntimeError("Background raw load aborted before it started")
+            apply_migrations(conn, migrations_dir)
+            rows = load_raw(conn, raw_snapshot, load_batch_id=load_batch_id, commit=False)
+        except BaseException:
+            self._pool.putconn(conn)
+            self.metrics.status = "failed"
+            raise
+        finally:
+            # Only this thread's CPU: the stages on the main thread run meanwhile.
+            self.metrics.wall_seconds = time.perf_counter() - wall
+            self.metrics.cpu_seconds = time.thread_time() - cpu
+        self.metrics.rows_in = self.metrics.rows_out = rows
+        return conn
+
+    def commit(self) -> PgConnection:
+        conn = self._future.result()
+        try:
+            conn.commit()
+        except BaseException:
+            self._pool.putconn(conn)
+            raise
+        logger.info("Committed background raw load")
+        return conn
 
+    def abort(self) -> None:
+        """Stop the load without waiting for its COPY to finish, and roll it back."""
+        self._aborted.set()
+        while True:
+            # cancel() only interrupts the statement running right now, so it is
+            # repeated until the worker gives up or runs out of statements.
+            if self._conn is not None:
+                self._conn.cancel()
+            try:
+                conn = self._future.result(timeout=_ABORT_POLL_SECONDS)
+                break
+            except FutureTimeoutError:
+                continue
+            except Exception:
+                logger.info("Cancelled background raw load")
+                return  # its connection is already back in the pool, rolled back
+        conn.rollback()
+        self._pool.putconn(conn)
+        logger.info("Rolled back background raw load")
 
+
+def load_staging(
+    pool: ConnectionPool,
+    conn: PgConnection,
+    clean_output: CleanData,
+    *,
+    workers: int = 1,
+    mode: str = "replace",
+) -> int:
+    """Replace or upsert staging from the clean output; returns the clean rows copied."""
+    logger.info("Refreshing staging table (%s): staging.financial_transactions", mode)
+    if workers > 1:
+        return load_staging_parallel(pool, conn, clean_output, workers=workers, mode=mode)
+    if mode == "incremental":
+        return upsert_staging(conn, clean_output)
+    with conn.cursor() as cur:
+        cur.execute("truncate table staging.financial_transactions;")
+    conn.commit()
+
+    return copy_clean(conn, clean_output)
+
+
+def load_to_postgres(
+    pg: PostgresConfig,
+    *,
+    migrations_dir: Path,
+    raw_snapshot: Path,
+    clean_output: CleanData,
+    staging_workers: int = 1,
+    staging_mode: str = "replace",
+    load_batch_id: Optional[str] = None,
+    raw_retention_days: Optional[int] = None,
+) -> None:
+    if load_batch_id is None:
+        load_batch_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    logger.info("Connecting to Postgres %s:%s/%s", pg.host, pg.port, pg.dbname)
+    pool = ConnectionPool(pg, max_size=staging_workers + 1)
+    try:
+        with pool.connection() as conn:
+            apply_migrations(conn, migrations_dir)
+
+            load_raw(conn, raw_snapshot, load_batch_id=load_batch_id)
+            if raw_retention_days is not None:
+                drop_expired_raw_partitions(conn, raw_retention_days)
+            load_staging(pool, conn, clean_output, workers=staging_workers, mode=staging_mode)
+    finally:
+        pool.log_stats()
+        pool.closeall()
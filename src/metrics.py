@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import json
+import logging
+import re
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+def _cpu_seconds() -> float:
+    # This process (all threads) plus finished child processes (e.g. the dbt CLI).
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak-RSS mark (Linux); False where that is not possible."""
+    try:
+        _PROC_CLEAR_REFS.write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> int:
+    try:
+        match = re.search(r"^VmHWM:\s+(\d+) kB", _PROC_STATUS.read_text(), re.M)
+        if match:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    status: str = "ok"
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    # Peak RSS of the process while the stage ran (since the process started, on
+    # platforms where the peak cannot be reset); None for background stages.
+    peak_rss_bytes: Optional[int] = None
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        if rows is None or self.wall_seconds <= 0:
+            return None
+        return rows / self.wall_seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["wall_seconds"] = round(self.wall_seconds, 4)
+        d["cpu_seconds"] = round(self.cpu_seconds, 4)
+        rps = self.rows_per_second
+        d["rows_per_second"] = None if rps is None else round(rps, 1)
+        return d
+
+
+@dataclass
+class RunMetrics:
+    """
+    Per-stage timings, CPU, peak memory and row counts of one pipeline run.
+
+    Stages run one after another on the main thread; CPU time is process-wide, so
+    work overlapping a stage (the background raw load, the dbt CLI) counts towards it.
+    """
+
+    run_ts: Optional[str] = None
+    stages: List[StageMetrics] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    @contextmanager
+    def stage(self, name: str, *, rows_in: Optional[int] = None) -> Iterator[StageMetrics]:
+        """Measure the block as stage `name`; the caller fills in the row counts it knows."""
+        m = StageMetrics(stage=name, rows_in=rows_in)
+        exact_peak = _reset_peak_rss()
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+        try:
+            yield m
+        except BaseException:
+            m.status = "failed"
+            raise
+        finally:
+            m.wall_seconds = time.perf_counter() - wall
+            m.cpu_seconds = _cpu_seconds() - cpu
+            m.peak_rss_bytes = _peak_rss_bytes()
+            self.record(m)
+            if not exact_peak:
+                logger.debug("Peak RSS of stage %s is the process peak so far", name)
+
+    def record(self, m: StageMetrics) -> None:
+        self.stages.append(m)
+        logger.info(
+            "Stage %s %s: %.2fs wall, %.2fs cpu, peak RSS %s, rows in=%s out=%s (%s rows/s)",
+            m.stage,
+            m.status,
+            m.wall_seconds,
+            m.cpu_seconds,
+            "-" if m.peak_rss_bytes is None else f"{m.peak_rss_bytes / (1 << 20):.0f} MB",
+            m.rows_in,
+            m.rows_out,
+            "-" if m.rows_per_second is None else f"{m.rows_per_second:.0f}",
+        )
+
+    def to_dict(self, *, exit_code: int) -> Dict[str, Any]:
+        return {
+            "run_ts": self.run_ts,
+            "exit_code": exit_code,
+            "wall_seconds": round(time.monotonic() - self.started, 4),
+            "stages": [m.to_dict() for m in self.stages],
+        }
+
+    def write_json(self, processed_dir: Path, *, exit_code: int) -> Path:
+        processed_dir.mkdir(parents=True, exist_ok=True)
+        path = processed_dir / f"run_metrics_{self.run_ts}.json"
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_dict(exit_code=exit_code), f, indent=2)
+        return path
+
+    def write_prometheus(self, path: Path, *, exit_code: int) -> None:
+        """
+        Write the run as a Prometheus textfile (for node_exporter's textfile collector),
+        replacing the previous run's file atomically.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(render_prometheus(self.to_dict(exit_code=exit_code)), encoding="utf-8")
+        tmp.replace(path)
+
+
+_STAGE_GAUGES = (
+    ("wall_seconds", "pipeline_stage_wall_seconds", "Wall-clock seconds of the stage in the last run."),
+    ("cpu_seconds", "pipeline_stage_cpu_seconds", "CPU seconds used during the stage in the last run."),
+    ("peak_rss_bytes", "pipeline_stage_peak_rss_bytes", "Peak resident memory during the stage in the last run."),
+    ("rows_in", "pipeline_stage_rows_in", "Rows read by the stage in the last run."),
+    ("rows_out", "pipeline_stage_rows_out", "Rows written by the stage in the last run."),
+    ("rows_per_second", "pipeline_stage_rows_per_second", "Stage throughput in the last run."),
+)
+
+
+def render_prometheus(run: Dict[str, Any]) -> str:
+    lines = [
+        "# HELP pipeline_last_run_exit_code Exit code of the last pipeline run (0 = success).",
+        "# TYPE pipeline_last_run_exit_code gauge",
+        f"pipeline_last_run_exit_code {run['exit_code']}",
+        "# HELP pipeline_last_run_wall_seconds Wall-clock seconds of the last pipeline run.",
+        "# TYPE pipeline_last_run_wall_seconds gauge",
+        f"pipeline_last_run_wall_seconds {run['wall_seconds']}",
+        "# HELP pipeline_last_run_timestamp_seconds Unix time the last pipeline run finished.",
+        "# TYPE pipeline_last_run_timestamp_seconds gauge",
+        f"pipeline_last_run_timestamp_seconds {time.time():.0f}",
+    ]
+    for key, name, help_text in _STAGE_GAUGES:
+        samples = [(s["stage"], s[key]) for s in run["stages"] if s[key] is not None]
+        if not samples:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        lines += [f'{name}{{stage="{stage}"}} {value}' for stage, value in samples]
+    return "\n".join(lines) + "\n"
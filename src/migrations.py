@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extensions import connection as PgConnection
+
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = "public.schema_migrations"
+# First-line marker for migrations that cannot run inside a transaction block
+# (e.g. CREATE INDEX CONCURRENTLY).
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+_FILENAME_RE = re.compile(r"^(\d+)_([A-Za-z0-9_]+)\.sql$")
+# The index and table of a concurrent index build (names unquoted).
+_CONCURRENT_INDEX_RE = re.compile(
+    r"^create\s+(?:unique\s+)?index\s+concurrently\s+if\s+not\s+exists\s+(\w+)\s+on\s+(?:only\s+)?(?:(\w+)\.)?\w+",
+    re.IGNORECASE,
+)
+# Arbitrary constant identifying the migration runner's advisory lock.
+_ADVISORY_LOCK_KEY = 7_242_310_015
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+    sql: str
+    checksum: str
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+
+def discover_migrations(migrations_dir: Path) -> List[Migration]:
+    """Migration files (`<version>_<name>.sql`) in version order."""
+    migrations: Dict[int, Migration] = {}
+    for path in sorted(migrations_dir.glob("*.sql")):
+        m = _FILENAME_RE.match(path.name)
+        if not m:
+            raise MigrationError(f"Migration file name must look like 0001_name.sql: {path}")
+        version = int(m.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {migrations[version].path.name}, {path.name}")
+        data = path.read_bytes()
+        migrations[version] = Migration(
+            version=version,
+            name=m.group(2),
+            path=path,
+            sql=data.decode("utf-8"),
+            checksum=hashlib.sha256(data).hexdigest(),
+        )
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Split a no-transaction migration into statements at semicolons that end a line.
+
+    Deliberately simple: such migrations hold a few standalone statements (no
+    function bodies), which Postgres must receive one at a time to keep each out of
+    an implicit transaction block.
+    """
+    statements = []
+    for part in re.split(r";[ \t]*(?:--[^\n]*)?(?:\n|$)", sql):
+        code = "\n".join(line for line in part.splitlines() if not line.strip().startswith("--")).strip()
+        if code:
+            statements.append(code)
+    return statements
+
+
+def _applied_versions(conn: PgConnection) -> Dict[int, str]:
+    # The steady-state fast path: one indexed read, no DDL and no catalog locks.
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"select version, checksum from {MIGRATIONS_TABLE};")
+            rows = cur.fetchall()
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return {}
+    conn.rollback()
+    return {version: checksum for version, checksum in rows}
+
+
+def _check_applied(migrations: List[Migration], applied: Dict[int, str]) -> None:
+    by_version = {m.version: m for m in migrations}
+    for version, checksum in sorted(applied.items()):
+        m = by_version.get(version)
+        if m is None:
+            logger.warning("Applied migration %s has no file in the migrations directory", version)
+        elif m.checksum != checksum:
+            raise MigrationError(
+                f"Migration {m.path.name} changed after it was applied (checksum mismatch); "
+                "add a new migration instead of editing an applied one"
+            )
+
+
+def _record(cur: psycopg2.extensions.cursor, m: Migration, duration_ms: int) -> None:
+    cur.execute(
+        f"insert into {MIGRATIONS_TABLE} (version, name, checksum, duration_ms) values (%s, %s, %s, %s);",
+        (m.version, m.name, m.checksum, duration_ms),
+    )
+
+
+def _concurrent_index_target(statement: str) -> Optional[Tuple[str, str]]:
+    """(schema, index) built by a `create index concurrently if not exists` statement, else None."""
+    m = _CONCURRENT_INDEX_RE.match(statement.strip())
+    if m is None:
+        return None
+    return m.group(2) or "public", m.group(1)
+
+
+def _drop_invalid_index(cur: psycopg2.extensions.cursor, schema: str, index: str) -> None:
+    cur.execute(
+        """
+        select 1
+        from pg_index i
+        join pg_class c on c.oid = i.indexrelid
+        join pg_namespace n on n.oid = c.relnamespace
+        where n.nspname = %s and c.relname = %s and not i.indisvalid;
+        """,
+        (schema, index),
+    )
+    if cur.fetchone() is not None:
+        logger.warning("Dropping invalid index %s.%s left by a failed concurrent build", schema, index)
+        cur.execute(f'drop index concurrently if exists "{schema}"."{index}";')
+
+
+def _apply(conn: PgConnection, m: Migration) -> None:
+    logger.info("Applying migration %s (%s)", m.path.name, "transactional" if m.transactional else "no transaction")
+    started = time.monotonic()
+    if m.transactional:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(m.sql)
+                _record(cur, m, int((time.monotonic() - started) * 1000))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        return
+
+    # Each statement commits on its own, so the migration must be safe to re-run
+    # (IF NOT EXISTS) in case it fails part-way; it is recorded only once all succeed.
+    # IF NOT EXISTS alone is not enough for a concurrent index build: a failed one
+    # leaves an invalid index of that name behind, which is dropped before the retry.
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for statement in split_statements(m.sql):
+                target = _concurrent_index_target(statement)
+                if target is not None:
+                    _drop_invalid_index(cur, *target)
+                cur.execute(statement)
+            _record(cur, m, int((time.monotonic() - started) * 1000))
+    finally:
+        conn.autocommit = False
+
+
+def apply_migrations(conn: PgConnection, migrations_dir: Path) -> List[Migration]:
+    """
+    Bring the warehouse schema up to date; returns the migrations applied (usually none).
+
+    Applied versions and checksums live in `public.schema_migrations`. Pending
+    migrations are applied in order under an advisory lock, so concurrent runs
+    migrate once.
+    """
+    migrations = discover_migrations(migrations_dir)
+    applied = _applied_versions(conn)
+    _check_applied(migrations, applied)
+    if all(m.version in applied for m in migrations):
+        logger.info("Warehouse schema up to date (version %s)", max(applied, default=0))
+        return []
+
+    with conn.cursor() as cur:
+        cur.execute("select pg_advisory_lock(%s);", (_ADVISORY_LOCK_KEY,))
+    conn.commit()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                create table if not exists {MIGRATIONS_TABLE} (
+                  version integer primary key,
+                  name text not null,
+                  checksum text not null,
+                  duration_ms integer not null,
+                  applied_at timestamptz not null default now()
+                );
+                """
+            )
+        conn.commit()
+        # Another run may have migrated while this one waited for the lock.
+        applied = _applied_versions(conn)
+        _check_applied(migrations, applied)
+        pending = [m for m in migrations if m.version not in applied]
+        for m in pending:
+            _apply(conn, m)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute("select pg_advisory_unlock(%s);", (_ADVISORY_LOCK_KEY,))
+        conn.commit()
+    logger.info("Applied %s migration(s); warehouse schema at version %s", len(pending), migrations[-1].version)
+    return pending
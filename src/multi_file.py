@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .artifacts import artifact_suffix, snapshot_files
+from .engine import Engine
+from .external_sort import DEFAULT_BLOCK_ROWS, merge_plan
+from .snapshot import iter_snapshot_chunks, parse_snapshot, snapshot_columns
+from .transform import merge_clean_runs, spill_clean_run
+from .validate import (
+    CheckCounters,
+    DuplicateTracker,
+    ValidationError,
+    ValidationThresholds,
+    build_report,
+    write_validation_report,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FileResult:
+    """What one worker learned about one input file."""
+
+    index: int
+    path: Path
+    columns: List[str]
+    counters: CheckCounters
+    # Hashes of the file's distinct transaction_ids, for counting duplicates across files.
+    id_hashes: np.ndarray
+    # Sorted clean runs of the file, in input order (empty unless transformed).
+    run_paths: List[Path] = field(default_factory=list)
+    clean_columns: Optional[List[str]] = None
+    dropped: int = 0
+
+
+def _process_file(
+    index: int,
+    path: Path,
+    spill_dir: Path,
+    chunk_rows: Optional[int],
+    validate: bool,
+    transform: bool,
+    engine: Engine,
+) -> FileResult:
+    """Runs in a worker process: validate and/or clean one file, spilling its clean runs."""
+    chunks = [parse_snapshot(path)] if chunk_rows is None else iter_snapshot_chunks(path, chunk_rows)
+    counters = CheckCounters()
+    duplicates = DuplicateTracker()
+    run_paths: List[Path] = []
+    clean_columns: Optional[List[str]] = None
+    dropped = 0
+    for i, parsed in enumerate(chunks):
+        if validate:
+            ids = parsed.raw["transaction_id"]
+            counters = counters.merge(engine.count_checks(parsed))
+            counters = counters.merge(CheckCounters(duplicate_transaction_id=duplicates.count(ids)))
+        if transform:
+            run_path = spill_dir / f"run_{index:04d}_{i:06d}.pkl"
+            block_rows = DEFAULT_BLOCK_ROWS if chunk_rows is None else merge_plan(chunk_rows)[1]
+            clean_columns, rows, chunk_dropped = spill_clean_run(parsed, run_path, block_rows=block_rows, engine=engine)
+            dropped += chunk_dropped
+            if rows:
+                run_paths.append(run_path)
+    return FileResult(
+        index=index,
+        path=path,
+        columns=snapshot_columns(path),
+        counters=counters,
+        id_hashes=duplicates.hashes(),
+        run_paths=run_paths,
+        clean_columns=clean_columns,
+        dropped=dropped,
+    )
+
+
+def process_files(
+    snapshot_dir: Path,
+    spill_dir: Path,
+    *,
+    workers: int,
+    chunk_rows: Optional[int] = None,
+    validate: bool = True,
+    transform: bool = True,
+    engine: Engine = Engine(),
+) -> List[FileResult]:
+    """
+    Validate and/or clean every file of a multi-file snapshot, one file per task on a
+    pool of `workers` processes (inline when that is 1); results are in input order.
+    """
+    files = snapshot_files(snapshot_dir)
+    workers = max(1, min(workers, len(files)))
+    logger.info("Processing %s input files with %s worker process(es)", len(files), workers)
+    args = [(i, path, spill_dir, chunk_rows, validate, transform, engine) for i, path in enumerate(files)]
+    if workers == 1:
+        results = [_process_file(*a) for a in args]
+    else:
+        # Spawn, not fork: the parent may hold open connections and threads (background raw load).
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+            results = list(executor.map(_process_file, *zip(*args)))
+
+    columns = results[0].columns if results else []
+    for r in results:
+        if r.columns != columns:
+            raise ValueError(f"Input file {r.path} has columns {r.columns}, expected {columns}")
+    return results
+
+
+def combined_report(
+    snapshot_dir: Path,
+    results: Sequence[FileResult],
+    *,
+    thresholds: ValidationThresholds = ValidationThresholds(),
+) -> Dict[str, Any]:
+    """
+    One report over all files (as if they were concatenated), with each file's own
+    report under "files"; it passes only when the combined checks and every file pass.
+    """
+    counters = CheckCounters()
+    for r in results:
+        counters = counters.merge(r.counters)
+    # Repeats within a file are already counted; add ids first seen in an earlier file.
+    distinct_per_file = sum(len(r.id_hashes) for r in results)
+    distinct = len(np.unique(np.concatenate([r.id_hashes for r in results]))) if results else 0
+    counters = counters.merge(CheckCounters(duplicate_transaction_id=distinct_per_file - distinct))
+
+    report = build_report(snapshot_dir, counters, thresholds=thresholds)
+    report["files"] = [build_report(r.path, r.counters, thresholds=thresholds) for r in results]
+    failed_files = [f["file"] for f in report["files"] if not f["passed"]]
+    if failed_files:
+        report["failed_checks"].append("input_file_failed")
+        report["failed_files"] = failed_files
+        report["passed"] = False
+    return report
+
+
+def validate_files_or_raise(
+    snapshot_dir: Path,
+    results: Sequence[FileResult],
+    processed_dir: Path,
+    run_ts: str,
+) -> Path:
+    report = combined_report(snapshot_dir, results)
+    report_path = write_validation_report(report, processed_dir, run_ts)
+
+    if not report.get("passed", False):
+        msg = f"Validation failed. See report: {report_path}"
+        logger.error(msg)
+        raise ValidationError(msg)
+
+    logger.info("Validation of %s files passed. Report: %s", len(results), report_path)
+    return report_path
+
+
+def merge_clean_output(
+    results: Sequence[FileResult],
+    processed_dir: Path,
+    run_ts: str,
+    *,
+    chunk_rows: Optional[int] = None,
+    output_format: str = "csv",
+) -> Path:
+    """Dedupe the clean runs of all files into one `clean_transactions_{run_ts}.<ext>`."""
+    out_path = processed_dir / f"clean_transactions_{run_ts}{artifact_suffix(output_format)}"
+    dropped = sum(r.dropped for r in results)
+    if dropped:
+        logger.warning("Dropped %s rows during cleaning (staging-safe filter).", dropped)
+    run_paths = [p for r in results for p in r.run_paths]
+    columns = next((r.clean_columns for r in results if r.clean_columns), None)
+    if columns is None:
+        columns = results[0].columns if results else []
+    rows = merge_clean_runs(run_paths, columns, out_path, chunk_rows=chunk_rows)
+    logger.info("Wrote clean output: %s (rows=%s, files=%s)", out_path, rows, len(results))
+    return out_path
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import struct
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+from .artifacts import require_pyarrow
+
+
+# PostgreSQL binary COPY framing: signature, flags field, header extension length.
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+COPY_TRAILER = struct.pack("!h", -1)
+
+_PG_EPOCH_US = 946_684_800_000_000  # 2000-01-01T00:00:00Z in Unix microseconds
+_PG_EPOCH_DAYS = 10_957  # 2000-01-01 in days since the Unix epoch
+
+_NUMERIC_POS = 0x0000
+_NUMERIC_NEG = 0x4000
+
+
+def _null_mask(arr: Any) -> np.ndarray:
+    return np.asarray(arr.is_null().to_numpy(zero_copy_only=False), dtype=bool)
+
+
+def _binary_from_rows(rows: np.ndarray, valid: Optional[np.ndarray] = None) -> Any:
+    """Wrap an (n, width) uint8 matrix as an Arrow binary array (one value per row)."""
+    pa = require_pyarrow()
+    n, width = rows.shape
+    validity = pa.array(valid).buffers()[1] if valid is not None else None
+    fixed = pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(width), n, [validity, pa.py_buffer(np.ascontiguousarray(rows))]
+    )
+    return fixed.cast(pa.binary())
+
+
+def _length_prefix(lengths: np.ndarray) -> Any:
+    return _binary_from_rows(lengths.astype(">i4").view(np.uint8).reshape(len(lengths), 4))
+
+
+def _fixed_field(arr: Any, values: np.ndarray) -> Tuple[Any, Any]:
+    null = _null_mask(arr)
+    n = len(values)
+    width = values.dtype.itemsize
+    payload = _binary_from_rows(values.view(np.uint8).reshape(n, width), ~null)
+    return _length_prefix(np.where(null, -1, width)), payload
+
+
+def _text_field(arr: Any) -> Tuple[Any, Any]:
+    pa = require_pyarrow()
+    payload = arr.cast(pa.binary())
+    lengths = pa.compute.binary_length(payload).fill_null(-1).to_numpy()
+    return _length_prefix(lengths), payload
+
+
+def _numeric_field(arr: Any) -> Tuple[Any, Any]:
+    """
+    Encode decimal128(p<=18, s<=4) as PostgreSQL `numeric` in a fixed digit layout.
+
+    Leading zero base-10000 digits are allowed by numeric_recv (the value is
+    normalized on receipt), so every row uses the same width.
+    """
+    precision, scale = arr.type.precision, arr.type.scale
+    if precision > 18 or scale > 4:
+        raise TypeError(f"Binary COPY supports decimal128 up to (18, 4), got {arr.type}")
+    n = len(arr)
+    # Unscaled decimal128 values are little-endian 16-byte integers; for p <= 18 they
+    # fit in the low signed 64-bit word.
+    words = np.frombuffer(arr.buffers()[1], dtype="<i8").reshape(-1, 2)
+    unscaled = words[arr.offset : arr.offset + n, 0]
+
+    sign = np.where(unscaled < 0, _NUMERIC_NEG, _NUMERIC_POS)
+    magnitude = np.abs(unscaled)
+    int_part = magnitude // 10**scale
+    int_groups = max(1, -(-(precision - scale) // 4))
+    digits = [(int_part // 10 ** (4 * (int_groups - 1 - k))) % 10_000 for k in range(int_groups)]
+    if scale:
+        digits.append((magnitude % 10**scale) * 10 ** (4 - scale))
+
+    values = np.empty((n, 4 + len(digits)), dtype=">i2")
+    values[:, 0] = len(digits)  # ndigits
+    values[:, 1] = int_groups - 1  # weight of the first digit
+    values[:, 2] = sign
+    values[:, 3] = scale  # dscale
+    for k, d in enumerate(digits):
+        values[:, 4 + k] = d
+    null = _null_mask(arr)
+    width = values.shape[1] * 2
+    payload = _binary_from_rows(values.view(np.uint8).reshape(n, width), ~null)
+    return _length_prefix(np.where(null, -1, width)), payload
+
+
+def _encode_column(arr: Any) -> Tuple[Any, Any]:
+    """Return (4-byte length prefix, payload) binary arrays for one column."""
+    pa = require_pyarrow()
+    t = arr.type
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        return _text_field(arr)
+    if pa.types.is_timestamp(t):
+        us = arr.cast(pa.timestamp("us", tz=t.tz)).cast(pa.int64()).fill_null(0).to_numpy()
+        return _fixed_field(arr, (us - _PG_EPOCH_US).astype(">i8"))
+    if pa.types.is_date32(t):
+        days = arr.cast(pa.int32()).fill_null(0).to_numpy()
+        return _fixed_field(arr, (days - _PG_EPOCH_DAYS).astype(">i4"))
+    if pa.types.is_boolean(t):
+        return _fixed_field(arr, arr.cast(pa.uint8()).fill_null(0).to_numpy().astype(np.uint8))
+    if pa.types.is_decimal(t):
+        return _numeric_field(arr)
+    raise TypeError(f"Unsupported Arrow type for binary COPY: {t}")
+
+
+def encode_record_batch(batch: Any) -> bytes:
+    """
+    Encode an Arrow record batch as binary COPY tuples (no header/trailer).
+
+    Supported column types: string, timestamp, date32, bool, decimal128. Each column
+    becomes a length-prefix array and a payload array, and Arrow's element-wise
+    binary join interleaves them into tuples; there is no per-row Python work.
+    """
+    pa = require_pyarrow()
+    if batch.num_rows == 0:
+        return b""
+    parts: List[Any] = [pa.scalar(struct.pack("!h", batch.num_columns), pa.binary())]
+    for i in range(batch.num_columns):
+        parts.extend(_encode_column(batch.column(i)))
+    # NULL payloads contribute no bytes; their prefix already says -1.
+    tuples = pa.compute.binary_join_element_wise(*parts, b"", null_handling="replace", null_replacement=b"")
+    offsets = np.frombuffer(tuples.buffers()[1], dtype="<i4")
+    start, end = offsets[tuples.offset], offsets[tuples.offset + len(tuples)]
+    return tuples.buffers()[2][start:end].to_pybytes()
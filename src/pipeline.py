@@ -1,62 +1,401 @@
 from __future__ import annotations
 
+import argparse
+import json
 import logging
-import subprocess
 import sys
+import tempfile
 from pathlib import Path
+from typing import Optional, Sequence
 
-from .config import load_config
-from .extract import extract_csv
-from .load import load_to_postgres
+from .artifacts import artifact_row_count, snapshot_files
+from .checkpoint import RunState, find_resumable_run
+from .config import AppConfig, load_config
+from .db import ConnectionPool
+from .dbt_runner import DbtError, run_dbt
+from .engine import Engine, get_engine
+from .extract import (
+    ExtractResult,
+    extract_csv,
+    extract_csv_incremental,
+    extract_files,
+    inputs_sha256,
+    is_multi_file_input,
+    mark_snapshot_loaded,
+    resolve_inputs,
+    sha256_file,
+)
+from .key_index import KeyIndex
+from .load import (
+    BackgroundRawLoad,
+    CleanData,
+    drop_expired_raw_partitions,
+    load_raw,
+    load_staging,
+    staging_fingerprint,
+)
 from .logging_config import configure_logging
-from .transform import transform_snapshot
+from .metrics import RunMetrics
+from .migrations import apply_migrations
+from .multi_file import merge_clean_output, process_files, validate_files_or_raise
+from .snapshot import chunk_rows_for_budget, parse_snapshot
+from .transform import clean_snapshot, transform_snapshot
 from .validate import ValidationError, validate_or_raise
 
 
 logger = logging.getLogger(__name__)
 
+DBT_PROFILES_DIR = Path("/root/.dbt")
 
-def run_dbt(project_dir: Path) -> None:
-    profiles_dir = Path("/root/.dbt")
 
-    logger.info("Running dbt deps")
-    subprocess.run(
-        ["dbt", "deps", "--profiles-dir", str(profiles_dir), "--project-dir", str(project_dir)],
-        check=True,
+def _extract(cfg: AppConfig) -> ExtractResult:
+    if is_multi_file_input(cfg.paths.raw_input_csv):
+        if cfg.processing.extract_mode == "incremental":
+            raise ValueError("PIPELINE_EXTRACT_MODE=incremental needs a single input file, not a directory or glob")
+        return extract_files(
+            cfg.paths.raw_input_csv,
+            cfg.paths.processed_dir,
+            snapshot_format=cfg.processing.snapshot_format,
+            link_mode=cfg.processing.snapshot_link,
+            skip_loaded=cfg.processing.skip_unchanged,
+        )
+    if cfg.processing.extract_mode == "incremental":
+        return extract_csv_incremental(
+            cfg.paths.raw_input_csv,
+            cfg.paths.processed_dir,
+            snapshot_format=cfg.processing.snapshot_format,
+        )
+    return extract_csv(
+        cfg.paths.raw_input_csv,
+        cfg.paths.processed_dir,
+        snapshot_format=cfg.processing.snapshot_format,
+        link_mode=cfg.processing.snapshot_link,
+        skip_loaded=cfg.processing.skip_unchanged,
     )
 
-    logger.info("Running dbt run")
-    subprocess.run(
-        ["dbt", "run", "--profiles-dir", str(profiles_dir), "--project-dir", str(project_dir)],
-        check=True,
-    )
 
-    logger.info("Running dbt test")
-    subprocess.run(
-        ["dbt", "test", "--profiles-dir", str(profiles_dir), "--project-dir", str(project_dir)],
-        check=True,
+def _resumable_state(cfg: AppConfig) -> Optional[RunState]:
+    # A full extract is keyed by the input's hash; an incremental one by its delta.
+    input_sha256 = None
+    spec = cfg.paths.raw_input_csv
+    if cfg.processing.extract_mode == "full" and is_multi_file_input(spec):
+        try:
+            input_sha256 = inputs_sha256(resolve_inputs(spec))
+        except FileNotFoundError:
+            pass
+    elif cfg.processing.extract_mode == "full" and spec.exists():
+        input_sha256 = sha256_file(spec)
+    return find_resumable_run(cfg.paths.processed_dir, input_sha256)
+
+
+def _report_rows(report_path: Path) -> int:
+    with report_path.open("r", encoding="utf-8") as f:
+        return int(json.load(f)["row_count"])
+
+
+def _chunk_rows(cfg: AppConfig, snapshot: Path) -> Optional[int]:
+    """PIPELINE_CHUNK_ROWS, or the batch size that fits the memory budget (None: whole files)."""
+    proc = cfg.processing
+    if proc.chunk_rows is not None or proc.memory_budget_mb is None:
+        return proc.chunk_rows
+    files = snapshot_files(snapshot)
+    # Input workers each hold one file at a time; size batches for the largest file.
+    workers = min(proc.input_workers, len(files)) if snapshot.is_dir() else 1
+    largest = max(files, key=lambda p: p.stat().st_size)
+    return chunk_rows_for_budget(largest, proc.memory_budget_mb * (1 << 20) // max(workers, 1))
+
+
+def _validate_and_transform_files(
+    cfg: AppConfig,
+    state: RunState,
+    snapshot_dir: Path,
+    metrics: RunMetrics,
+    *,
+    need_validate: bool,
+    chunk_rows: Optional[int],
+    engine: Engine,
+) -> Path:
+    """Validate and clean the files of a multi-file snapshot in parallel, then combine them."""
+    processed_dir = cfg.paths.processed_dir
+    processed_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="multi_file_spill_", dir=processed_dir) as spill_dir:
+        with metrics.stage("process_files") as m:
+            results = process_files(
+                snapshot_dir,
+                Path(spill_dir),
+                workers=cfg.processing.input_workers,
+                chunk_rows=chunk_rows,
+                validate=need_validate,
+                engine=engine,
+            )
+            if need_validate:
+                m.rows_in = sum(r.counters.row_count for r in results)
+        if need_validate:
+            with metrics.stage("validate") as m:
+                report_path = validate_files_or_raise(snapshot_dir, results, processed_dir, state.run_ts)
+                m.rows_in = m.rows_out = _report_rows(report_path)
+            state.complete("validate", report=str(report_path))
+        with metrics.stage("transform") as m:
+            clean_output = merge_clean_output(
+                results,
+                processed_dir,
+                state.run_ts,
+                chunk_rows=chunk_rows,
+                output_format=cfg.processing.clean_format,
+            )
+            m.rows_out = artifact_row_count(clean_output)
+    state.complete("transform", clean_output=str(clean_output))
+    return clean_output
+
+
+def _validate_and_transform(
+    cfg: AppConfig, state: RunState, extract_res: ExtractResult, metrics: RunMetrics
+) -> Optional[CleanData]:
+    snapshot = extract_res.snapshot_path
+    processed_dir = cfg.paths.processed_dir
+    multi_file = snapshot.is_dir()
+
+    clean_output: Optional[CleanData] = None
+    if state.done("transform"):
+        clean_output = Path(state.artifacts("transform")["clean_output"])
+    need_validate = not state.done("validate")
+    # An in-memory clean frame is not an artifact, so it is rebuilt unless staging is loaded.
+    need_transform = clean_output is None and not state.done("load_staging")
+    if not (need_validate or need_transform):
+        return clean_output
+
+    chunk_rows = _chunk_rows(cfg, snapshot)
+    engine = get_engine(cfg.processing.engine)
+    # Keep the typed clean frame; staging is loaded from it with binary COPY.
+    in_memory = cfg.processing.in_memory_load and chunk_rows is None and not multi_file
+
+    if multi_file:
+        if need_transform:
+            clean_output = _validate_and_transform_files(
+                cfg, state, snapshot, metrics, need_validate=need_validate, chunk_rows=chunk_rows, engine=engine
+            )
+        return clean_output
+
+    # Fail-fast validation streams the snapshot before anything reads it whole.
+    fail_fast = need_validate and cfg.processing.fail_fast
+    parsed = None
+    rows: Optional[int] = None
+    if chunk_rows is None and not fail_fast:
+        # Read and type-coerce the snapshot once; validate and transform share it.
+        with metrics.stage("parse") as m:
+            parsed = parse_snapshot(snapshot)
+            rows = m.rows_out = len(parsed)
+    if need_validate:
+        with metrics.stage("validate", rows_in=rows) as m:
+            report_path = validate_or_raise(
+                snapshot,
+                processed_dir,
+                state.run_ts,
+                parsed=parsed,
+                chunk_rows=chunk_rows,
+                engine=engine,
+                fail_fast=fail_fast,
+            )
+            rows = m.rows_in = m.rows_out = _report_rows(report_path)
+        state.complete("validate", report=str(report_path))
+    if need_transform and chunk_rows is None and parsed is None:
+        with metrics.stage("parse") as m:
+            parsed = parse_snapshot(snapshot)
+            rows = m.rows_out = len(parsed)
+    if need_transform:
+        with metrics.stage("transform", rows_in=rows) as m:
+            if in_memory:
+                clean_output = clean_snapshot(snapshot, parsed=parsed, engine=engine)
+                m.rows_out = len(clean_output)
+            else:
+                clean_output = transform_snapshot(
+                    snapshot,
+                    processed_dir,
+                    state.run_ts,
+                    parsed=parsed,
+                    chunk_rows=chunk_rows,
+                    output_format=cfg.processing.clean_format,
+                    engine=engine,
+                )
+                m.rows_out = artifact_row_count(clean_output)
+        if not in_memory:
+            state.complete("transform", clean_output=str(clean_output))
+    return clean_output
+
+
+def _staging_mode(cfg: AppConfig, extract_res: ExtractResult) -> str:
+    # A delta replacing staging would drop every previously loaded row.
+    return "incremental" if extract_res.is_delta else cfg.processing.staging_mode
+
+
+def _classify(
+    cfg: AppConfig,
+    state: RunState,
+    extract_res: ExtractResult,
+    clean_output: CleanData,
+    key_index: KeyIndex,
+    pool: ConnectionPool,
+    metrics: RunMetrics,
+) -> CleanData:
+    """Sort the clean rows into new/updated/unchanged; an upsert then loads only the changed ones."""
+    changed_path = None
+    if _staging_mode(cfg, extract_res) == "incremental":
+        changed_path = cfg.paths.processed_dir / f"changed_transactions_{state.run_ts}.arrow"
+    with metrics.stage("classify") as m:
+        with pool.connection() as conn:
+            staging = staging_fingerprint(conn)
+        counts = key_index.classify(clean_output, changed_path=changed_path, staging=staging)
+        m.rows_in, m.rows_out = counts.total, counts.changed
+    return clean_output if changed_path is None else changed_path
+
+
+def _load(
+    cfg: AppConfig,
+    state: RunState,
+    extract_res: ExtractResult,
+    clean_output: Optional[CleanData],
+    pool: ConnectionPool,
+    metrics: RunMetrics,
+    *,
+    raw_load: Optional[BackgroundRawLoad] = None,
+    key_index: Optional[KeyIndex] = None,
+) -> None:
+    staging_mode = _staging_mode(cfg, extract_res)
+    if staging_mode != cfg.processing.staging_mode:
+        logger.info("Snapshot is a delta; upserting staging instead of replacing it")
+    if raw_load is not None:
+        # Migrations and raw COPY already ran alongside validation; publish the raw rows.
+        conn = raw_load.commit()
+        metrics.record(raw_load.metrics)
+        state.complete("load_raw")
+    else:
+        conn = pool.getconn()
+    try:
+        if raw_load is None:
+            with metrics.stage("migrate"):
+                apply_migrations(conn, cfg.paths.migrations_dir)
+        if not state.done("load_raw"):
+            with metrics.stage("load_raw") as m:
+                m.rows_in = m.rows_out = load_raw(conn, extract_res.snapshot_path, load_batch_id=state.run_ts)
+            state.complete("load_raw")
+        if cfg.processing.raw_retention_days is not None:
+            with metrics.stage("raw_retention"):
+                drop_expired_raw_partitions(conn, cfg.processing.raw_retention_days)
+        if not state.done("load_staging"):
+            if key_index is not None:
+                key_index.begin_load()
+            with metrics.stage("load_staging") as m:
+                m.rows_in = m.rows_out = load_staging(
+                    pool, conn, clean_output, workers=cfg.processing.load_workers, mode=staging_mode
+                )
+            state.complete("load_staging")
+            if key_index is not None:
+                key_index.apply(replace=staging_mode == "replace", staging=staging_fingerprint(conn))
+    finally:
+        pool.putconn(conn)
+
+
+def _open_pool(cfg: AppConfig) -> ConnectionPool:
+    pg = cfg.pg
+    logger.info("Connecting to Postgres %s:%s/%s", pg.host, pg.port, pg.dbname)
+    # The main connection, the background raw load and one per staging COPY stream.
+    pool = ConnectionPool(pg, max_size=cfg.processing.load_workers + 2)
+    try:
+        # Fail before validate/transform, not after, when the database is unusable.
+        logger.info("Postgres reachable (probe took %.2fs)", pool.probe())
+    except BaseException:
+        pool.closeall()
+        raise
+    return pool
+
+
+def _parse_args(argv: Optional[Sequence[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m src.pipeline", description="Run the finance ETL pipeline.")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the latest unfinished run of the same input, skipping stages that already finished",
     )
+    return parser.parse_args(argv)
 
 
-def main() -> int:
-    configure_logging()
-    cfg = load_config()
+def _write_metrics(cfg: AppConfig, metrics: RunMetrics, exit_code: int) -> None:
+    # Metrics must never fail a run.
+    try:
+        path = metrics.write_json(cfg.paths.processed_dir, exit_code=exit_code)
+        logger.info("Wrote run metrics: %s", path)
+        if cfg.paths.metrics_textfile is not None:
+            metrics.write_prometheus(cfg.paths.metrics_textfile, exit_code=exit_code)
+    except OSError as e:
+        logger.warning("Could not write run metrics: %s", e)
 
+
+def _run(cfg: AppConfig, args: argparse.Namespace, metrics: RunMetrics) -> int:
     try:
-        extract_res = extract_csv(cfg.paths.raw_input_csv, cfg.paths.processed_dir)
-        validate_or_raise(extract_res.snapshot_path, cfg.paths.processed_dir, extract_res.run_ts)
-        clean_csv = transform_snapshot(extract_res.snapshot_path, cfg.paths.processed_dir, extract_res.run_ts)
-        load_to_postgres(
-            cfg.pg,
-            schema_sql=cfg.paths.schema_sql,
-            raw_snapshot_csv=extract_res.snapshot_path,
-            clean_csv=clean_csv,
-        )
-        run_dbt(cfg.paths.dbt_project_dir)
+        state = _resumable_state(cfg) if args.resume else None
+        if state is not None:
+            logger.info("Resuming run %s; finished stages: %s", state.run_ts, ", ".join(state.finished_stages()))
+            extract_res = state.extract_result()
+        else:
+            if args.resume:
+                logger.info("No unfinished run to resume; starting a new run")
+            with metrics.stage("extract"):
+                extract_res = _extract(cfg)
+            if extract_res.already_loaded:
+                logger.info("Pipeline skipped: input already loaded.")
+                return 0
+            state = RunState.create(cfg.paths.processed_dir, extract_res)
+        metrics.run_ts = state.run_ts
+
+        pool = None
+        if not (state.done("load_raw") and state.done("load_staging")):
+            pool = _open_pool(cfg)
+        key_index = None
+        if cfg.processing.key_index and not state.done("load_staging"):
+            key_index = KeyIndex.open(cfg.paths.processed_dir)
+        try:
+            raw_load = None
+            if pool is not None and cfg.processing.concurrent_stages and not state.done("load_raw"):
+                raw_load = BackgroundRawLoad(
+                    pool,
+                    migrations_dir=cfg.paths.migrations_dir,
+                    raw_snapshot=extract_res.snapshot_path,
+                    load_batch_id=state.run_ts,
+                )
+            try:
+                clean_output = _validate_and_transform(cfg, state, extract_res, metrics)
+                if key_index is not None:
+                    clean_output = _classify(cfg, state, extract_res, clean_output, key_index, pool, metrics)
+            except BaseException:
+                if raw_load is not None:
+                    raw_load.abort()
+                raise
+            if pool is not None:
+                _load(cfg, state, extract_res, clean_output, pool, metrics, raw_load=raw_load, key_index=key_index)
+            del clean_output
+        finally:
+            if key_index is not None:
+                key_index.close()
+            if pool is not None:
+                pool.log_stats()
+                pool.closeall()
+        if not state.done("dbt"):
+            # Replacing staging can drop rows, which only a rebuild removes from the marts.
+            run_dbt(
+                cfg.paths.dbt_project_dir,
+                profiles_dir=DBT_PROFILES_DIR,
+                full_refresh=_staging_mode(cfg, extract_res) == "replace",
+                select_mode=cfg.processing.dbt_select,
+                state_dir=cfg.paths.processed_dir / "dbt_state",
+                metrics=metrics,
+            )
+            state.complete("dbt")
+        mark_snapshot_loaded(cfg.paths.processed_dir, extract_res)
+        state.finish()
     except ValidationError:
         return 2
-    except subprocess.CalledProcessError as e:
-        logger.exception("Subprocess failed: %s", e)
+    except DbtError as e:
+        logger.exception("dbt failed: %s", e)
         return 3
     except Exception as e:
         logger.exception("Pipeline failed: %s", e)
@@ -66,7 +405,17 @@ def main() -> int:
     return 0
 
 
-if __name__ == "__main__":
-    raise SystemExit(main())
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = _parse_args(argv)
+    configure_logging()
+    cfg = load_config()
+
+    metrics = RunMetrics()
+    exit_code = _run(cfg, args, metrics)
+    if metrics.run_ts is not None:
+        _write_metrics(cfg, metrics, exit_code)
+    return exit_code
 
 
+if __name__ == "__main__":
+    raise SystemExit(main())
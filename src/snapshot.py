@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .artifacts import (
+    artifact_row_count,
+    artifact_schema,
+    iter_artifact_batches,
+    iter_text_csv_tables,
+    read_artifact_table,
+    read_text_csv,
+    require_pyarrow,
+    snapshot_frame_from_arrow,
+)
+from .dates import CachedDateParser
+
+
+logger = logging.getLogger(__name__)
+
+# Rows parsed to estimate a snapshot's in-memory size per row.
+_SAMPLE_ROWS = 10_000
+# Peak memory of validate + transform over one batch (the transform's cleaned copy,
+# sort and dedupe), as a multiple of the parsed batch.
+_WORKING_SET_FACTOR = 5
+# Per distinct transaction_id: the 64-bit hash that chunked validation keeps for the
+# whole file to count duplicates across batches, twice while its sorted runs merge.
+_TRACKED_ID_BYTES = 16
+# Smaller batches cost more in per-batch overhead than they save in memory.
+MIN_CHUNK_ROWS = 10_000
+
+# Raw columns (those of load.RAW_COLUMNS) with few distinct values, read as categoricals.
+# The other columns are read as Arrow-backed strings (object strings without pyarrow).
+CATEGORICAL_COLUMNS = (
+    "account_id",
+    "currency",
+    "merchant_id",
+    "merchant_name",
+    "category",
+    "country",
+    "city",
+    "payment_method",
+    "status",
+    "is_refund",
+)
+
+
+def snapshot_dtypes() -> Dict[str, Any]:
+    """
+    The read schema of a raw snapshot for pandas.read_csv (used without pyarrow):
+    every column is text, like the raw landing table, with repetitive ones as
+    categoricals. Per-column type inference would depend on which rows are in a
+    batch, so chunked and whole-file reads could disagree, and unparseable values
+    must reach validation. Amounts and dates are typed by `parse_frame`.
+    """
+    return defaultdict(lambda: str, {c: "category" for c in CATEGORICAL_COLUMNS})
+
+
+def _has_pyarrow() -> bool:
+    try:
+        require_pyarrow()
+    except RuntimeError:  # pragma: no cover (depends on environment)
+        return False
+    return True
+
+
+def _frame_from_arrow(table: Any) -> pd.DataFrame:
+    return snapshot_frame_from_arrow(table, categorical=CATEGORICAL_COLUMNS)
+
+
+_IS_REFUND_MAP = {
+    "1": True,
+    "0": False,
+    "true": True,
+    "false": False,
+    "t": True,
+    "f": False,
+    "yes": True,
+    "no": False,
+}
+
+
+def normalize_is_refund(value: Any) -> Optional[bool]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    s = str(value).strip().lower()
+    return _IS_REFUND_MAP.get(s)
+
+
+def map_unique(series: pd.Series, func: Callable[[Any], Any]) -> pd.Series:
+    """
+    `series.map(func)` that calls `func` once per distinct value and broadcasts the
+    results back through the factorized codes.
+
+    Missing values are mapped one by one, since factorize would conflate None and
+    NaN. The result dtype is inferred the same way `Series.map` infers it.
+    """
+    codes, uniques = pd.factorize(series)
+    # One spare slot at the end, which the -1 codes of missing values index into.
+    mapped = np.empty(len(uniques) + 1, dtype=object)
+    mapped[:-1] = [func(v) for v in uniques]
+    out = mapped[codes]
+    missing = codes == -1
+    if missing.any():
+        out[missing] = [func(v) for v in series.to_numpy(dtype=object)[missing]]
+    return pd.Series(out, index=series.index, name=series.name).infer_objects()
+
+
+def normalize_is_refund_series(series: pd.Series) -> pd.Series:
+    return map_unique(series, normalize_is_refund)
+
+
+def upper_str_series(series: pd.Series) -> pd.Series:
+    """Same as `series.astype(str).str.upper()`, computed per distinct value."""
+    return map_unique(series, lambda v: str(v).upper())
+
+
+# Process-wide parsers: distinct strings are parsed once, then served from the cache
+# (posting dates in particular repeat across rows and chunks).
+_TS_PARSER = CachedDateParser(utc=True)
+_DATE_PARSER = CachedDateParser(utc=False)
+
+
+def _parse_datetime_utc(series: pd.Series) -> pd.Series:
+    # Accept multiple common formats; coerce failures to NaT.
+    return _TS_PARSER.parse(series)
+
+
+def _parse_date(series: pd.Series) -> pd.Series:
+    # Parse into date (no time component). Supports mixed formats, coerces failures.
+    return _DATE_PARSER.parse(series).dt.date
+
+
+@dataclass(frozen=True)
+class ParsedSnapshot:
+    """
+    A snapshot read and type-coerced once, shared by validate and transform.
+
+    `raw` is the frame exactly as read from the CSV; the other fields are the
+    parsed/normalized columns derived from it (same index as `raw`).
+    """
+
+    path: Path
+    raw: pd.DataFrame
+    transaction_ts: pd.Series
+    posting_date: pd.Series
+    currency: pd.Series
+    status: pd.Series
+    is_refund: pd.Series
+    amount: pd.Series
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def memory_bytes(self) -> int:
+        parsed = (self.transaction_ts, self.posting_date, self.currency, self.status, self.is_refund, self.amount)
+        return int(self.raw.memory_usage(deep=True).sum()) + sum(int(s.memory_usage(deep=True)) for s in parsed)
+
+
+def parse_frame(df: pd.DataFrame, path: Path) -> ParsedSnapshot:
+    return ParsedSnapshot(
+        path=path,
+        raw=df,
+        transaction_ts=_parse_datetime_utc(df["transaction_ts"]),
+        posting_date=_parse_date(df["posting_date"]),
+        currency=upper_str_series(df["currency"]),
+        status=upper_str_series(df["status"]),
+        is_refund=normalize_is_refund_series(df["is_refund"]),
+        amount=pd.to_numeric(df["amount"], errors="coerce"),
+    )
+
+
+def _is_columnar(snapshot: Path) -> bool:
+    return snapshot.suffix != ".csv"
+
+
+def snapshot_columns(snapshot: Path) -> List[str]:
+    if _is_columnar(snapshot):
+        return list(artifact_schema(snapshot).names)
+    return list(pd.read_csv(snapshot, nrows=0).columns)
+
+
+def parse_snapshot(snapshot_csv: Path) -> ParsedSnapshot:
+    logger.info("Parsing snapshot: %s", snapshot_csv)
+    if _is_columnar(snapshot_csv):
+        return parse_frame(_frame_from_arrow(read_artifact_table(snapshot_csv)), snapshot_csv)
+    if _has_pyarrow():
+        # Arrow's reader builds compact columns directly, never a frame of Python strings.
+        return parse_frame(_frame_from_arrow(read_text_csv(snapshot_csv)), snapshot_csv)
+    return parse_frame(pd.read_csv(snapshot_csv, dtype=snapshot_dtypes()), snapshot_csv)
+
+
+def iter_snapshot_chunks(snapshot_csv: Path, chunk_rows: int) -> Iterator[ParsedSnapshot]:
+    """Yield the snapshot as parsed batches of at most `chunk_rows` rows each."""
+    for parsed, _ in iter_snapshot_chunks_to_end(snapshot_csv, chunk_rows):
+        yield parsed
+
+
+def iter_snapshot_chunks_to_end(snapshot_csv: Path, chunk_rows: int) -> Iterator[Tuple[ParsedSnapshot, bool]]:
+    """
+    Like iter_snapshot_chunks, with whether each batch is the last one. That is known
+    without parsing another batch: from the row count of a columnar snapshot, or one
+    reader block of lookahead (one raw chunk without pyarrow).
+    """
+    if chunk_rows <= 0:
+        raise ValueError("chunk_rows must be a positive integer")
+    logger.info("Parsing snapshot in chunks of %s rows: %s", chunk_rows, snapshot_csv)
+    if _is_columnar(snapshot_csv):
+        pa = require_pyarrow()
+        remaining = artifact_row_count(snapshot_csv)
+        for batch in iter_artifact_batches(snapshot_csv, batch_rows=chunk_rows):
+            remaining -= batch.num_rows
+            yield parse_frame(_frame_from_arrow(pa.Table.from_batches([batch])), snapshot_csv), remaining <= 0
+        return
+    if _has_pyarrow():
+        for table, last in iter_text_csv_tables(snapshot_csv, chunk_rows):
+            yield parse_frame(_frame_from_arrow(table), snapshot_csv), last
+        return
+    with pd.read_csv(snapshot_csv, chunksize=chunk_rows, dtype=snapshot_dtypes()) as reader:
+        chunk = next(reader, None)
+        while chunk is not None:
+            following = next(reader, None)
+            yield parse_frame(chunk, snapshot_csv), following is None
+            chunk = following
+
+
+def _estimated_rows(snapshot: Path, sample_rows: int) -> int:
+    if _is_columnar(snapshot):
+        return artifact_row_count(snapshot)
+    # Bytes of the header plus the sampled rows (close enough for quoted newlines).
+    with snapshot.open("rb") as f:
+        sample_bytes = sum(len(line) for line in islice(f, sample_rows + 1))
+    return int(snapshot.stat().st_size / max(sample_bytes, 1) * sample_rows)
+
+
+def max_snapshot_rows(snapshot: Path) -> int:
+    """
+    An upper bound on the rows of `snapshot` that needs no full read: exact for a
+    columnar snapshot; for a CSV, every record takes at least one byte per column
+    (separators plus the line break). Sampled record sizes would give a tighter
+    figure, but only an estimate: later records may be shorter.
+    """
+    if _is_columnar(snapshot):
+        return artifact_row_count(snapshot)
+    return snapshot.stat().st_size // max(len(snapshot_columns(snapshot)) - 1, 1)
+
+
+def chunk_rows_for_budget(snapshot: Path, budget_bytes: int) -> Optional[int]:
+    """
+    Rows per batch that keep validating and transforming `snapshot` within about
+    `budget_bytes`, estimated from a parsed sample; None when the whole file fits.
+
+    Batches share the budget with what chunked validation keeps for the whole file
+    (a hash of every distinct transaction_id); if that alone exceeds the budget, batches get
+    `MIN_CHUNK_ROWS` rows.
+    """
+    sample = next(iter_snapshot_chunks(snapshot, _SAMPLE_ROWS), None)
+    if sample is None or len(sample) < _SAMPLE_ROWS:
+        return None
+    row_bytes = sample.memory_bytes() / len(sample) * _WORKING_SET_FACTOR
+    rows = _estimated_rows(snapshot, len(sample))
+    if rows * row_bytes <= budget_bytes:
+        return None
+
+    batch_budget = budget_bytes - rows * _TRACKED_ID_BYTES
+    chunk_rows = max(MIN_CHUNK_ROWS, int(batch_budget // row_bytes))
+    if batch_budget < MIN_CHUNK_ROWS * row_bytes:
+        logger.warning(
+            "Memory budget %.0f MB is too small for ~%s rows; using the minimum batch of %s rows",
+            budget_bytes / (1 << 20),
+            rows,
+            chunk_rows,
+        )
+    else:
+        logger.info(
+            "Memory budget %.0f MB: ~%s rows at ~%.0f bytes/row working set; batches of %s rows",
+            budget_bytes / (1 << 20),
+            rows,
+            row_bytes,
+            chunk_rows,
+        )
+    return chunk_rows
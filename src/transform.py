@@ -1,13 +1,20 @@
 from __future__ import annotations
 
 import logging
+import tempfile
 from datetime import timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
 
 import pandas as pd
 
-from .validate import ACCEPTED_CURRENCIES, normalize_is_refund
+from .artifacts import ArrowArtifactWriter, artifact_format, artifact_suffix, staging_arrow_schema
+from .external_sort import DEFAULT_BLOCK_ROWS, merge_plan, merge_runs, read_run, write_run
+from .snapshot import ParsedSnapshot, iter_snapshot_chunks, map_unique, parse_snapshot, snapshot_columns
+from .validate import ACCEPTED_CURRENCIES
+
+if TYPE_CHECKING:
+    from .engine import Engine
 
 
 logger = logging.getLogger(__name__)
@@ -79,34 +86,34 @@ def map_category(raw: Any) -> str:
     return _CATEGORY_MAP.get(key, s.title() if s.title() in CANONICAL_CATEGORIES else "Other")
 
 
-def _parse_datetime_utc(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, errors="coerce", utc=True, format="mixed")
+def map_category_series(series: pd.Series) -> pd.Series:
+    """Vectorized `map_category`: each distinct raw category is mapped once."""
+    return map_unique(series, map_category)
 
 
-def _parse_date(series: pd.Series) -> pd.Series:
-    return pd.to_datetime(series, errors="coerce", format="mixed").dt.date
+_DEDUPE_KEYS = ["transaction_id", "posting_date", "transaction_ts"]
 
 
-def transform_snapshot(snapshot_csv: Path, processed_dir: Path, run_ts: str) -> Path:
-    logger.info("Transforming snapshot: %s", snapshot_csv)
-    df = pd.read_csv(snapshot_csv)
+def _clean(parsed: ParsedSnapshot) -> Tuple[pd.DataFrame, int]:
+    """Apply cleaning rules and the staging-safe filter; returns the frame and rows dropped."""
+    # Shallow copy: replacing columns below must not touch the shared parsed snapshot.
+    df = parsed.raw.copy(deep=False)
 
-    df["currency"] = df["currency"].astype(str).str.upper()
-    df["status"] = df["status"].astype(str).str.upper()
+    df["currency"] = parsed.currency
+    df["status"] = parsed.status
 
-    df["is_refund"] = df["is_refund"].map(normalize_is_refund)
-    df["amount"] = pd.to_numeric(df["amount"], errors="coerce").round(2)
+    df["is_refund"] = parsed.is_refund
+    df["amount"] = parsed.amount.round(2)
 
-    # Parse timestamps/dates
-    ts = _parse_datetime_utc(df["transaction_ts"])
-    df["transaction_ts"] = ts.dt.tz_convert(timezone.utc)
+    # Parsed timestamps/dates
+    df["transaction_ts"] = parsed.transaction_ts.dt.tz_convert(timezone.utc)
 
-    posting_date = _parse_date(df["posting_date"])
+    posting_date = parsed.posting_date
     # If posting_date is missing/unparseable (allowed in small %), fall back to the transaction date.
-    fallback_posting = pd.to_datetime(df["transaction_ts"], errors="coerce", utc=True).dt.date
+    fallback_posting = df["transaction_ts"].dt.date
     df["posting_date"] = posting_date.where(~pd.isna(posting_date), fallback_posting)
 
-    df["category"] = df["category"].map(map_category)
+    df["category"] = map_category_series(df["category"])
 
     # Drop rows that would violate the typed staging table / dbt tests.
     before = len(df)
@@ -118,25 +125,211 @@ def transform_snapshot(snapshot_csv: Path, processed_dir: Path, run_ts: str) ->
     df = df[df["is_refund"].isin([True, False])]
     df = df[df["amount"].notna()]
     dropped = before - len(df)
-    if dropped:
-        logger.warning("Dropped %s rows during cleaning (staging-safe filter).", dropped)
 
     # Enforce sign convention (defensive; validate already checks this).
     df.loc[df["is_refund"] == False, "amount"] = df.loc[df["is_refund"] == False, "amount"].abs()  # noqa: E712
     df.loc[df["is_refund"] == True, "amount"] = -df.loc[df["is_refund"] == True, "amount"].abs()  # noqa: E712
+    return df, dropped
+
 
-    # Dedupe by keeping the latest posting_date (then latest transaction_ts as tie-break)
-    df = df.sort_values(["transaction_id", "posting_date", "transaction_ts"], ascending=[True, True, True])
-    df = df.drop_duplicates(subset=["transaction_id"], keep="last").reset_index(drop=True)
+def _dedupe_latest(df: pd.DataFrame) -> pd.DataFrame:
+    # Dedupe by keeping the latest posting_date (then latest transaction_ts as tie-break).
+    # A multi-key sort is stable, so exact ties keep input order and the last one wins.
+    df = df.sort_values(_DEDUPE_KEYS, ascending=[True, True, True])
+    return df.drop_duplicates(subset=["transaction_id"], keep="last").reset_index(drop=True)
 
+
+def _clean_latest(parsed: ParsedSnapshot, engine: Optional["Engine"]) -> Tuple[pd.DataFrame, int]:
+    """Cleaned and deduped frame and the rows dropped, by `engine` (default: pandas)."""
+    if engine is not None:
+        return engine.clean(parsed)
+    df, dropped = _clean(parsed)
+    return _dedupe_latest(df), dropped
+
+
+def _format_for_csv(df: pd.DataFrame) -> pd.DataFrame:
     # Standardize formats for CSV output
     df["transaction_ts"] = pd.to_datetime(df["transaction_ts"], utc=True).dt.strftime("%Y-%m-%dT%H:%M:%SZ")
     df["posting_date"] = pd.to_datetime(df["posting_date"], errors="coerce").dt.strftime("%Y-%m-%d")
+    return df
+
+
+def _log_dropped(dropped: int) -> None:
+    if dropped:
+        logger.warning("Dropped %s rows during cleaning (staging-safe filter).", dropped)
+
+
+class _CleanOutput:
+    """Write typed clean frames as formatted CSV or as a typed columnar artifact."""
+
+    def __init__(self, path: Path, columns: List[str]) -> None:
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self._arrow: Optional[ArrowArtifactWriter] = None
+        if artifact_format(path) != "csv":
+            self._arrow = ArrowArtifactWriter(path, staging_arrow_schema())
+        else:
+            pd.DataFrame(columns=columns).to_csv(path, index=False)
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._arrow is not None:
+            self._arrow.write_frame(df)
+        else:
+            _format_for_csv(df).to_csv(self.path, mode="a", header=False, index=False)
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self._arrow is not None:
+            self._arrow.close()
+
+
+def clean_snapshot(
+    snapshot_csv: Path, *, parsed: Optional[ParsedSnapshot] = None, engine: Optional["Engine"] = None
+) -> pd.DataFrame:
+    """
+    Return the clean, deduped frame in memory, with typed columns (UTC timestamps,
+    dates, floats, booleans) rather than CSV-formatted strings.
 
+    This is what `transform_snapshot` writes; `load.copy_clean` can load it directly.
+    """
+    if parsed is None:
+        parsed = parse_snapshot(snapshot_csv)
+    df, dropped = _clean_latest(parsed, engine)
+    _log_dropped(dropped)
+    return df
+
+
+def transform_snapshot(
+    snapshot_csv: Path,
+    processed_dir: Path,
+    run_ts: str,
+    *,
+    parsed: Optional[ParsedSnapshot] = None,
+    chunk_rows: Optional[int] = None,
+    output_format: str = "csv",
+    engine: Optional["Engine"] = None,
+) -> Path:
+    """
+    Clean, standardize and dedupe a snapshot into `clean_transactions_{run_ts}.<ext>`.
+
+    With `chunk_rows` set (and no pre-parsed snapshot), the snapshot is cleaned in
+    batches of at most that many rows and deduplicated with an external merge sort,
+    so memory stays bounded regardless of file size. The output is identical.
+
+    `output_format` is "csv" (formatted text) or "parquet"/"arrow" (typed and
+    compressed, with the schema of `staging.financial_transactions`). `engine` applies
+    the cleaning rules (default: the pandas reference); every engine writes the same output.
+    """
+    logger.info("Transforming snapshot: %s", snapshot_csv)
     processed_dir.mkdir(parents=True, exist_ok=True)
-    out_path = processed_dir / f"clean_transactions_{run_ts}.csv"
-    df.to_csv(out_path, index=False)
+    out_path = processed_dir / f"clean_transactions_{run_ts}{artifact_suffix(output_format)}"
+
+    if parsed is None and chunk_rows is not None:
+        rows = _transform_out_of_core(snapshot_csv, processed_dir, out_path, chunk_rows=chunk_rows, engine=engine)
+        logger.info("Wrote clean output: %s (rows=%s)", out_path, rows)
+        return out_path
+
+    df = clean_snapshot(snapshot_csv, parsed=parsed, engine=engine)
+
+    out = _CleanOutput(out_path, list(df.columns))
+    try:
+        out.write(df)
+    finally:
+        out.close()
     logger.info("Wrote clean output: %s (rows=%s)", out_path, len(df))
     return out_path
 
 
+def spill_clean_run(
+    parsed: ParsedSnapshot,
+    run_path: Path,
+    *,
+    block_rows: int = DEFAULT_BLOCK_ROWS,
+    engine: Optional["Engine"] = None,
+) -> Tuple[List[str], int, int]:
+    """
+    Clean and locally dedupe one parsed slice and spill it to `run_path` as a sorted
+    run (nothing is written when no row survives); returns (columns, rows, dropped).
+    """
+    df, dropped = _clean_latest(parsed, engine)
+    if len(df):
+        # A slice whose posting dates all fell back holds datetime.date objects, which
+        # do not compare with the Timestamps of other runs in the merge.
+        df["posting_date"] = pd.to_datetime(df["posting_date"])
+        write_run(df, run_path, block_rows=block_rows)
+    return list(df.columns), len(df), dropped
+
+
+def _keep_last_per_id(frames: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """The last row per transaction_id of a sorted stream of frames (an id may span frames)."""
+    carry: Optional[pd.DataFrame] = None
+    for frame in frames:
+        if carry is not None:
+            frame = pd.concat([carry, frame], ignore_index=True)
+        ids = frame["transaction_id"]
+        last = (ids != ids.shift(-1)).to_numpy(dtype=bool)
+        # The final row is held back: the next frame may continue its id.
+        last[-1] = False
+        carry = frame.iloc[-1:]
+        yield frame[last]
+    if carry is not None:
+        yield carry
+
+
+def merge_clean_runs(
+    run_paths: Sequence[Path], columns: List[str], out_path: Path, *, chunk_rows: Optional[int] = None
+) -> int:
+    """
+    Dedupe sorted runs (given in input order) into one clean output; returns its rows.
+
+    Without `chunk_rows` the runs are concatenated and deduped in memory; with it they
+    are merged within about `chunk_rows` buffered rows (the runs are consumed), writing
+    batches of at most `chunk_rows` rows. Either way exact key ties resolve to the
+    later input row, as in the single-frame transform.
+    """
+    out = _CleanOutput(out_path, columns)
+    try:
+        if chunk_rows is None:
+            frames = [read_run(p) for p in run_paths]
+            if frames:
+                out.write(_dedupe_latest(pd.concat(frames, ignore_index=True)))
+            return out.rows
+
+        merged = merge_runs(run_paths, _DEDUPE_KEYS, budget_rows=chunk_rows)
+        for batch in _keep_last_per_id(merged):
+            out.write(batch.reset_index(drop=True))
+    finally:
+        out.close()
+    return out.rows
+
+
+def _transform_out_of_core(
+    snapshot_csv: Path, processed_dir: Path, out_path: Path, *, chunk_rows: int, engine: Optional["Engine"] = None
+) -> int:
+    """
+    Clean chunk by chunk, spill each chunk as a sorted (and locally deduped) run, then
+    k-way merge the runs keeping the last row per transaction_id.
+
+    Runs are written in input order and the merge is stable, so exact key ties resolve
+    to the later input row exactly as the in-memory sort does.
+    """
+    columns: Optional[List[str]] = None
+    dropped = 0
+    with tempfile.TemporaryDirectory(prefix="transform_spill_", dir=processed_dir) as spill_dir:
+        run_paths: List[Path] = []
+        for parsed in iter_snapshot_chunks(snapshot_csv, chunk_rows):
+            run_path = Path(spill_dir) / f"run_{len(run_paths):06d}.pkl"
+            columns, rows, chunk_dropped = spill_clean_run(
+                parsed, run_path, block_rows=merge_plan(chunk_rows)[1], engine=engine
+            )
+            dropped += chunk_dropped
+            if rows:
+                run_paths.append(run_path)
+        _log_dropped(dropped)
+
+        if columns is None:
+            # Header-only input: mirror the in-memory path.
+            columns = snapshot_columns(snapshot_csv)
+        logger.info("Merging %s sorted runs from %s", len(run_paths), spill_dir)
+        return merge_clean_runs(run_paths, columns, out_path, chunk_rows=chunk_rows)
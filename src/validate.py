@@ -2,42 +2,57 @@ from __future__ import annotations
 
 import json
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
+from .snapshot import (  # noqa: F401
+    ParsedSnapshot,
+    iter_snapshot_chunks,
+    iter_snapshot_chunks_to_end,
+    max_snapshot_rows,
+    normalize_is_refund,
+    parse_snapshot,
+)
+
+if TYPE_CHECKING:
+    from .engine import Engine
+
 
 logger = logging.getLogger(__name__)
 
 ACCEPTED_CURRENCIES = {"SEK", "EUR", "USD", "GBP", "NOK", "DKK"}
 ACCEPTED_STATUSES = {"BOOKED", "PENDING", "FAILED"}
 
+# Zero-tolerance checks: counter -> failed check name.
+_HARD_CHECKS = {
+    "missing_transaction_id": "transaction_id_not_null",
+    "missing_account_id": "account_id_not_null",
+    "invalid_is_refund": "is_refund_normalizable",
+    "invalid_amount": "amount_parseable",
+    "refund_sign_mismatch": "amount_sign_matches_is_refund",
+    "invalid_status": "status_accepted_values",
+}
+# Share-of-rows checks: counter -> (failed check name, ValidationThresholds field).
+_THRESHOLD_CHECKS = {
+    "invalid_currency": ("invalid_currency_threshold_exceeded", "invalid_currency_pct_max"),
+    "unparseable_any_date": ("unparseable_dates_threshold_exceeded", "unparseable_dates_pct_max"),
+    "duplicate_transaction_id": ("duplicate_transaction_id_threshold_exceeded", "duplicate_transaction_id_pct_max"),
+}
+
+# Rows per batch when fail-fast validation streams a file that is otherwise read whole.
+FAIL_FAST_CHUNK_ROWS = 100_000
+# Offending row offsets a fail-fast report keeps per failed check.
+FIRST_FAILING_ROWS = 10
+
 
 class ValidationError(RuntimeError):
     pass
 
 
-def normalize_is_refund(value: Any) -> Optional[bool]:
-    if value is None:
-        return None
-    if isinstance(value, bool):
-        return value
-    s = str(value).strip().lower()
-    mapping = {
-        "1": True,
-        "0": False,
-        "true": True,
-        "false": False,
-        "t": True,
-        "f": False,
-        "yes": True,
-        "no": False,
-    }
-    return mapping.get(s)
-
-
 @dataclass(frozen=True)
 class ValidationThresholds:
     invalid_currency_pct_max: float = 0.01
@@ -50,116 +65,297 @@ def _pct(n: int, d: int) -> float:
 
 
 def _missing_required_str(series: pd.Series) -> int:
-    s = series.astype("string")
+    # Arrow-backed strings already are strings; converting them would copy every value.
+    s = series if isinstance(series.dtype, pd.StringDtype) else series.astype("string")
     return int(s.isna().sum() + (s.str.strip() == "").sum())
 
 
-def _parse_datetime_utc(series: pd.Series) -> pd.Series:
-    # Accept multiple common formats; coerce failures to NaT.
-    return pd.to_datetime(series, errors="coerce", utc=True, format="mixed")
+def _mask(values: pd.Series) -> np.ndarray:
+    return values.fillna(False).to_numpy(dtype=bool)
 
 
-def _parse_date(series: pd.Series) -> pd.Series:
-    # Parse into date (no time component). Supports mixed formats, coerces failures.
-    return pd.to_datetime(series, errors="coerce", format="mixed").dt.date
+@dataclass(frozen=True)
+class CheckCounters:
+    """
+    Per-check failure counts for a slice of the input.
+
+    Counters from consecutive chunks merge by summation, so a file can be validated
+    batch by batch and still produce the same report as a whole-file pass.
+    """
+
+    row_count: int = 0
+    missing_transaction_id: int = 0
+    missing_account_id: int = 0
+    unparseable_transaction_ts: int = 0
+    unparseable_posting_date: int = 0
+    unparseable_any_date: int = 0
+    invalid_currency: int = 0
+    invalid_status: int = 0
+    invalid_is_refund: int = 0
+    invalid_amount: int = 0
+    refund_sign_mismatch: int = 0
+    duplicate_transaction_id: int = 0
+
+    def merge(self, other: "CheckCounters") -> "CheckCounters":
+        return CheckCounters(**{f.name: getattr(self, f.name) + getattr(other, f.name) for f in fields(self)})
+
+
+def id_hashes(ids: pd.Series) -> np.ndarray:
+    """64-bit hashes of `ids`, one per row; missing ids hash alike, so they count as one value."""
+    return pd.util.hash_pandas_object(ids.astype(object), index=False).to_numpy()
+
+
+class DuplicateTracker:
+    """
+    Counts repeated transaction_ids across chunks, matching `Series.duplicated()` on
+    the whole column (missing ids compare equal to each other).
+
+    Holds a 64-bit hash (8 bytes) per distinct transaction_id seen so far, in sorted
+    runs looked up by binary search. A run is merged into the one before it once it
+    is at least half that size, so there are O(log n) runs. Two distinct ids share a
+    hash with probability about n²/2⁶⁵ (under 1e-3 for 100M ids), and then count as
+    one duplicate.
+    """
+
+    def __init__(self) -> None:
+        self._runs: List[np.ndarray] = []
+
+    def count(self, ids: pd.Series) -> int:
+        return int(self.flag(ids).sum())
+
+    def flag(self, ids: pd.Series) -> np.ndarray:
+        """Record `ids`; returns which rows repeat an id of this chunk or of an earlier one."""
+        hashes, firsts = np.unique(id_hashes(ids), return_index=True)
+        seen = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            pos = np.minimum(np.searchsorted(run, hashes), len(run) - 1)
+            seen |= run[pos] == hashes
+        repeats = np.ones(len(ids), dtype=bool)
+        repeats[firsts] = seen
+        self._add(hashes[~seen])
+        return repeats
+
+    def hashes(self) -> np.ndarray:
+        """The sorted hashes of every distinct id seen so far."""
+        return np.sort(np.concatenate(self._runs)) if self._runs else np.empty(0, dtype=np.uint64)
+
+    def _add(self, run: np.ndarray) -> None:
+        if not len(run):
+            return
+        self._runs.append(run)
+        # Runs hold disjoint hashes, so merging two is a concatenate and sort.
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind="stable")
+
+
+def count_checks(parsed: ParsedSnapshot) -> CheckCounters:
+    """Row-local checks for one parsed slice (duplicates are counted separately)."""
+    df = parsed.raw
+
+    transaction_ts_parsed = parsed.transaction_ts
+    posting_date_parsed = parsed.posting_date
+
+    is_refund_norm = parsed.is_refund
+    amount = parsed.amount
+
+    return CheckCounters(
+        row_count=int(len(df)),
+        # Critical not-null checks
+        missing_transaction_id=_missing_required_str(df["transaction_id"]),
+        missing_account_id=_missing_required_str(df["account_id"]),
+        # Parseability checks
+        unparseable_transaction_ts=int(transaction_ts_parsed.isna().sum()),
+        unparseable_posting_date=int(pd.isna(posting_date_parsed).sum()),
+        unparseable_any_date=int(((transaction_ts_parsed.isna()) | (pd.isna(posting_date_parsed))).sum()),
+        # Accepted values checks
+        invalid_currency=int((~parsed.currency.isin(ACCEPTED_CURRENCIES)).sum()),
+        invalid_status=int((~parsed.status.isin(ACCEPTED_STATUSES)).sum()),
+        invalid_is_refund=int(is_refund_norm.isna().sum()),
+        invalid_amount=int(amount.isna().sum()),
+        refund_sign_mismatch=int(
+            (
+                ((is_refund_norm == False) & (amount <= 0))  # noqa: E712
+                | ((is_refund_norm == True) & (amount >= 0))  # noqa: E712
+            ).sum()
+        ),
+    )
 
 
-def validate_transactions(
-    csv_path: Path,
+def check_masks(parsed: ParsedSnapshot) -> Dict[str, np.ndarray]:
+    """Per-row failure masks of the checks that decide a report (duplicates excepted), by counter."""
+    df = parsed.raw
+    is_refund, amount = parsed.is_refund, parsed.amount
+    missing = {}
+    for name in ("transaction_id", "account_id"):
+        s = df[name] if isinstance(df[name].dtype, pd.StringDtype) else df[name].astype("string")
+        missing[name] = _mask(s.isna() | (s.str.strip() == ""))
+    return {
+        "missing_transaction_id": missing["transaction_id"],
+        "missing_account_id": missing["account_id"],
+        "unparseable_any_date": _mask(parsed.transaction_ts.isna() | pd.isna(parsed.posting_date)),
+        "invalid_currency": _mask(~parsed.currency.isin(ACCEPTED_CURRENCIES)),
+        "invalid_status": _mask(~parsed.status.isin(ACCEPTED_STATUSES)),
+        "invalid_is_refund": _mask(is_refund.isna()),
+        "invalid_amount": _mask(amount.isna()),
+        "refund_sign_mismatch": _mask(
+            ((is_refund == False) & (amount <= 0)) | ((is_refund == True) & (amount >= 0))  # noqa: E712
+        ),
+    }
+
+
+def build_report(
+    file: Path,
+    counters: CheckCounters,
     *,
     thresholds: ValidationThresholds = ValidationThresholds(),
 ) -> Dict[str, Any]:
-    df = pd.read_csv(csv_path)
-    row_count = int(len(df))
-
-    # Critical not-null checks
-    missing_transaction_id = _missing_required_str(df["transaction_id"])
-    missing_account_id = _missing_required_str(df["account_id"])
-
-    # Parseability checks
-    transaction_ts_parsed = _parse_datetime_utc(df["transaction_ts"])
-    unparseable_ts = int(transaction_ts_parsed.isna().sum())
-    posting_date_parsed = _parse_date(df["posting_date"])
-    unparseable_posting_date = int(pd.isna(posting_date_parsed).sum())
-    unparseable_any_date = int(((transaction_ts_parsed.isna()) | (pd.isna(posting_date_parsed))).sum())
-
-    # Accepted values checks
-    currency_norm = df["currency"].astype(str).str.upper()
-    invalid_currency = int((~currency_norm.isin(ACCEPTED_CURRENCIES)).sum())
-
-    status_norm = df["status"].astype(str).str.upper()
-    invalid_status = int((~status_norm.isin(ACCEPTED_STATUSES)).sum())
-
-    is_refund_norm = df["is_refund"].map(normalize_is_refund)
-    invalid_is_refund = int(is_refund_norm.isna().sum())
-
-    amount = pd.to_numeric(df["amount"], errors="coerce")
-    invalid_amount = int(amount.isna().sum())
-
-    refund_sign_mismatch = int(
-        (
-            ((is_refund_norm == False) & (amount <= 0))  # noqa: E712
-            | ((is_refund_norm == True) & (amount >= 0))  # noqa: E712
-        ).sum()
-    )
-
-    duplicate_transaction_id = int(df["transaction_id"].duplicated().sum())
+    row_count = counters.row_count
+    checks = {f.name: getattr(counters, f.name) for f in fields(counters) if f.name != "row_count"}
 
     report: Dict[str, Any] = {
-        "file": str(csv_path),
+        "file": str(file),
         "row_count": row_count,
-        "checks": {
-            "missing_transaction_id": missing_transaction_id,
-            "missing_account_id": missing_account_id,
-            "unparseable_transaction_ts": unparseable_ts,
-            "unparseable_posting_date": unparseable_posting_date,
-            "unparseable_any_date": unparseable_any_date,
-            "invalid_currency": invalid_currency,
-            "invalid_status": invalid_status,
-            "invalid_is_refund": invalid_is_refund,
-            "invalid_amount": invalid_amount,
-            "refund_sign_mismatch": refund_sign_mismatch,
-            "duplicate_transaction_id": duplicate_transaction_id,
-        },
+        "checks": checks,
         "thresholds": {
             "invalid_currency_pct_max": thresholds.invalid_currency_pct_max,
             "unparseable_dates_pct_max": thresholds.unparseable_dates_pct_max,
             "duplicate_transaction_id_pct_max": thresholds.duplicate_transaction_id_pct_max,
         },
         "pct": {
-            "invalid_currency": _pct(invalid_currency, row_count),
-            "unparseable_any_date": _pct(unparseable_any_date, row_count),
-            "duplicate_transaction_id": _pct(duplicate_transaction_id, row_count),
+            "invalid_currency": _pct(counters.invalid_currency, row_count),
+            "unparseable_any_date": _pct(counters.unparseable_any_date, row_count),
+            "duplicate_transaction_id": _pct(counters.duplicate_transaction_id, row_count),
         },
     }
 
-    failures: list[str] = []
-    if missing_transaction_id > 0:
-        failures.append("transaction_id_not_null")
-    if missing_account_id > 0:
-        failures.append("account_id_not_null")
-    if invalid_is_refund > 0:
-        failures.append("is_refund_normalizable")
-    if invalid_amount > 0:
-        failures.append("amount_parseable")
-    if refund_sign_mismatch > 0:
-        failures.append("amount_sign_matches_is_refund")
-    if invalid_status > 0:
-        failures.append("status_accepted_values")
+    failures = [name for counter, name in _HARD_CHECKS.items() if getattr(counters, counter) > 0]
 
     # Threshold-based failures
-    if _pct(invalid_currency, row_count) > thresholds.invalid_currency_pct_max:
-        failures.append("invalid_currency_threshold_exceeded")
-    if _pct(unparseable_any_date, row_count) > thresholds.unparseable_dates_pct_max:
-        failures.append("unparseable_dates_threshold_exceeded")
-    if _pct(duplicate_transaction_id, row_count) > thresholds.duplicate_transaction_id_pct_max:
-        failures.append("duplicate_transaction_id_threshold_exceeded")
+    for counter, (name, limit) in _THRESHOLD_CHECKS.items():
+        if _pct(getattr(counters, counter), row_count) > getattr(thresholds, limit):
+            failures.append(name)
 
     report["failed_checks"] = failures
     report["passed"] = len(failures) == 0
     return report
 
 
+def validate_transactions(
+    csv_path: Path,
+    *,
+    thresholds: ValidationThresholds = ValidationThresholds(),
+    chunk_rows: Optional[int] = None,
+    engine: Optional["Engine"] = None,
+    fail_fast: bool = False,
+) -> Dict[str, Any]:
+    """
+    Validate a snapshot file.
+
+    With `chunk_rows` set, the file is read in batches of at most that many rows and
+    per-batch counters are merged; the report is identical to the whole-file pass.
+    `engine` runs the row-local checks (default: the pandas reference).
+
+    `fail_fast` always streams the file (see `_validate_fail_fast`) and may stop early
+    with a partial report.
+    """
+    if fail_fast:
+        return _validate_fail_fast(
+            csv_path, thresholds=thresholds, chunk_rows=chunk_rows or FAIL_FAST_CHUNK_ROWS, engine=engine
+        )
+    if chunk_rows is None:
+        return validate_parsed(parse_snapshot(csv_path), thresholds=thresholds, engine=engine)
+
+    checks = count_checks if engine is None else engine.count_checks
+    counters = CheckCounters()
+    duplicates = DuplicateTracker()
+    for parsed in iter_snapshot_chunks(csv_path, chunk_rows):
+        counters = counters.merge(checks(parsed))
+        counters = counters.merge(CheckCounters(duplicate_transaction_id=duplicates.count(parsed.raw["transaction_id"])))
+    return build_report(csv_path, counters, thresholds=thresholds)
+
+
+def _certain_failures(counters: CheckCounters, max_rows: int, thresholds: ValidationThresholds) -> List[str]:
+    """Checks the whole file fails whatever its remaining rows hold (at most `max_rows` rows in all)."""
+    failures = [name for counter, name in _HARD_CHECKS.items() if getattr(counters, counter) > 0]
+    for counter, (name, limit) in _THRESHOLD_CHECKS.items():
+        # Counts only grow, so the final share is at least count / max_rows.
+        if getattr(counters, counter) > getattr(thresholds, limit) * max_rows:
+            failures.append(name)
+    return failures
+
+
+def _validate_fail_fast(
+    csv_path: Path,
+    *,
+    thresholds: ValidationThresholds,
+    chunk_rows: int,
+    engine: Optional["Engine"],
+) -> Dict[str, Any]:
+    """
+    Validate batch by batch and stop after the first batch that makes the report fail
+    for certain: a zero-tolerance check failed, or a threshold is exceeded even if
+    every remaining row (bounded by `max_snapshot_rows`) passes.
+
+    The report covers the rows read so far and adds "partial" (True when rows were left unread)
+    and "first_failing_rows": per failed check, the 0-based offsets (data rows, header
+    excluded) of its first offending rows.
+    """
+    checks = count_checks if engine is None else engine.count_checks
+    max_rows = max_snapshot_rows(csv_path)
+    counters = CheckCounters()
+    duplicates = DuplicateTracker()
+    first_rows: Dict[str, List[int]] = {c: [] for c in [*_HARD_CHECKS, *_THRESHOLD_CHECKS]}
+    failures: List[str] = []
+    partial = False
+    for parsed, last in iter_snapshot_chunks_to_end(csv_path, chunk_rows):
+        offset = counters.row_count
+        ids = parsed.raw["transaction_id"]
+        chunk = checks(parsed)
+        # Offsets are only looked up while a failing check still has room for more.
+        wanted = [c for c, rows in first_rows.items() if len(rows) < FIRST_FAILING_ROWS]
+        masks: Dict[str, np.ndarray] = {}
+        if any(getattr(chunk, c) for c in wanted if c != "duplicate_transaction_id"):
+            masks = check_masks(parsed)
+        masks["duplicate_transaction_id"] = duplicates.flag(ids)
+        for counter in wanted:
+            if counter in masks:
+                found = np.flatnonzero(masks[counter])[: FIRST_FAILING_ROWS - len(first_rows[counter])]
+                first_rows[counter].extend(int(offset + i) for i in found)
+
+        repeats = int(masks["duplicate_transaction_id"].sum())
+        counters = counters.merge(chunk).merge(CheckCounters(duplicate_transaction_id=repeats))
+        failures = _certain_failures(counters, max(max_rows, counters.row_count), thresholds)
+        if failures:
+            partial = not last
+            logger.error("Validation stopped after %s rows: %s", counters.row_count, ", ".join(failures))
+            break
+
+    report = build_report(csv_path, counters, thresholds=thresholds)
+    report["partial"] = partial
+    if failures:
+        # Shares over the rows read so far do not decide anything; only the certain failures do.
+        report["failed_checks"] = failures
+        report["passed"] = False
+    names = {name: c for c, name in _HARD_CHECKS.items()}
+    names.update({name: c for c, (name, _) in _THRESHOLD_CHECKS.items()})
+    report["first_failing_rows"] = {name: first_rows[names[name]] for name in report["failed_checks"]}
+    return report
+
+
+def validate_parsed(
+    parsed: ParsedSnapshot,
+    *,
+    thresholds: ValidationThresholds = ValidationThresholds(),
+    engine: Optional["Engine"] = None,
+) -> Dict[str, Any]:
+    checks = count_checks if engine is None else engine.count_checks
+    counters = checks(parsed).merge(
+        CheckCounters(duplicate_transaction_id=int(parsed.raw["transaction_id"].duplicated().sum()))
+    )
+    return build_report(parsed.path, counters, thresholds=thresholds)
+
+
 def write_validation_report(report: Dict[str, Any], processed_dir: Path, run_ts: str) -> Path:
     processed_dir.mkdir(parents=True, exist_ok=True)
     path = processed_dir / f"validation_report_{run_ts}.json"
@@ -168,9 +364,21 @@ def write_validation_report(report: Dict[str, Any], processed_dir: Path, run_ts:
     return path
 
 
-def validate_or_raise(csv_path: Path, processed_dir: Path, run_ts: str) -> Path:
+def validate_or_raise(
+    csv_path: Path,
+    processed_dir: Path,
+    run_ts: str,
+    *,
+    parsed: Optional[ParsedSnapshot] = None,
+    chunk_rows: Optional[int] = None,
+    engine: Optional["Engine"] = None,
+    fail_fast: bool = False,
+) -> Path:
     logger.info("Validating snapshot: %s", csv_path)
-    report = validate_transactions(csv_path)
+    if parsed is not None:
+        report = validate_parsed(parsed, engine=engine)
+    else:
+        report = validate_transactions(csv_path, chunk_rows=chunk_rows, engine=engine, fail_fast=fail_fast)
     report_path = write_validation_report(report, processed_dir, run_ts)
 
     if not report.get("passed", False):
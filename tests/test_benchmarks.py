@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from benchmarks.generate import dirt_summary, generate_transactions
+from benchmarks.run import compare, environment_differences
+from src.validate import validate_transactions
+
+
+def test_generated_data_is_dirty_but_passes_validation(tmp_path: Path) -> None:
+    path = generate_transactions(tmp_path / "t.csv", 20_000, seed=1, chunk_rows=7_000)
+    again = generate_transactions(tmp_path / "t2.csv", 20_000, seed=1, chunk_rows=7_000)
+    assert path.read_bytes() == again.read_bytes()
+
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    dirt = dirt_summary(df)
+    assert dirt["rows"] == 20_000
+    for key in ("duplicate_transaction_id", "not_a_date", "slash_timestamps", "day_first_timestamps", "invalid_currency"):
+        assert dirt[key] > 0, key
+    assert dirt["is_refund_spellings"] > 2
+    assert dirt["category_spellings"] > 10
+
+    report = validate_transactions(path)
+    assert report["passed"], report["failed_checks"]
+    assert report["checks"]["invalid_is_refund"] == 0
+    assert report["checks"]["refund_sign_mismatch"] == 0
+
+
+def _result(case: str, rows: int, seconds: float, peak_rss_mb: float) -> dict:
+    return {"case": case, "rows": rows, "seconds": seconds, "peak_rss_mb": peak_rss_mb}
+
+
+def test_compare_flags_slower_and_bigger_cases_only() -> None:
+    baseline = [
+        _result("validate", 1000, 1.0, 100.0),
+        _result("transform", 1000, 2.0, 200.0),
+        _result("load", 1000, 0.01, 100.0),
+    ]
+    results = [
+        _result("validate", 1000, 1.2, 110.0),  # within tolerance
+        _result("transform", 1000, 3.0, 300.0),  # slower and bigger
+        _result("load", 1000, 0.03, 100.0),  # 3x, but under the noise floor
+        _result("validate", 5000, 9.0, 900.0),  # not in the baseline
+    ]
+    regressions = compare(results, baseline, time_tolerance=0.25, memory_tolerance=0.2)
+    assert len(regressions) == 2
+    assert all(r.startswith("transform @ 1000 rows") for r in regressions)
+
+
+def test_baselines_from_another_environment_are_reported() -> None:
+    env = {
+        "timestamp": "2026-01-01T00:00:00Z",
+        "platform": "Linux-x",
+        "host": "bench-1",
+        "cpu_count": 8,
+        "python": "3.11.7",
+        "pandas": "2.2.3",
+        "pyarrow": "17.0.0",
+        "settings": {"PIPELINE_CHUNK_ROWS": "100000"},
+    }
+    # Timestamps and kernel builds may differ.
+    assert environment_differences({**env, "timestamp": "2026-02-01T00:00:00Z", "platform": "Linux-y"}, env) == []
+
+    other = {**env, "cpu_count": 1, "pyarrow": "26.0.0", "settings": {}}
+    differences = environment_differences(other, env)
+    assert [d.split(":")[0] for d in differences] == ["cpu_count", "pyarrow", "settings"]
+    # A baseline from before the host was recorded never matches.
+    assert environment_differences(env, {k: v for k, v in env.items() if k != "host"})[0].startswith("host")
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from src.checkpoint import RunState, find_resumable_run
+from src.extract import ExtractResult
+
+
+def _extract_result(tmp_path: Path, run_ts: str, sha: str) -> ExtractResult:
+    snapshot = tmp_path / f"raw_snapshot_{run_ts}.csv"
+    snapshot.write_text("transaction_id\nTXN1\n", encoding="utf-8")
+    return ExtractResult(run_ts=run_ts, snapshot_path=snapshot, content_sha256=sha)
+
+
+def test_run_state_round_trips_finished_stages(tmp_path: Path) -> None:
+    state = RunState.create(tmp_path, _extract_result(tmp_path, "20250101T000000Z", "abc"))
+    state.complete("validate", report="r.json")
+
+    loaded = RunState.load(state.path)
+    assert loaded.finished_stages() == ["extract", "validate"]
+    assert loaded.artifacts("validate")["report"] == "r.json"
+    assert loaded.extract_result().snapshot_path == state.extract_result().snapshot_path
+    assert not loaded.done("load_raw")
+
+
+def test_find_resumable_run_only_returns_latest_unfinished_run_of_the_input(tmp_path: Path) -> None:
+    old = RunState.create(tmp_path, _extract_result(tmp_path, "20250101T000000Z", "abc"))
+    assert find_resumable_run(tmp_path, "abc").run_ts == old.run_ts
+    assert find_resumable_run(tmp_path, "other") is None
+
+    # A newer completed run of the same input supersedes the old unfinished one.
+    RunState.create(tmp_path, _extract_result(tmp_path, "20250102T000000Z", "abc")).finish()
+    assert find_resumable_run(tmp_path, "abc") is None
+
+    unfinished = RunState.create(tmp_path, _extract_result(tmp_path, "20250103T000000Z", "def"))
+    assert find_resumable_run(tmp_path).run_ts == unfinished.run_ts
+    unfinished.extract_result().snapshot_path.unlink()
+    assert find_resumable_run(tmp_path) is None
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from src.dates import CachedDateParser, infer_formats
+
+_VALUES = [
+    "2025-01-01T10:00:00Z",
+    "2025-01-01 10:00:00",
+    "2025-03-04T10:00:00+02:00",
+    "2025/09/17 12:44",
+    "06-11-2025 11:54:56",  # month first (dateutil default)
+    "16-06-2025 06:35:35",  # only valid day first
+    "2025-13-01",
+    "not_a_date",
+    "",
+    None,
+    np.nan,
+    "2025-01-01T10:00:00Z",
+]
+
+
+def test_cached_parser_matches_mixed_format_to_datetime() -> None:
+    s = pd.Series(_VALUES, dtype=object, index=range(100, 100 + len(_VALUES)), name="transaction_ts")
+    parser = CachedDateParser(utc=True)
+    expected = pd.to_datetime(s, errors="coerce", utc=True, format="mixed")
+    pd.testing.assert_series_equal(parser.parse(s), expected)
+    # Second call is served from the cache and must give the same answer.
+    pd.testing.assert_series_equal(parser.parse(s), expected)
+
+
+def test_cached_date_parser_matches_naive_dates() -> None:
+    s = pd.Series(["2025-01-02", "01/02/2025", "13/02/2025", "2025-02-30", None, "2025-01-02"], dtype=object)
+    expected = pd.to_datetime(s, errors="coerce", format="mixed")
+    pd.testing.assert_series_equal(CachedDateParser(utc=False).parse(s), expected)
+
+
+def test_day_first_formats_come_after_their_month_first_twin() -> None:
+    formats = infer_formats(np.array(["16-06-2025 06:35:35", "2025-01-01"], dtype=object))
+    assert formats.index("%m-%d-%Y %H:%M:%S") < formats.index("%d-%m-%Y %H:%M:%S")
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from src.config import PostgresConfig
+from src.db import PROBE_MAX_WAIT, ConnectionPool, _backoff_delay, connect_with_retries
+
+
+def test_backoff_delay_grows_and_is_capped() -> None:
+    for attempt in range(1, 12):
+        delay = _backoff_delay(attempt, base_delay=0.25, max_delay=4.0)
+        assert 0 <= delay <= min(4.0, 0.25 * 2 ** (attempt - 1))
+
+
+def test_connect_gives_up_after_max_wait() -> None:
+    # Nothing listens on port 1, so every attempt is refused immediately.
+    cfg = PostgresConfig(
+        host="127.0.0.1", port=1, dbname="x", user="x", password="x", connect_timeout=1, connect_max_wait=1
+    )
+    with pytest.raises(RuntimeError, match="after .* attempts"):
+        connect_with_retries(cfg)
+
+
+def test_probe_fails_fast_instead_of_waiting_for_the_pool() -> None:
+    cfg = PostgresConfig(host="127.0.0.1", port=1, dbname="x", user="x", password="x", connect_max_wait=60)
+    pool = ConnectionPool(cfg, max_size=2)
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="Could not connect"):
+        pool.probe()
+    assert time.monotonic() - started < PROBE_MAX_WAIT + 2 < cfg.connect_max_wait
+    pool.closeall()
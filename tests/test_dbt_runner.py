@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List
+
+from src.dbt_runner import DbtProject, _packages_sha256
+
+
+def test_deps_runs_only_when_the_package_spec_changes(tmp_path: Path, monkeypatch) -> None:
+    (tmp_path / "packages.yml").write_text("packages: []\n")
+    project = DbtProject(tmp_path, tmp_path)
+    calls: List[List[str]] = []
+    monkeypatch.setattr(project, "_invoke", lambda args: calls.append(args))
+
+    project.deps()
+    project.deps()
+    assert calls == [["deps"]]
+
+    before = _packages_sha256(tmp_path)
+    (tmp_path / "package-lock.yml").write_text("sha1_hash: abc\n")
+    assert _packages_sha256(tmp_path) != before
+    project.deps()
+    assert calls == [["deps"], ["deps"]]
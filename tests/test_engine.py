@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+import pytest
+
+from benchmarks.generate import generate_transactions
+from src.engine import ArrowEngine, Engine, get_engine
+from src.snapshot import parse_snapshot
+from src.transform import transform_snapshot
+from src.validate import validate_transactions
+
+
+def _row(transaction_id: str, **overrides: str) -> dict:
+    row = {
+        "transaction_id": transaction_id,
+        "account_id": "ACC1",
+        "transaction_ts": "2025-01-01 10:00:00",
+        "posting_date": "2025-01-01",
+        "currency": "SEK",
+        "amount": "10.005",
+        "merchant_id": "M1",
+        "merchant_name": "Shop",
+        "category": "grocery",
+        "country": "SE",
+        "city": "Stockholm",
+        "payment_method": "CARD",
+        "status": "BOOKED",
+        "is_refund": "false",
+        "reference": "",
+    }
+    row.update(overrides)
+    return row
+
+
+def test_engines_agree_on_edge_cases(tmp_path: Path) -> None:
+    rows = [
+        _row("T1"),
+        _row("T1", posting_date="2025-01-03", amount="-7.5"),
+        _row("T1", posting_date="2025-01-03", amount="8.25", category=""),
+        _row("  "),
+        _row("T2", account_id=" "),
+        _row("T3", posting_date="not a date", category="RESTAURANT"),
+        _row("T4", transaction_ts="garbage"),
+        _row("T5", currency="xxx"),
+        _row("T6", status="lost", is_refund="yes", amount="-3"),
+        _row("T7", is_refund="maybe"),
+        _row("T8", amount="abc"),
+        _row("T9", is_refund="true", amount="12.5", category="Travel"),
+        _row("T0", transaction_ts="2025-01-01T23:30:00+02:00", posting_date=""),
+    ]
+    path = tmp_path / "edge.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    parsed = parse_snapshot(path)
+
+    assert ArrowEngine().count_checks(parsed) == Engine().count_checks(parsed)
+    (expected, expected_dropped), (actual, actual_dropped) = Engine().clean(parsed), ArrowEngine().clean(parsed)
+    assert actual_dropped == expected_dropped == 6
+    # The later of the two exact key ties wins under both engines.
+    assert actual.loc[actual["transaction_id"] == "T1", "amount"].tolist() == [8.25]
+    # Compare values only: missing text is NaN in one frame and None in the other.
+    actual, expected = (df.astype(object).where(df.notna(), None) for df in (actual, expected))
+    pd.testing.assert_frame_equal(actual, expected)
+
+
+@pytest.mark.parametrize("chunk_rows", [None, 1_500])
+def test_arrow_engine_matches_pandas_reference(tmp_path: Path, chunk_rows: Optional[int]) -> None:
+    raw = generate_transactions(tmp_path / "t.csv", 8_000, seed=11)
+    arrow = get_engine("arrow")
+
+    expected = validate_transactions(raw, chunk_rows=chunk_rows)
+    assert validate_transactions(raw, chunk_rows=chunk_rows, engine=arrow) == expected
+    assert expected["checks"]["duplicate_transaction_id"] > 0
+
+    reference = transform_snapshot(raw, tmp_path / "pandas", "t", chunk_rows=chunk_rows)
+    output = transform_snapshot(raw, tmp_path / "arrow", "t", chunk_rows=chunk_rows, engine=arrow)
+    assert output.read_bytes() == reference.read_bytes()
+
+
+def test_unknown_engine_is_rejected() -> None:
+    assert get_engine("pandas").name == "pandas"
+    with pytest.raises(ValueError, match="polars"):
+        get_engine("polars")
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import src.external_sort
+from src.external_sort import merge_plan, merge_runs, write_run
+
+
+def test_merge_plan_splits_the_budget_across_the_fan_in() -> None:
+    assert merge_plan(1_000_000) == (64, 15_625)
+    fan_in, block_rows = merge_plan(5_000)
+    assert fan_in * block_rows <= 5_000
+    # Tiny budgets still merge two runs at a time, in blocks of a useful size.
+    assert merge_plan(10) == (2, src.external_sort.MIN_BLOCK_ROWS)
+
+
+def test_cascaded_merge_is_a_stable_sort_of_the_runs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(src.external_sort, "MAX_FAN_IN", 3)
+    monkeypatch.setattr(src.external_sort, "MIN_BLOCK_ROWS", 2)
+    rng = np.random.default_rng(5)
+    keys = ["k", "ts"]
+    runs = []
+    for i in range(10):
+        n = int(rng.integers(0, 30))
+        run = pd.DataFrame(
+            {
+                "k": pd.Series(rng.choice(["a", "b", "c", "d"], n), dtype="string[pyarrow]"),
+                "ts": pd.to_datetime(rng.integers(0, 3, n), unit="D", utc=True),
+                "cat": pd.Categorical(rng.choice(["x", "y", None], n)),
+                "run": i,
+                "pos": np.arange(n),
+            }
+        ).sort_values(keys, kind="stable")
+        write_run(run, tmp_path / f"run_{i:02d}.pkl", block_rows=2)
+        runs.append(run)
+
+    merged = list(merge_runs(sorted(tmp_path.glob("run_*.pkl")), keys, budget_rows=7))
+    assert all(len(frame) == 7 for frame in merged[:-1])
+    expected = pd.concat(runs, ignore_index=True).sort_values(keys, kind="stable")
+    actual = pd.concat(merged, ignore_index=True)
+    assert actual["ts"].dtype == expected["ts"].dtype
+    assert actual[["run", "pos"]].values.tolist() == expected[["run", "pos"]].values.tolist()
+    assert actual["cat"].astype(object).fillna("-").tolist() == expected["cat"].astype(object).fillna("-").tolist()
+    # Passes over more runs than the fan-in consumed their inputs.
+    assert len(list(tmp_path.glob("*.pkl"))) <= 3
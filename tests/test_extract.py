@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from src.extract import (
+    extract_csv,
+    extract_csv_incremental,
+    mark_snapshot_loaded,
+    materialize_snapshot,
+    read_manifest,
+    write_manifest,
+)
+
+
+def _write_input(path: Path, rows: int = 3) -> Path:
+    lines = ["transaction_id,amount"] + [f"TXN{i},{i}.00" for i in range(rows)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_extract_reuses_unloaded_snapshot_and_skips_loaded_content(tmp_path: Path) -> None:
+    raw = _write_input(tmp_path / "in.csv")
+    out = tmp_path / "processed"
+
+    first = extract_csv(raw, out)
+    assert first.snapshot_path.read_bytes() == raw.read_bytes()
+    assert read_manifest(out)["snapshots"][first.content_sha256]["loaded_at"] is None
+
+    # Same bytes, previous run never loaded: the snapshot is reused, not copied again.
+    second = extract_csv(raw, out)
+    assert second.snapshot_path == first.snapshot_path
+    assert not second.already_loaded
+
+    mark_snapshot_loaded(out, second)
+    third = extract_csv(raw, out)
+    assert third.already_loaded
+    assert not extract_csv(raw, out, skip_loaded=False).already_loaded
+
+    _write_input(raw, rows=4)
+    changed = extract_csv(raw, out)
+    assert not changed.already_loaded
+    assert changed.content_sha256 != first.content_sha256
+
+
+@pytest.mark.parametrize("link_mode", ["auto", "copy"])
+def test_only_the_last_loaded_input_is_skipped(tmp_path: Path, link_mode: str) -> None:
+    raw = tmp_path / "in.csv"
+    out = tmp_path / "processed"
+    a = extract_csv(_write_input(raw, rows=3), out, link_mode=link_mode)
+    assert a.content_sha256 == hashlib.sha256(raw.read_bytes()).hexdigest()
+    mark_snapshot_loaded(out, a)
+    b = extract_csv(_write_input(raw, rows=4), out, link_mode=link_mode)
+    mark_snapshot_loaded(out, b)
+
+    # Back to A's bytes: staging now holds B, so A must load again (from its snapshot).
+    again = extract_csv(_write_input(raw, rows=3), out, link_mode=link_mode)
+    assert not again.already_loaded
+    assert again.snapshot_path == a.snapshot_path
+    mark_snapshot_loaded(out, again)
+    assert extract_csv(raw, out, link_mode=link_mode).already_loaded
+    assert not list(out.glob("*.part"))
+
+    # Manifests from before last_loaded was recorded fall back to the latest loaded_at.
+    manifest = read_manifest(out)
+    del manifest["last_loaded"]
+    manifest["snapshots"][a.content_sha256]["loaded_at"] = "2026-01-01T00:00:00Z"
+    manifest["snapshots"][b.content_sha256]["loaded_at"] = "2026-01-02T00:00:00Z"
+    write_manifest(out, manifest)
+    assert not extract_csv(raw, out, link_mode=link_mode).already_loaded
+
+
+@pytest.mark.parametrize("link_mode", ["auto", "hardlink", "copy"])
+def test_materialize_snapshot_preserves_bytes(tmp_path: Path, link_mode: str) -> None:
+    raw = _write_input(tmp_path / "in.csv")
+    dst = tmp_path / "snap.csv"
+    method = materialize_snapshot(raw, dst, link_mode=link_mode)
+    assert dst.read_bytes() == raw.read_bytes()
+    if link_mode == "hardlink":
+        assert method == "hardlink" and dst.stat().st_ino == raw.stat().st_ino
+    else:
+        assert method in {"reflink", "copy"}
+        assert dst.stat().st_ino != raw.stat().st_ino
+
+
+def test_incremental_extract_picks_up_only_appended_rows(tmp_path: Path) -> None:
+    raw = _write_input(tmp_path / "in.csv", rows=3)
+    out = tmp_path / "processed"
+
+    first = extract_csv_incremental(raw, out)
+    assert not first.is_delta
+    assert first.snapshot_path.read_bytes() == raw.read_bytes()
+    mark_snapshot_loaded(out, first)
+
+    # Nothing appended yet.
+    assert extract_csv_incremental(raw, out).already_loaded
+
+    # One complete appended row plus a row that is still being written (quoted newline).
+    with raw.open("a", encoding="utf-8") as f:
+        f.write('TXN3,3.00\nTXN4,"4.\n')
+    second = extract_csv_incremental(raw, out)
+    assert second.is_delta
+    assert second.snapshot_path.read_text(encoding="utf-8") == "transaction_id,amount\nTXN3,3.00\n"
+
+    # Not committed yet: the same delta is extracted again.
+    assert extract_csv_incremental(raw, out).snapshot_path.read_bytes() == second.snapshot_path.read_bytes()
+    mark_snapshot_loaded(out, second)
+
+    with raw.open("a", encoding="utf-8") as f:
+        f.write('00"\n')
+    third = extract_csv_incremental(raw, out)
+    assert third.snapshot_path.read_text(encoding="utf-8") == 'transaction_id,amount\nTXN4,"4.\n00"\n'
+
+
+def test_incremental_extract_restarts_when_input_is_rewritten(tmp_path: Path) -> None:
+    raw = _write_input(tmp_path / "in.csv", rows=3)
+    out = tmp_path / "processed"
+    mark_snapshot_loaded(out, extract_csv_incremental(raw, out))
+
+    raw.write_text("transaction_id,amount\nTXN0,9.99\nTXN1,1.00\nTXN2,2.00\nTXN5,5.00\n", encoding="utf-8")
+    res = extract_csv_incremental(raw, out)
+    assert not res.is_delta
+    assert res.snapshot_path.read_bytes() == raw.read_bytes()
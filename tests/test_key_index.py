@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+
+from src.artifacts import iter_artifact_batches
+from src.key_index import ChangeCounts, KeyIndex
+from src.transform import clean_snapshot, transform_snapshot
+
+
+def _row(transaction_id: str, posting_date: str = "2025-01-02", amount: str = "10.00") -> dict:
+    return {
+        "transaction_id": transaction_id,
+        "account_id": "ACC1",
+        "transaction_ts": "2025-01-01 10:00:00",
+        "posting_date": posting_date,
+        "currency": "SEK",
+        "amount": amount,
+        "merchant_id": "M1",
+        "merchant_name": "Shop",
+        "category": "grocery",
+        "country": "SE",
+        "city": "Stockholm",
+        "payment_method": "CARD",
+        "status": "BOOKED",
+        "is_refund": "false",
+        "reference": "",
+    }
+
+
+def _clean(tmp_path: Path, name: str, rows: list, **kwargs) -> Path:
+    raw = tmp_path / f"{name}.csv"
+    pd.DataFrame(rows).to_csv(raw, index=False)
+    return transform_snapshot(raw, tmp_path / "out", name, **kwargs)
+
+
+def test_key_index_classifies_rows_across_runs(tmp_path: Path) -> None:
+    first = _clean(tmp_path, "first", [_row("T1"), _row("T2"), _row("T3")])
+    with KeyIndex.open(tmp_path) as index:
+        assert index.classify(first) == ChangeCounts(new=3)
+        index.begin_load()
+        assert index.apply(replace=True) == 3
+
+        # The same rows as a columnar artifact or an in-memory frame are unchanged.
+        columnar = _clean(tmp_path, "first_pq", [_row("T1"), _row("T2"), _row("T3")], output_format="parquet")
+        assert index.classify(columnar) == ChangeCounts(unchanged=3)
+        assert index.classify(clean_snapshot(tmp_path / "first.csv")) == ChangeCounts(unchanged=3)
+
+        # T1 changes, T2 is an older version (staging keeps its row), T4 is new.
+        second = _clean(
+            tmp_path,
+            "second",
+            [_row("T1", amount="11.00"), _row("T2", posting_date="2025-01-01", amount="1.00"), _row("T3"), _row("T4")],
+        )
+        changed_path = tmp_path / "changed.arrow"
+        assert index.classify(second, changed_path=changed_path) == ChangeCounts(new=1, updated=1, unchanged=2)
+        changed = pd.concat(b.to_pandas() for b in iter_artifact_batches(changed_path))
+        assert sorted(changed["transaction_id"]) == ["T1", "T4"]
+
+        index.begin_load()
+        assert index.apply(replace=False) == 4
+        assert index.classify(second) == ChangeCounts(unchanged=4)
+
+        # A load that never applied its keys leaves the index untrusted: it is rebuilt.
+        index.begin_load()
+        assert index.classify(second) == ChangeCounts(new=4)
+
+
+def test_key_index_is_rebuilt_when_staging_changed_behind_its_back(tmp_path: Path) -> None:
+    first = _clean(tmp_path, "first", [_row("T1"), _row("T2")])
+    with KeyIndex.open(tmp_path) as index:
+        assert index.classify(first, staging="") == ChangeCounts(new=2)
+        index.begin_load()
+        index.apply(replace=True, staging="2:2025-01-03T00:00:00+00:00")
+        assert index.classify(first, staging="2:2025-01-03T00:00:00+00:00") == ChangeCounts(unchanged=2)
+
+        # Another load (e.g. with the index disabled) moved staging on: nothing is trusted.
+        assert index.classify(first, staging="2:2025-01-04T00:00:00+00:00") == ChangeCounts(new=2)
+        index.begin_load()
+        index.apply(replace=True, staging="2:2025-01-04T00:00:00+00:00")
+        # Staging gone (a fresh database) never matches.
+        assert index.classify(first, staging="") == ChangeCounts(new=2)
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import src.artifacts
+import src.load
+from src.artifacts import ArrowArtifactWriter, iter_artifact_batches
+from src.load import (
+    STAGING_COLUMNS,
+    BackgroundRawLoad,
+    _build_shadow_indexes,
+    _partition_batch,
+    _raw_partition_day,
+    _StagingIndex,
+    _upsert_sql,
+    copy_file,
+)
+from src.transform import _dedupe_latest
+
+
+def test_partition_batch_splits_ids_disjointly_and_deterministically() -> None:
+    ids = [f"TXN{i}" for i in range(200)]
+    batch = pa.record_batch({"transaction_id": ids, "amount": list(range(200))})
+
+    parts = _partition_batch(batch, 3)
+    assert len(parts) == 3
+    assert sum(p.num_rows for p in parts) == 200
+    seen = [set(p.column(0).to_pylist()) for p in parts]
+    assert set().union(*seen) == set(ids)
+    assert not (seen[0] & seen[1]) and not (seen[0] & seen[2]) and not (seen[1] & seen[2])
+    # The same id always maps to the same partition, whatever batch it arrives in.
+    again = _partition_batch(batch.slice(50, 10), 3)
+    for i, p in enumerate(again):
+        assert set(p.column(0).to_pylist()) <= seen[i]
+
+
+def test_ipc_artifacts_are_written_and_copied_in_bounded_batches(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr(src.artifacts, "ARTIFACT_BATCH_ROWS", 1_000)
+    monkeypatch.setattr(src.load, "COPY_BATCH_ROWS", 400)
+    table = pa.table({"transaction_id": [f"TXN{i}" for i in range(2_500)], "amount": list(range(2_500))})
+    path = tmp_path / "clean.arrow"
+    with ArrowArtifactWriter(path, table.schema) as writer:
+        writer.write_table(table)
+
+    # One write of the whole table is stored as bounded record batches.
+    assert [b.num_rows for b in iter_artifact_batches(path)] == [1_000, 1_000, 500]
+
+    copied = []
+
+    def fake_copy_binary(conn, *, batches, table_fqn, columns, commit):
+        copied.extend(b.num_rows for b in batches)
+        return sum(copied)
+
+    monkeypatch.setattr(src.load, "copy_binary", fake_copy_binary)
+    assert copy_file(None, path=path, table_fqn="t", columns=["transaction_id", "amount"]) == 2_500
+    assert copied == [400, 400, 200, 400, 400, 200, 400, 100]
+
+
+def test_raw_partition_day_ignores_tables_outside_the_naming_scheme() -> None:
+    assert _raw_partition_day("financial_transactions_raw_p20250131") == date(2025, 1, 31)
+    for name in ("financial_transactions_raw_default", "financial_transactions_raw_p2025013", "archive_p20250131"):
+        assert _raw_partition_day(name) is None
+
+
+def test_abort_cancels_the_background_raw_load_instead_of_waiting(monkeypatch) -> None:
+    cancelled = threading.Event()
+
+    class FakeConn:
+        def cancel(self) -> None:
+            cancelled.set()
+
+    class FakePool:
+        def __init__(self) -> None:
+            self.returned = []
+
+        def getconn(self) -> FakeConn:
+            return FakeConn()
+
+        def putconn(self, conn: FakeConn) -> None:
+            self.returned.append(conn)
+
+    def slow_load_raw(conn, raw_snapshot, *, load_batch_id, commit):
+        # Stands in for a long COPY that only a cancel interrupts.
+        if not cancelled.wait(timeout=30):
+            return 1
+        raise RuntimeError("canceling statement due to user request")
+
+    monkeypatch.setattr(src.load, "apply_migrations", lambda conn, migrations_dir: None)
+    monkeypatch.setattr(src.load, "load_raw", slow_load_raw)
+    pool = FakePool()
+    load = BackgroundRawLoad(pool, migrations_dir=Path("m"), raw_snapshot=Path("s.csv"), load_batch_id="B")
+    started = time.monotonic()
+    load.abort()
+    assert time.monotonic() - started < 5
+    assert cancelled.is_set()
+    assert len(pool.returned) == 1
+    assert load.metrics.status == "failed"
+
+
+def test_shadow_indexes_are_built_from_the_staging_definitions(monkeypatch) -> None:
+    executed = []
+
+    class FakeCursor:
+        def __enter__(self) -> "FakeCursor":
+            return self
+
+        def __exit__(self, *exc) -> None:
+            pass
+
+        def execute(self, sql: str) -> None:
+            executed.append(sql)
+
+    class FakeConn:
+        def cursor(self) -> FakeCursor:
+            return FakeCursor()
+
+        def commit(self) -> None:
+            pass
+
+    class FakePool:
+        @contextmanager
+        def connection(self):
+            yield FakeConn()
+
+    indexes = [
+        _StagingIndex(
+            "financial_transactions_pkey",
+            "CREATE UNIQUE INDEX financial_transactions_pkey ON staging.financial_transactions "
+            "USING btree (transaction_id)",
+            "financial_transactions_pkey",
+            "p",
+        ),
+        _StagingIndex(
+            "idx_fin_txn_staging_loaded_at",
+            "CREATE INDEX idx_fin_txn_staging_loaded_at ON staging.financial_transactions USING btree (loaded_at)",
+            None,
+            None,
+        ),
+    ]
+    _build_shadow_indexes(FakePool(), indexes, workers=2)
+    assert sorted(executed) == [
+        "CREATE INDEX idx_fin_txn_staging_loaded_at_load ON staging.financial_transactions_load USING btree (loaded_at)",
+        "CREATE UNIQUE INDEX financial_transactions_pkey_load ON staging.financial_transactions_load "
+        "USING btree (transaction_id)",
+    ]
+
+    odd = _StagingIndex("idx_odd", "CREATE INDEX idx_odd ON other.table USING btree (x)", None, None)
+    with pytest.raises(RuntimeError, match="idx_odd"):
+        _build_shadow_indexes(FakePool(), [odd], workers=1)
+
+
+def test_upsert_sql_updates_every_value_column_under_the_dedupe_rule() -> None:
+    sql = _upsert_sql("staging_batch")
+    value_columns = [c for c in STAGING_COLUMNS if c != "transaction_id"]
+
+    assert f"select {', '.join(STAGING_COLUMNS)} from staging_batch" in sql
+    assert "on conflict (transaction_id) do update set" in sql
+    assignments = re.findall(r"^\s*(\w+) = (\S+?),?$", sql, re.MULTILINE)
+    assert assignments == [(c, f"excluded.{c}") for c in value_columns] + [("loaded_at", "now()")]
+    # Unchanged rows are skipped, comparing every value column.
+    current = ", ".join(f"t.{c}" for c in value_columns)
+    incoming = ", ".join(f"excluded.{c}" for c in value_columns)
+    assert f"({current}) is distinct from ({incoming})" in sql
+
+
+@pytest.mark.parametrize(
+    "staged, incoming",
+    [
+        (("2025-01-02", "2025-01-01 10:00:00"), ("2025-01-02", "2025-01-01 10:00:00")),  # exact tie
+        (("2025-01-02", "2025-01-01 10:00:00"), ("2025-01-02", "2025-01-01 11:00:00")),  # later ts
+        (("2025-01-02", "2025-01-01 10:00:00"), ("2025-01-02", "2025-01-01 09:00:00")),  # earlier ts
+        (("2025-01-02", "2025-01-01 10:00:00"), ("2025-01-03", "2025-01-01 09:00:00")),  # later posting date
+        (("2025-01-02", "2025-01-01 10:00:00"), ("2025-01-01", "2025-01-01 11:00:00")),  # earlier posting date
+    ],
+)
+def test_upsert_tie_rule_matches_the_transform_dedupe(staged, incoming) -> None:
+    # The upsert's row comparison, read from the SQL itself.
+    rule = re.search(
+        r"where \(excluded\.posting_date, excluded\.transaction_ts\) (>=|>) \(t\.posting_date, t\.transaction_ts\)",
+        _upsert_sql("b"),
+    )
+    assert rule is not None
+
+    def key(row):
+        return pd.Timestamp(row[0]), pd.Timestamp(row[1], tz="UTC")
+
+    upsert_takes_incoming = key(incoming) >= key(staged) if rule.group(1) == ">=" else key(incoming) > key(staged)
+
+    # The transform keeps the later input row of the same (posting_date, transaction_ts).
+    rows = pd.DataFrame(
+        {
+            "transaction_id": ["T1", "T1"],
+            "posting_date": [pd.Timestamp(staged[0]), pd.Timestamp(incoming[0])],
+            "transaction_ts": [pd.Timestamp(staged[1], tz="UTC"), pd.Timestamp(incoming[1], tz="UTC")],
+            "origin": ["staged", "incoming"],
+        }
+    )
+    assert (_dedupe_latest(rows)["origin"].item() == "incoming") == upsert_takes_incoming
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from src.metrics import RunMetrics, render_prometheus
+
+
+def test_stages_record_rows_and_failures(tmp_path: Path) -> None:
+    metrics = RunMetrics(run_ts="20250101T000000Z")
+    with metrics.stage("validate", rows_in=100) as m:
+        m.rows_out = 100
+    with pytest.raises(RuntimeError):
+        with metrics.stage("load_staging"):
+            raise RuntimeError("boom")
+
+    ok, failed = metrics.stages
+    assert (ok.stage, ok.status, ok.rows_in, ok.rows_out) == ("validate", "ok", 100, 100)
+    assert ok.wall_seconds > 0 and ok.peak_rss_bytes > 0
+    assert ok.rows_per_second == pytest.approx(100 / ok.wall_seconds)
+    assert (failed.status, failed.rows_per_second) == ("failed", None)
+
+    path = metrics.write_json(tmp_path, exit_code=1)
+    assert path.name == "run_metrics_20250101T000000Z.json"
+    written = json.loads(path.read_text())
+    assert written["exit_code"] == 1
+    assert [s["stage"] for s in written["stages"]] == ["validate", "load_staging"]
+
+    textfile = tmp_path / "metrics" / "pipeline.prom"
+    metrics.write_prometheus(textfile, exit_code=1)
+    text = textfile.read_text()
+    assert "pipeline_last_run_exit_code 1\n" in text
+    assert 'pipeline_stage_rows_out{stage="validate"} 100\n' in text
+    assert 'pipeline_stage_rows_out{stage="load_staging"}' not in text
+
+
+def test_prometheus_has_one_type_line_per_metric() -> None:
+    run = {
+        "exit_code": 0,
+        "wall_seconds": 2.0,
+        "stages": [
+            {
+                "stage": s,
+                "wall_seconds": 1.0,
+                "cpu_seconds": 0.5,
+                "peak_rss_bytes": 10,
+                "rows_in": 5,
+                "rows_out": 5,
+                "rows_per_second": 5.0,
+            }
+            for s in ("extract", "transform")
+        ],
+    }
+    lines = render_prometheus(run).splitlines()
+    assert lines.count("# TYPE pipeline_stage_wall_seconds gauge") == 1
+    assert 'pipeline_stage_wall_seconds{stage="transform"} 1.0' in lines
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from src.migrations import MigrationError, _concurrent_index_target, discover_migrations, split_statements
+
+
+def test_discover_orders_by_version_and_detects_no_transaction(tmp_path: Path) -> None:
+    (tmp_path / "0010_later.sql").write_text("-- migrate:no-transaction\ncreate index concurrently i on t (a);\n")
+    (tmp_path / "0002_first.sql").write_text("create table t (a int);\n")
+
+    migrations = discover_migrations(tmp_path)
+    assert [(m.version, m.name) for m in migrations] == [(2, "first"), (10, "later")]
+    assert migrations[0].transactional and not migrations[1].transactional
+    assert len(migrations[0].checksum) == 64
+
+    (tmp_path / "02_dup.sql").write_text("select 1;")
+    with pytest.raises(MigrationError, match="Duplicate migration version 2"):
+        discover_migrations(tmp_path)
+
+
+def test_shipped_migrations_are_discoverable() -> None:
+    migrations = discover_migrations(Path(__file__).resolve().parents[1] / "sql" / "migrations")
+    assert migrations[0].version == 1
+    # Indexes added to existing tables are built concurrently, outside a transaction.
+    indexes = next(m for m in migrations if m.name == "staging_loaded_at_indexes")
+    assert not indexes.transactional
+    assert all(s.startswith("create index concurrently if not exists") for s in split_statements(indexes.sql))
+
+
+def test_concurrent_index_target_names_the_index_a_retry_must_clean_up() -> None:
+    assert _concurrent_index_target(
+        "create index concurrently if not exists idx_a\n  on staging.financial_transactions (loaded_at)"
+    ) == ("staging", "idx_a")
+    assert _concurrent_index_target("CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS u ON t (x)") == ("public", "u")
+    assert _concurrent_index_target("create index if not exists idx_a on t (x)") is None
+    assert _concurrent_index_target("alter table t add column x int") is None
+
+
+def test_split_statements_at_line_ending_semicolons() -> None:
+    sql = (
+        "-- migrate:no-transaction\n"
+        "create index concurrently if not exists a\n  on t (x);\n"
+        "create index concurrently if not exists b on t (y); -- trailing comment\n"
+        "\n"
+    )
+    assert split_statements(sql) == [
+        "create index concurrently if not exists a\n  on t (x)",
+        "create index concurrently if not exists b on t (y)",
+    ]
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+import pytest
+
+from benchmarks.generate import generate_transactions
+from src.extract import extract_files, resolve_inputs
+from src.multi_file import combined_report, merge_clean_output, process_files, validate_files_or_raise
+from src.transform import transform_snapshot
+from src.validate import ValidationError, validate_transactions
+
+
+def _split(csv_path: Path, out_dir: Path, parts: int) -> List[Path]:
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    out_dir.mkdir()
+    size = -(-len(df) // parts)
+    paths = []
+    for i in range(parts):
+        path = out_dir / f"branch_{i}.csv"
+        df.iloc[i * size : (i + 1) * size].to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("workers,chunk_rows", [(2, None), (1, 700)])
+def test_multi_file_input_matches_the_concatenated_file(tmp_path: Path, workers: int, chunk_rows: int) -> None:
+    whole = generate_transactions(tmp_path / "whole.csv", 6_000, seed=3)
+    inputs = _split(whole, tmp_path / "in", parts=3)
+    assert resolve_inputs(tmp_path / "in") == inputs
+    assert resolve_inputs(tmp_path / "in" / "branch_[01].csv") == inputs[:2]
+
+    processed = tmp_path / "processed"
+    extracted = extract_files(tmp_path / "in", processed)
+    assert [p.name for p in sorted(extracted.snapshot_path.iterdir())] == [
+        "0000_branch_0.csv",
+        "0001_branch_1.csv",
+        "0002_branch_2.csv",
+    ]
+    assert extract_files(tmp_path / "in", processed).snapshot_path == extracted.snapshot_path
+
+    spill = tmp_path / "spill"
+    spill.mkdir()
+    results = process_files(extracted.snapshot_path, spill, workers=workers, chunk_rows=chunk_rows)
+    report = combined_report(extracted.snapshot_path, results)
+    expected = validate_transactions(whole)
+    assert report["passed"] and expected["passed"]
+    assert (report["row_count"], report["checks"]) == (expected["row_count"], expected["checks"])
+    # Some ids repeat across files, not only within one.
+    per_file = sum(f["checks"]["duplicate_transaction_id"] for f in report["files"])
+    assert per_file < report["checks"]["duplicate_transaction_id"]
+
+    clean = merge_clean_output(results, processed, "multi", chunk_rows=chunk_rows)
+    reference = transform_snapshot(whole, tmp_path / "reference", "whole")
+    assert clean.read_bytes() == reference.read_bytes()
+
+
+def test_one_failing_file_fails_the_run(tmp_path: Path) -> None:
+    whole = generate_transactions(tmp_path / "whole.csv", 3_000, seed=4)
+    inputs = _split(whole, tmp_path / "in", parts=3)
+    bad = pd.read_csv(inputs[1], dtype=str, keep_default_na=False)
+    bad.loc[0, "status"] = "LOST"
+    bad.to_csv(inputs[1], index=False)
+
+    spill = tmp_path / "spill"
+    spill.mkdir()
+    results = process_files(tmp_path / "in", spill, workers=1, transform=False)
+    assert all(not r.run_paths for r in results)
+    with pytest.raises(ValidationError):
+        validate_files_or_raise(tmp_path / "in", results, tmp_path, "bad")
+
+    report = json.loads((tmp_path / "validation_report_bad.json").read_text())
+    assert report["failed_files"] == [str(inputs[1])]
+    assert "status_accepted_values" in report["failed_checks"]
+    assert [f["passed"] for f in report["files"]] == [True, False, True]
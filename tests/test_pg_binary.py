@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import struct
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from src.pg_binary import COPY_HEADER, COPY_TRAILER, encode_record_batch  # noqa: E402
+
+
+def test_copy_framing_matches_postgres_signature() -> None:
+    assert COPY_HEADER == b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8
+    assert COPY_TRAILER == b"\xff\xff"
+
+
+def test_encode_record_batch_lays_out_fields_in_postgres_binary_format() -> None:
+    batch = pa.record_batch(
+        {
+            "transaction_id": pa.array(["TX", None]),
+            "transaction_ts": pa.array(
+                [datetime(2000, 1, 1, 0, 0, 1, tzinfo=timezone.utc), None], pa.timestamp("us", tz="UTC")
+            ),
+            "posting_date": pa.array([date(2000, 1, 2), date(1999, 12, 31)]),
+            "amount": pa.array([Decimal("-12345.67"), Decimal("0.00")], pa.decimal128(18, 2)),
+            "is_refund": pa.array([True, None]),
+        }
+    )
+
+    def numeric(digits: list, sign: int) -> bytes:
+        return struct.pack("!hhhh", len(digits), 3, sign, 2) + struct.pack(f"!{len(digits)}h", *digits)
+
+    amount_1 = numeric([0, 0, 1, 2345, 6700], 0x4000)
+    amount_2 = numeric([0, 0, 0, 0, 0], 0x0000)
+    expected = (
+        struct.pack("!h", 5)
+        + struct.pack("!i", 2) + b"TX"
+        + struct.pack("!iq", 8, 1_000_000)
+        + struct.pack("!ii", 4, 1)
+        + struct.pack("!i", len(amount_1)) + amount_1
+        + struct.pack("!ib", 1, 1)
+        + struct.pack("!h", 5)
+        + struct.pack("!i", -1)
+        + struct.pack("!i", -1)
+        + struct.pack("!ii", 4, -1)
+        + struct.pack("!i", len(amount_2)) + amount_2
+        + struct.pack("!i", -1)
+    )
+    assert encode_record_batch(batch) == expected
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import src.snapshot
+from benchmarks.generate import generate_transactions
+from src.extract import extract_csv
+from src.load import RAW_COLUMNS
+from src.snapshot import (
+    CATEGORICAL_COLUMNS,
+    MIN_CHUNK_ROWS,
+    chunk_rows_for_budget,
+    iter_snapshot_chunks_to_end,
+    parse_snapshot,
+)
+
+
+def test_snapshot_columns_are_compact_and_match_across_formats(tmp_path: Path) -> None:
+    raw = generate_transactions(tmp_path / "t.csv", 2_000, seed=2)
+    csv = parse_snapshot(raw)
+    assert list(csv.raw.columns) == list(RAW_COLUMNS)
+    assert set(CATEGORICAL_COLUMNS) <= set(RAW_COLUMNS)
+    for name, dtype in csv.raw.dtypes.items():
+        expected = "category" if name in CATEGORICAL_COLUMNS else "string"
+        assert str(dtype).startswith(expected), (name, dtype)
+    assert str(csv.amount.dtype) == "float64"
+
+    # Same values as the plain object-string read, with NaN for pandas' missing tokens.
+    plain = pd.read_csv(raw, dtype=str)
+    pd.testing.assert_frame_equal(csv.raw.astype(object), plain.astype(object))
+
+    columnar = parse_snapshot(extract_csv(raw, tmp_path / "p", snapshot_format="parquet").snapshot_path)
+    pd.testing.assert_frame_equal(columnar.raw.astype(object), plain.astype(object))
+
+
+def test_memory_budget_picks_batch_rows(tmp_path: Path) -> None:
+    raw = generate_transactions(tmp_path / "t.csv", 50_000, seed=5)
+    assert chunk_rows_for_budget(raw, 1 << 30) is None
+    rows = chunk_rows_for_budget(raw, 40 << 20)
+    assert rows is not None and MIN_CHUNK_ROWS < rows < 50_000
+    assert chunk_rows_for_budget(raw, 20 << 20) < rows
+    assert chunk_rows_for_budget(raw, 1 << 20) == MIN_CHUNK_ROWS
+
+    small = generate_transactions(tmp_path / "small.csv", 500, seed=5)
+    assert chunk_rows_for_budget(small, 1 << 10) is None
+
+
+def test_chunks_tell_the_last_batch_without_reading_past_it(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    raw = tmp_path / "t.csv"
+    df = pd.read_csv(generate_transactions(tmp_path / "g.csv", 4_000, seed=4), dtype=str, keep_default_na=False)
+    df.head(3_000).to_csv(raw, index=False)
+    columnar = extract_csv(raw, tmp_path / "p", snapshot_format="parquet").snapshot_path
+    for path in (raw, columnar):
+        # An exact multiple of the batch size, and a short last batch.
+        for chunk_rows in (1_000, 700):
+            flags = [last for _, last in iter_snapshot_chunks_to_end(path, chunk_rows)]
+            assert flags == [False] * (len(flags) - 1) + [True], (path, chunk_rows)
+    # The pandas reader (without pyarrow) looks one raw chunk ahead instead.
+    monkeypatch.setattr(src.snapshot, "_has_pyarrow", lambda: False)
+    assert [last for _, last in iter_snapshot_chunks_to_end(raw, 1_000)] == [False, False, True]
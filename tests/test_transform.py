@@ -3,8 +3,11 @@ from __future__ import annotations
 from pathlib import Path
 
 import pandas as pd
+import pytest
 
-from src.transform import map_category, transform_snapshot
+from src.snapshot import parse_snapshot
+from src.transform import map_category, map_category_series, transform_snapshot
+from src.validate import validate_parsed
 
 
 def _write_csv(df: pd.DataFrame, path: Path) -> Path:
@@ -20,6 +23,14 @@ def test_category_mapping_to_canonical_set() -> None:
     assert map_category(None) == "Other"
 
 
+def test_vectorized_category_mapping_matches_scalar() -> None:
+    raw = pd.Series(
+        ["GROCERY", None, "books", "", "grocery", "Travel", "unknown", float("nan"), "GROCERY"],
+        index=range(10, 19),
+    )
+    pd.testing.assert_series_equal(map_category_series(raw), raw.map(map_category))
+
+
 def test_transform_dedupes_by_latest_posting_date(tmp_path: Path) -> None:
     df = pd.DataFrame(
         [
@@ -160,3 +171,120 @@ def test_transform_enforces_refund_sign(tmp_path: Path) -> None:
     assert amt["TXN2"] < 0
 
 
+
+
+def test_transform_shares_parsed_snapshot_without_mutating_it(tmp_path: Path) -> None:
+    df = pd.DataFrame(
+        [
+            {
+                "transaction_id": "TXN1",
+                "account_id": "ACC1",
+                "transaction_ts": "2025-01-01T10:00:00Z",
+                "posting_date": "2025-01-01",
+                "currency": "sek",
+                "amount": "10.00",
+                "merchant_id": "M1",
+                "merchant_name": "Shop",
+                "category": "grocery",
+                "country": "SE",
+                "city": "Stockholm",
+                "payment_method": "CARD",
+                "status": "booked",
+                "is_refund": "0",
+                "reference": "r1",
+            },
+        ]
+    )
+    snapshot = _write_csv(df, tmp_path / "snapshot.csv")
+    parsed = parse_snapshot(snapshot)
+    raw_before = parsed.raw.copy()
+
+    report = validate_parsed(parsed)
+    out = transform_snapshot(snapshot, tmp_path, "TESTTS", parsed=parsed)
+
+    assert report["passed"] is True
+    pd.testing.assert_frame_equal(parsed.raw, raw_before)
+    res = pd.read_csv(out)
+    assert res.loc[0, "currency"] == "SEK"
+    assert res.loc[0, "status"] == "BOOKED"
+
+
+def test_out_of_core_transform_matches_in_memory(tmp_path: Path) -> None:
+    base = {
+        "account_id": "ACC1",
+        "currency": "SEK",
+        "merchant_id": "M1",
+        "merchant_name": "Shop",
+        "category": "grocery",
+        "country": "SE",
+        "city": "Stockholm",
+        "payment_method": "CARD",
+        "status": "BOOKED",
+        "is_refund": "0",
+    }
+    rows = [
+        ("TXN2", "2025-01-02 10:00:00", "2025-01-03", "5.00", "a"),
+        ("TXN1", "2025-01-01 10:00:00", "2025-01-02", "10.00", "b"),
+        ("TXN3", "2025-01-01 10:00:00", "", "1.00", "c"),  # posting_date falls back to ts
+        ("TXN1", "2025-01-01 09:00:00", "2025-01-01", "9.00", "d"),  # older posting_date
+        ("TXN2", "2025-01-02 10:00:00", "2025-01-03", "6.00", "e"),  # exact tie: later row wins
+        ("TXN1", "2025-01-01 11:00:00", "2025-01-02", "11.00", "f"),  # later ts wins
+        ("TXN4", "bad", "2025-01-01", "1.00", "g"),  # dropped
+    ]
+    df = pd.DataFrame(
+        [
+            {**base, "transaction_id": t, "transaction_ts": ts, "posting_date": pd_, "amount": amt, "reference": ref}
+            for t, ts, pd_, amt, ref in rows
+        ]
+    )
+    snapshot = _write_csv(df, tmp_path / "snapshot.csv")
+
+    expected = transform_snapshot(snapshot, tmp_path, "FULL").read_text()
+    for chunk_rows in (1, 2, 3, 100):
+        out = transform_snapshot(snapshot, tmp_path, f"CHUNK{chunk_rows}", chunk_rows=chunk_rows)
+        assert out.read_text() == expected
+
+    res = pd.read_csv(tmp_path / "clean_transactions_FULL.csv")
+    assert dict(zip(res["transaction_id"], res["reference"])) == {"TXN1": "f", "TXN2": "e", "TXN3": "c"}
+    assert not list(tmp_path.glob("transform_spill_*"))
+
+
+@pytest.mark.parametrize("output_format", ["parquet", "arrow"])
+def test_transform_writes_typed_columnar_output(tmp_path: Path, output_format: str) -> None:
+    pytest.importorskip("pyarrow")
+    from src.artifacts import read_artifact_table, staging_arrow_schema
+
+    df = pd.DataFrame(
+        [
+            {
+                "transaction_id": "TXN1",
+                "account_id": "ACC1",
+                "transaction_ts": "2025-01-01 10:00:00",
+                "posting_date": "2025-01-02",
+                "currency": "SEK",
+                "amount": "-10.10",
+                "merchant_id": "M1",
+                "merchant_name": "Shop",
+                "category": "grocery",
+                "country": "SE",
+                "city": "Stockholm",
+                "payment_method": "CARD",
+                "status": "BOOKED",
+                "is_refund": "0",
+                "reference": "",
+            },
+        ]
+    )
+    snapshot = _write_csv(df, tmp_path / "snapshot.csv")
+    out = transform_snapshot(snapshot, tmp_path, "TESTTS", output_format=output_format)
+    chunked = transform_snapshot(snapshot, tmp_path, "CHUNKED", chunk_rows=1, output_format=output_format)
+
+    table = read_artifact_table(out)
+    assert out.suffix == f".{output_format}"
+    assert table.schema.equals(staging_arrow_schema())
+    assert table.equals(read_artifact_table(chunked))
+    row = table.to_pylist()[0]
+    assert str(row["amount"]) == "10.10"
+    assert row["posting_date"].isoformat() == "2025-01-02"
+    assert row["is_refund"] is False
+    assert row["reference"] is None
@@ -2,10 +2,19 @@ from __future__ import annotations
 
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import pytest
 
-from src.validate import ValidationError, ValidationThresholds, normalize_is_refund, validate_transactions
+from benchmarks.generate import generate_transactions
+from src.snapshot import normalize_is_refund_series
+from src.validate import (
+    DuplicateTracker,
+    ValidationError,
+    ValidationThresholds,
+    normalize_is_refund,
+    validate_transactions,
+)
 
 
 def _write_csv(df: pd.DataFrame, path: Path) -> Path:
@@ -24,6 +33,13 @@ def test_normalize_is_refund_accepts_common_encodings() -> None:
     assert normalize_is_refund("f") is False
 
 
+def test_vectorized_is_refund_matches_scalar() -> None:
+    raw = pd.Series(["1", "0", "TRUE", None, np.nan, " yes ", "maybe", "1", "f"], dtype=object)
+    pd.testing.assert_series_equal(normalize_is_refund_series(raw), raw.map(normalize_is_refund))
+    only_bools = pd.Series(["t", "f", "1"])
+    assert normalize_is_refund_series(only_bools).dtype == only_bools.map(normalize_is_refund).dtype == bool
+
+
 def test_validation_threshold_invalid_currency_fails_when_exceeded(tmp_path: Path) -> None:
     df = pd.DataFrame(
         [
@@ -171,3 +187,98 @@ def test_validation_threshold_duplicates_fails_when_exceeded(tmp_path: Path) ->
     assert "duplicate_transaction_id_threshold_exceeded" in report["failed_checks"]
 
 
+def test_duplicate_tracker_matches_duplicated_across_chunks() -> None:
+    rng = np.random.default_rng(0)
+    ids = pd.Series([f"TXN{i}" for i in rng.integers(0, 500, 2000)], dtype=object)
+    ids[rng.integers(0, len(ids), 50)] = None
+    for chunk_rows in (1, 7, 100, 2000):
+        tracker = DuplicateTracker()
+        flags = [tracker.flag(ids.iloc[s : s + chunk_rows]) for s in range(0, len(ids), chunk_rows)]
+        np.testing.assert_array_equal(np.concatenate(flags), ids.duplicated().to_numpy())
+        assert len(tracker.hashes()) == ids.nunique(dropna=False)
+
+
+def test_chunked_validation_matches_whole_file_report(tmp_path: Path) -> None:
+    rows = []
+    for i, (txn_id, ts, currency, is_refund, amount) in enumerate(
+        [
+            ("TXN1", "2025-01-01T10:00:00Z", "SEK", "0", "10.00"),
+            ("TXN2", "not-a-date", "sek", "1", "-5.00"),
+            ("TXN3", "2025-01-03 09:00:00", "XXX", "yes", "3.00"),  # refund sign mismatch
+            ("TXN1", "2025-01-01T11:00:00Z", "EUR", "FALSE", "11.00"),  # duplicate across chunks
+            ("", "2025-01-05T10:00:00Z", "USD", "maybe", "abc"),
+            ("TXN3", "2025-01-06T10:00:00Z", "GBP", "f", "7.00"),  # duplicate across chunks
+        ]
+    ):
+        rows.append(
+            {
+                "transaction_id": txn_id,
+                "account_id": "ACC1",
+                "transaction_ts": ts,
+                "posting_date": f"2025-01-0{i + 1}",
+                "currency": currency,
+                "amount": amount,
+                "merchant_id": "M1",
+                "merchant_name": "Test",
+                "category": "grocery",
+                "country": "SE",
+                "city": "Stockholm",
+                "payment_method": "CARD",
+                "status": "BOOKED",
+                "is_refund": is_refund,
+                "reference": f"r{i}",
+            }
+        )
+    csv_path = _write_csv(pd.DataFrame(rows), tmp_path / "in.csv")
+
+    whole = validate_transactions(csv_path)
+    assert whole["checks"]["duplicate_transaction_id"] == 2
+    for chunk_rows in (1, 2, 4, 100):
+        assert validate_transactions(csv_path, chunk_rows=chunk_rows) == whole
+
+
+def test_fail_fast_stops_at_the_first_hard_failure(tmp_path: Path) -> None:
+    raw = generate_transactions(tmp_path / "t.csv", 5_000, seed=6)
+    df = pd.read_csv(raw, dtype=str, keep_default_na=False)
+    whole = validate_transactions(raw)
+    assert validate_transactions(raw, fail_fast=True, chunk_rows=1_000) == {
+        **whole,
+        "partial": False,
+        "first_failing_rows": {},
+    }
+
+    df.loc[[1_234, 1_240, 4_000], "status"] = "LOST"
+    bad = _write_csv(df, tmp_path / "bad_status.csv")
+    report = validate_transactions(bad, fail_fast=True, chunk_rows=1_000)
+    assert report["partial"] and not report["passed"]
+    assert report["row_count"] == 2_000
+    assert report["failed_checks"] == ["status_accepted_values"]
+    assert report["first_failing_rows"] == {"status_accepted_values": [1_234, 1_240]}
+
+    # A failure in the last batch stops nothing early: every row was read.
+    df.loc[[1_234, 1_240], "status"] = "BOOKED"
+    last = validate_transactions(_write_csv(df, tmp_path / "bad_tail.csv"), fail_fast=True, chunk_rows=2_500)
+    assert last["row_count"] == 5_000 and not last["partial"] and not last["passed"]
+
+    # Every date unparseable: the threshold cannot be met long before the end of the file.
+    df["status"] = "BOOKED"
+    df["posting_date"] = "garbage"
+    dates = validate_transactions(_write_csv(df, tmp_path / "bad_dates.csv"), fail_fast=True, chunk_rows=500)
+    assert dates["partial"] and dates["row_count"] < 5_000
+    assert dates["failed_checks"] == ["unparseable_dates_threshold_exceeded"]
+    assert dates["first_failing_rows"]["unparseable_dates_threshold_exceeded"] == list(range(10))
+
+
+def test_fail_fast_thresholds_hold_when_short_rows_follow_long_ones(tmp_path: Path) -> None:
+    df = pd.read_csv(generate_transactions(tmp_path / "t.csv", 40_000, seed=8), dtype=str, keep_default_na=False)
+    df.loc[: 9_999, "reference"] = "r" * 250
+    df.loc[: 1_999 : 10, "currency"] = "XXX"
+    path = _write_csv(df, tmp_path / "long_first.csv")
+    whole = validate_transactions(path)
+    assert whole["passed"]
+    # The early rows alone exceed the currency threshold of a file estimated from their size.
+    assert validate_transactions(path, fail_fast=True, chunk_rows=1_000) == {
+        **whole,
+        "partial": False,
+        "first_failing_rows": {},
+    }